@@ -0,0 +1,75 @@
+"""Index audio_embeddings for nearest neighbour search
+
+Creates the index that VECTOR_INDEX names, built with the VECTOR_HNSW_* or
+VECTOR_IVFFLAT_LISTS settings. To tune it, change those and run
+`alembic downgrade -1 && alembic upgrade head`. An IVFFlat index learns its
+lists from the rows present, so build it once the embeddings are loaded.
+
+Revision ID: 4f6d2c8a1b3e
+Revises: 9c3e5a7b2d41
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import math
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "4f6d2c8a1b3e"
+down_revision: Union[str, None] = "9c3e5a7b2d41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "audio_embeddings_embedding_idx"
+
+
+def ivfflat_lists() -> int:
+    if settings.VECTOR_IVFFLAT_LISTS:
+        return settings.VECTOR_IVFFLAT_LISTS
+    # pgvector's advice: rows / 1000 up to a million rows, then their square root
+    rows = (
+        op.get_bind().execute(sa.text("SELECT count(*) FROM audio_embeddings")).scalar()
+    )
+    return max(rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)), 1)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    # The table is filled by scripts/extract_embeddings.py, which creates it
+    # the same way where it doesn't exist yet
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS audio_embeddings (
+            id SERIAL PRIMARY KEY,
+            video_id VARCHAR NOT NULL UNIQUE,
+            filename VARCHAR NOT NULL UNIQUE,
+            embedding vector(512) NOT NULL
+        )
+        """
+    )
+    if settings.VECTOR_INDEX == "hnsw":
+        method = "hnsw"
+        options = (
+            f"m = {settings.VECTOR_HNSW_M}, "
+            f"ef_construction = {settings.VECTOR_HNSW_EF_CONSTRUCTION}"
+        )
+    elif settings.VECTOR_INDEX == "ivfflat":
+        method, options = "ivfflat", f"lists = {ivfflat_lists()}"
+    else:
+        raise ValueError(f"Unknown vector index {settings.VECTOR_INDEX}")
+
+    # Concurrently, so that searches keep working while the index builds
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON audio_embeddings "
+            f"USING {method} (embedding vector_cosine_ops) WITH ({options})"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
@@ -0,0 +1,37 @@
+from functools import cached_property
+
+import librosa
+import numpy as np
+
+from app.inference.audio import MODELS_SAMPLE_RATE, resample
+
+# Rate of the Essentia descriptors
+ALGORITHMS_SAMPLE_RATE = 44100
+
+
+class AudioBuffers:
+    """One decoded track, resampled at most once to each rate the analysis needs."""
+
+    def __init__(self, audio: np.ndarray, sample_rate: int):
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.duration = len(audio) / sample_rate
+
+    @cached_property
+    def audio44k(self) -> np.ndarray:
+        return resample(self.audio, self.sample_rate, ALGORITHMS_SAMPLE_RATE)
+
+    @cached_property
+    def audio16k(self) -> np.ndarray:
+        return resample(self.audio, self.sample_rate, MODELS_SAMPLE_RATE)
+
+
+def decode_audio(source, max_duration: float | None = None) -> AudioBuffers:
+    """Decode a file or file-like object to mono PCM at the analysis rates.
+
+    Only the first `max_duration` seconds are decoded, if given.
+    """
+    audio, sample_rate = librosa.load(
+        source, sr=None, mono=True, dtype=np.float32, duration=max_duration
+    )
+    return AudioBuffers(audio, sample_rate)
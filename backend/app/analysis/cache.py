@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.metrics import cache_evictions, cache_lookups
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Two-tier cache of analysis results, keyed by the uploaded bytes.
+
+    The in-process tier is an LRU of at most `max_entries` results. The disk
+    tier under `path` is shared by every worker that mounts it and is trimmed
+    to `max_bytes`, oldest first. Entries older than `max_age` seconds are
+    dropped from both tiers.
+    """
+
+    def __init__(
+        self, path: str, version: str, max_entries: int, max_bytes: int, max_age: int
+    ):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+    def key(self, file_bytes: bytes) -> str:
+        return self.key_from_digest(hashlib.sha256(file_bytes).hexdigest())
+
+    def key_from_digest(self, digest: str) -> str:
+        # Results change whenever the extractor or its models do
+        return hashlib.sha256(f"{digest}:{self.version}".encode()).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._memory.move_to_end(key)
+                self._count("memory_hits")
+                return entry[1]
+            self._memory.pop(key, None)
+
+            result = self._read(key)
+            if result is None:
+                self._count("misses")
+                return None
+            self._count("disk_hits")
+            self._remember(key, result)
+            return result
+
+    def put(self, key: str, result: dict):
+        with self._lock:
+            self._remember(key, result)
+            self._write(key, result)
+
+    def stats(self) -> dict:
+        lookups = sum(
+            self.counters[counter] for counter in ["memory_hits", "disk_hits", "misses"]
+        )
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        return {
+            **self.counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def _count(self, counter: str):
+        self.counters[counter] += 1
+        if counter == "evictions":
+            cache_evictions.inc()
+        else:
+            cache_lookups.labels(counter).inc()
+
+    def _expired(self, created: float) -> bool:
+        return bool(self.max_age) and time.time() - created > self.max_age
+
+    def _remember(self, key: str, result: dict):
+        self._memory[key] = (time.time(), result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def _read(self, key: str) -> dict | None:
+        if not self.path:
+            return None
+        filename = self._filename(key)
+        try:
+            if self._expired(os.path.getmtime(filename)):
+                self._remove(filename)
+                return None
+            with open(filename, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading cached result {key}: {e}")
+            return None
+
+    def _write(self, key: str, result: dict):
+        if not self.path:
+            return
+        filename = self._filename(key)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            temporary_filename = f"{filename}.{os.getpid()}.tmp"
+            with open(temporary_filename, "wb") as cache_file:
+                pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_filename, filename)
+        except OSError as e:
+            logger.error(f"Error caching result {key}: {e}")
+            return
+
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+        else:
+            self._disk_bytes += os.path.getsize(filename)
+        if self._disk_bytes > self.max_bytes:
+            self._trim_disk()
+
+    def _disk_entries(self):
+        for directory, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                filename = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(filename)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, filename
+
+    def _trim_disk(self):
+        # Other workers share the directory, so rescan instead of trusting our count
+        entries = sorted(self._disk_entries())
+        self._disk_bytes = sum(size for _, size, _ in entries)
+        for modified, size, filename in entries:
+            if self._disk_bytes <= self.max_bytes and not self._expired(modified):
+                break
+            self._remove(filename)
+            self._disk_bytes -= size
+
+    def _remove(self, filename: str):
+        try:
+            os.remove(filename)
+            self._count("evictions")
+        except FileNotFoundError:
+            pass
+
+
+result_cache = ResultCache(
+    path=settings.ANALYSIS_CACHE_PATH,
+    version=settings.ANALYSIS_VERSION,
+    max_entries=settings.ANALYSIS_CACHE_ENTRIES,
+    max_bytes=settings.ANALYSIS_CACHE_DISK_MB * 1024 * 1024,
+    max_age=settings.ANALYSIS_CACHE_MAX_AGE,
+)
@@ -0,0 +1,122 @@
+"""Fast, approximate analysis from a few excerpts of the track.
+
+The track is split into as many equal sections as there are excerpts, and
+each excerpt is the stretch of its section where the music is loudest and
+changes the most, by a novelty curve over mel bands at the models' rate.
+The excerpts are then analyzed like the segments of a long track.
+
+Tracks too long to decode whole are read by seeking instead: only a span
+from the middle of each section is read, and its excerpt is the best
+stretch of that span.
+"""
+
+import numpy as np
+import soundfile
+from essentia.standard import NoveltyCurve
+
+from app.analysis.audio import MODELS_SAMPLE_RATE, AudioBuffers, resample
+from app.analysis.features import model_outputs
+from app.analysis.spectral import SpectralFrontEnd
+from app.analysis.windowed import WindowedAggregator, analyze_segment, selected_graph
+
+
+def excerpt_scores(audio16k: np.ndarray) -> tuple[np.ndarray, float]:
+    """Score of every frame of the track, and the number of frames per second."""
+    front_end = SpectralFrontEnd(audio16k, sample_rate=MODELS_SAMPLE_RATE)
+    frame_rate = MODELS_SAMPLE_RATE / front_end.hop_size
+    novelty = NoveltyCurve(frameRate=frame_rate)(front_end.mel_bands)
+    loudness = np.sqrt(np.mean(np.square(front_end.frames), axis=1))
+    # The novelty curve starts at the second frame
+    loudness = loudness[len(loudness) - len(novelty) :]
+    scores = sum(curve / (curve.max() or 1.0) for curve in [novelty, loudness])
+    return scores, frame_rate
+
+
+def select_excerpts(
+    audio16k: np.ndarray, count: int, length: float
+) -> list[tuple[float, float]]:
+    """(start, end) in seconds of the best `length` seconds of each section."""
+    scores, frame_rate = excerpt_scores(audio16k)
+    window = max(int(length * frame_rate), 1)
+    # Mean score of the window starting at every frame
+    sums = np.concatenate([[0.0], np.cumsum(scores)])
+    means = (sums[window:] - sums[:-window]) / window
+
+    duration = len(audio16k) / MODELS_SAMPLE_RATE
+    excerpts = []
+    for section in range(count):
+        first = int(section * len(scores) / count)
+        last = max(int((section + 1) * len(scores) / count) - window, first)
+        best = first + int(np.argmax(means[first : last + 1])) if len(means) else 0
+        start = round(best / frame_rate, 3)
+        excerpts.append((start, round(min(start + length, duration), 3)))
+    return excerpts
+
+
+def analyze_excerpts(
+    buffers: AudioBuffers,
+    count: int,
+    length: float,
+    on_stage,
+    features: list[str] | None = None,
+) -> dict:
+    excerpts = select_excerpts(buffers.audio16k, count, length)
+    audios = [
+        buffers.audio[int(start * buffers.sample_rate) : int(end * buffers.sample_rate)]
+        for start, end in excerpts
+    ]
+    return analyze_excerpt_audio(
+        excerpts, audios, buffers.sample_rate, buffers.duration, on_stage, features
+    )
+
+
+def analyze_long_excerpts(
+    path: str,
+    duration: float,
+    count: int,
+    length: float,
+    span: float,
+    on_stage,
+    features: list[str] | None = None,
+) -> dict:
+    """analyze_excerpts() of a file, reading `span` seconds of each section."""
+    excerpts, audios = [], []
+    with soundfile.SoundFile(path) as audio_file:
+        sample_rate = audio_file.samplerate
+        section_length = duration / count
+        for section in range(count):
+            span_length = min(span, section_length)
+            span_start = (section + 0.5) * section_length - span_length / 2
+            audio_file.seek(int(span_start * sample_rate))
+            audio = audio_file.read(
+                int(span_length * sample_rate), dtype="float32", always_2d=True
+            ).mean(axis=1)
+            audio16k = resample(audio, sample_rate, MODELS_SAMPLE_RATE)
+            [(start, end)] = select_excerpts(audio16k, 1, length)
+            excerpts.append((round(span_start + start, 3), round(span_start + end, 3)))
+            audios.append(audio[int(start * sample_rate) : int(end * sample_rate)])
+    return analyze_excerpt_audio(
+        excerpts, audios, sample_rate, duration, on_stage, features
+    )
+
+
+def analyze_excerpt_audio(
+    excerpts: list[tuple[float, float]],
+    audios: list[np.ndarray],
+    sample_rate: int,
+    duration: float,
+    on_stage,
+    features: list[str] | None = None,
+) -> dict:
+    """Features of a track of `duration` seconds from the audio of its excerpts."""
+    analyzed = sum(end - start for start, end in excerpts)
+    aggregator = WindowedAggregator(features, scale=duration / analyzed)
+    graph, outputs = selected_graph(features), model_outputs(features)
+    for audio in audios:
+        analyze_segment(aggregator, graph, outputs, audio, sample_rate, 0, len(audio))
+
+    algorithms = aggregator.algorithm_features()
+    on_stage("algorithms", algorithms)
+    models = aggregator.model_features()
+    on_stage("models", models)
+    return algorithms | models | {"Excerpts": excerpts}
@@ -1,13 +1,16 @@
-import io
-import json
-import librosa
+import logging
+
 import numpy as np
-from app.analysis.models import *
+from app.analysis.audio import MODELS_SAMPLE_RATE, AudioBuffers
+from app.analysis.graph import FeatureGraph, FeatureNode, create_executor
+from app.analysis.selection import ALGORITHM_FEATURES, FEATURES
+from app.analysis.spectral import SpectralFrontEnd, mel_band_energies
+from app.config import settings
+from app.inference.outputs import model_outputs
+from app.inference.runtime import run_models
+from app.metrics import observe_descriptor, timed
 from essentia.standard import (
-    MonoLoader,
     Danceability,
-    Spectrum,
-    FrameCutter,
     Loudness,
     RhythmExtractor2013,
     KeyExtractor,
@@ -18,177 +21,192 @@ from essentia.standard import (
     OnsetRate,
     SpectralCentroidTime,
     DynamicComplexity,
-    SpectralPeaks,
     NoveltyCurve,
-    Spectrum,
-    FrameGenerator,
-    Windowing,
-    MelBands,
+    SpectralPeaks,
     BeatsLoudness,
     Beatogram,
     Meter,
 )
 
+logger = logging.getLogger(__name__)
 
-with open(
-    "/backend/data/mtg_jamendo_moodtheme-discogs-effnet-1.json", "r"
-) as jamendo_file:
-    jamendo_metadata = json.load(jamendo_file)
-jamendo_classes = jamendo_metadata["classes"]
-
-with open(
-    "/backend/data/mtg_jamendo_instrument-discogs-effnet-1.json", "r"
-) as jamendo_file:
-    jamendo_instrument_metadata = json.load(jamendo_file)
-jamendo_instrument_classes = jamendo_instrument_metadata["classes"]
-
-
-def run_essentia_models(audio16k, audio44k):
-    features = {}
-
-    # Run models sequentially
-    discogs_embeddings = discogs_model(audio16k)
-    vggish_embeddings = vggish_model(audio16k)
-
-    # Process features sequentially
-    approachability = approachability_model(discogs_embeddings)
-    engagement = engagement_model(discogs_embeddings)
-    arousal_valence = arousal_valence_model(vggish_embeddings)
-    aggressive = aggressive_model(vggish_embeddings)
-    happy = happy_model(vggish_embeddings)
-    party = party_model(vggish_embeddings)
-    relaxed = relaxed_model(vggish_embeddings)
-    sad = sad_model(vggish_embeddings)
-    jamendo_labels = jamendo_model(discogs_embeddings)
-    jamendo_instruments = jamendo_instrument_model(discogs_embeddings)
-    acoustic = acoustic_model(vggish_embeddings)
-    electronic = electronic_model(vggish_embeddings)
-    voice_instrumental = voice_instrumental_model(vggish_embeddings)
-    gender = gender_model(vggish_embeddings)
-    timbre = timbre_model(discogs_embeddings)
-    reverb = reverb_model(discogs_embeddings)
-
-    # Process results into the features dictionary
-    features["Approachability"] = np.median(np.squeeze(approachability))
-    features["Engagement"] = np.median(np.squeeze(engagement))
-    arousal_valence_predictions = np.median(arousal_valence, axis=0)
-    features["Valence"] = arousal_valence_predictions[0]
-    features["Arousal"] = arousal_valence_predictions[1]
-    features["Aggressive"] = np.median(aggressive, axis=0)[0]
-    features["Happy"] = np.median(happy, axis=0)[0]
-    features["Party"] = np.median(party, axis=0)[0]
-    features["Relaxed"] = np.median(relaxed, axis=0)[0]
-    features["Sad"] = np.median(sad, axis=0)[0]
-    jamendo_predictions = np.median(jamendo_labels, axis=0)
-    jamendo_dict = {
-        jamendo_class: jamendo_value
-        for jamendo_class, jamendo_value in zip(jamendo_classes, jamendo_predictions)
-    }
-    features["Jamendo Labels"] = jamendo_dict
-    jamendo_instrument_predictions = np.median(jamendo_instruments, axis=0)
-    jamendo_instrument_dict = {
-        jamendo_class: jamendo_value
-        for jamendo_class, jamendo_value in zip(
-            jamendo_instrument_classes, jamendo_instrument_predictions
-        )
-    }
-    features["Jamendo Instruments"] = jamendo_instrument_dict
-    features["Acoustic"] = np.median(acoustic, axis=0)[0]
-    features["Electronic"] = np.median(electronic, axis=0)[0]
-    voice_instrumental_predictions = np.median(voice_instrumental, axis=0)
-    features["Voice"] = voice_instrumental_predictions[0]
-    features["Instrumental"] = voice_instrumental_predictions[1]
-    gender_predictions = np.median(gender, axis=0)
-    features["Female"] = gender_predictions[0]
-    features["Male"] = gender_predictions[1]
-    timbre_predictions = np.median(timbre, axis=0)
-    features["Bright"] = timbre_predictions[0]
-    features["Dark"] = timbre_predictions[1]
-    reverb_predictions = np.median(reverb, axis=0)
-    features["Dry"] = reverb_predictions[0]
-    features["Wet"] = reverb_predictions[1]
-    features["Embeddings"] = vggish_embeddings
-
-    return features
-
-
-def run_essentia_algorithms(audio44k, audio16k):
-    _, mfcc_coeffs = MFCC(inputSize=len(audio16k))(audio16k)
-    danceability_score = Danceability()(audio44k)
-    loudness_score = Loudness()(audio16k)
+
+def get_mel_bands(audio):
+    return SpectralFrontEnd(audio).mel_bands
+
+
+# Descriptors are module-level functions so that they can run in other processes
+
+
+def danceability(audio44k):
+    return Danceability()(audio44k)[0]
+
+
+def loudness(audio16k):
+    return Loudness()(audio16k)
+
+
+def rhythm(audio44k):
     bpm, beat_positions, _, _, _ = RhythmExtractor2013(method="multifeature")(audio44k)
+    return bpm, beat_positions
+
+
+def key(audio44k):
     key, scale, _ = KeyExtractor()(audio44k)
-    energy_score = Energy()(audio16k)
+    return key, scale
+
 
-    ### Chord Significances
+def energy(audio16k):
+    return Energy()(audio16k)
+
+
+def chords_significance(audio44k):
     _, _, _, _, chords, _, _, _, _, _, _, _ = TonalExtractor()(audio44k)
     unique_chords, counts = np.unique(chords, return_counts=True)
-    chords_significance = {
-        chord: significance for (chord, significance) in zip(unique_chords, counts)
-    }
-
-    ### Inharmonicity
-    frames = []
-    frameCutter = FrameCutter()
-    while True:
-        frame = frameCutter(audio44k)
-        if not len(frame):
-            break
-        frames.append(frame)
-
-    spectrum_magnitudes = []
-    for frame in frames:
-        spectrum_magnitudes_frame = Spectrum()(frame)
-        spectrum_magnitudes.append(spectrum_magnitudes_frame)
-    spectrum_magnitudes = np.array(spectrum_magnitudes).flatten()
-
-    frequencies, magnitudes = SpectralPeaks()(audio44k)
-    hnr_score = None
+    return {chord: significance for (chord, significance) in zip(unique_chords, counts)}
+
+
+def spectral_peaks(audio44k):
+    # Taken over the raw signal rather than per frame, which is what the
+    # catalog's Inharmonicity values were computed from
+    return SpectralPeaks()(audio44k)
+
+
+def inharmonicity(spectral_peaks):
+    frequencies, magnitudes = spectral_peaks
     if len(frequencies) > 0 and frequencies[0]:
-        hnr_score = Inharmonicity()(frequencies, magnitudes)
-    ###
+        return Inharmonicity()(frequencies, magnitudes)
+    return None
+
+
+def timbre(audio16k):
+    _, mfcc_coeffs = MFCC(inputSize=len(audio16k))(audio16k)
+    return np.mean(mfcc_coeffs)
+
 
-    onset_rate_score = OnsetRate()(audio44k)
-    brightness_score = SpectralCentroidTime()(audio44k)
+def onset_rate(audio44k):
+    return OnsetRate()(audio44k)[1]
+
+
+def brightness(audio44k):
+    return SpectralCentroidTime()(audio44k)
+
+
+def dynamic_complexity(audio16k):
     dynamic_complexity_score, _ = DynamicComplexity()(audio16k)
+    return dynamic_complexity_score
+
 
-    mel_bands = get_mel_bands(audio44k)
+def spectrum(audio44k):
+    # The front end every frame-based descriptor reads its spectra from
+    return SpectralFrontEnd(audio44k).magnitudes
+
+
+def mel_bands(spectrum):
+    return mel_band_energies(spectrum)
+
+
+def novelty(mel_bands):
     novelty_curve = NoveltyCurve()(mel_bands)
-    novelty_score = np.median(np.abs(np.diff(novelty_curve)))
+    return np.median(np.abs(np.diff(novelty_curve)))
+
+
+def beats_loudness(audio44k, rhythm):
+    _, beat_positions = rhythm
+    return BeatsLoudness(beats=beat_positions)(audio44k)
+
+
+def time_signature(beats_loudness):
+    beatogram = Beatogram()(*beats_loudness)
+    return Meter()(beatogram)
+
+
+# The rhythm -> beats_loudness -> time_signature chain is the critical path;
+# everything else can run alongside it
+ALGORITHMS_GRAPH = FeatureGraph(
+    [
+        FeatureNode("danceability", danceability, ["audio44k"]),
+        FeatureNode("loudness", loudness, ["audio16k"]),
+        FeatureNode("rhythm", rhythm, ["audio44k"]),
+        FeatureNode("key", key, ["audio44k"]),
+        FeatureNode("energy", energy, ["audio16k"]),
+        FeatureNode("chords_significance", chords_significance, ["audio44k"]),
+        FeatureNode("spectral_peaks", spectral_peaks, ["audio44k"]),
+        FeatureNode("inharmonicity", inharmonicity, ["spectral_peaks"]),
+        FeatureNode("timbre", timbre, ["audio16k"]),
+        FeatureNode("onset_rate", onset_rate, ["audio44k"]),
+        FeatureNode("brightness", brightness, ["audio44k"]),
+        FeatureNode("dynamic_complexity", dynamic_complexity, ["audio16k"]),
+        FeatureNode("spectrum", spectrum, ["audio44k"]),
+        FeatureNode("mel_bands", mel_bands, ["spectrum"]),
+        FeatureNode("novelty", novelty, ["mel_bands"]),
+        FeatureNode("beats_loudness", beats_loudness, ["audio44k", "rhythm"]),
+        FeatureNode("time_signature", time_signature, ["beats_loudness"]),
+    ],
+    observe=observe_descriptor,
+)
 
-    beats_loudness, beats_loudness_band_ratio = BeatsLoudness(beats=beat_positions)(
-        audio44k
+_graph_executor = None
+
+
+def graph_executor():
+    """Per-process pool the descriptors run on, or None to run them inline."""
+    global _graph_executor
+    if _graph_executor is None and settings.ANALYSIS_GRAPH_WORKERS > 1:
+        _graph_executor = create_executor(settings.ANALYSIS_GRAPH_WORKERS)
+    return _graph_executor
+
+
+def run_essentia_algorithms(audio44k, audio16k, timings=None, features=None):
+    # timings, if given, receives the wall time in seconds of every node.
+    # Only the nodes the given features depend on are run.
+    selected = [
+        feature
+        for feature in ALGORITHM_FEATURES
+        if features is None or feature in features
+    ]
+    if not selected:
+        return {}
+    graph = ALGORITHMS_GRAPH.subgraph(
+        {ALGORITHM_FEATURES[feature][0] for feature in selected}
     )
-    beatogram = Beatogram()(beats_loudness, beats_loudness_band_ratio)
-    time_signature = Meter()(beatogram)
-
-    features = {
-        "Danceability": danceability_score[0],
-        "Loudness": loudness_score,
-        "BPM": bpm,
-        "Key": key,
-        "Key Scale": scale,
-        "Energy": energy_score,
-        "Chords Significance": chords_significance,
-        "Inharmonicity": hnr_score,
-        "Timbre": np.mean(mfcc_coeffs),
-        "Onset Rate": onset_rate_score[1],
-        "Brightness": brightness_score,
-        "Dynamic Complexity": dynamic_complexity_score,
-        "Novelty": novelty_score,
-        "Time Signature": time_signature,
-    }
-
-    return features
-
-
-def extract_audio_features(audio):
-    # Load the audio file
-    audio44k = MonoLoader(filename=audio)()
-    audio16k = MonoLoader(filename=audio, sampleRate=16000)()
-    return "TEST"
-    # Run algorithms
-    algorithm_features = run_essentia_algorithms(audio44k, audio16k)
+    values, node_timings = graph.run(
+        {"audio44k": audio44k, "audio16k": audio16k}, graph_executor()
+    )
+    if timings is not None:
+        timings.update(node_timings)
+    path, path_time = graph.critical_path(node_timings)
+    logger.debug(f"Critical path {' -> '.join(path)} took {path_time:.2f}s")
+
+    algorithm_features = {}
+    for feature in selected:
+        node, index = ALGORITHM_FEATURES[feature]
+        value = values[node]
+        algorithm_features[feature] = value if index is None else value[index]
+    return algorithm_features
+
+
+def extract_audio_features(
+    buffers: AudioBuffers, on_stage=None, features: list[str] | None = None
+) -> dict:
+    # on_stage(stage, features) is called with the features of the algorithms
+    # and then of the models as they complete. Given a list of features, only
+    # the stages they need do any work.
+    on_stage = on_stage or (lambda stage, features: None)
+
+    # Both stages share the buffers decoded once by the caller, and each
+    # resamples only if it runs
+    algorithm_features = model_features = {}
+    if any(feature in ALGORITHM_FEATURES for feature in features or FEATURES):
+        with timed("stage", "algorithms"):
+            algorithm_features = run_essentia_algorithms(
+                buffers.audio44k, buffers.audio16k, features=features
+            )
+    on_stage("algorithms", algorithm_features)
+    if model_outputs(features):
+        with timed("stage", "models"):
+            model_features = run_models(buffers.audio16k, MODELS_SAMPLE_RATE, features)
+    on_stage("models", model_features)
 
     # Merge results
-    return algorithm_features
+    return algorithm_features | model_features
@@ -0,0 +1,165 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class FeatureNode:
+    """One step of the extraction: `function` applied to the named `inputs`."""
+
+    def __init__(self, name: str, function, inputs: list[str]):
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+
+
+class SharedArray:
+    """Handle to a numpy array in shared memory; pickles without the data.
+
+    Essentia holds the GIL, so descriptors only run in parallel in separate
+    processes. Sharing the audio this way spares copying it to each of them.
+    """
+
+    def __init__(self, array: np.ndarray):
+        self.shape, self.dtype = array.shape, array.dtype
+        self.memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.name = self.memory.name
+        np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)[...] = array
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Spawned workers share the creator's resource tracker, which unlinks
+        # the segment only if the creator never releases it
+        self.memory = SharedMemory(name=self.name)
+
+    def array(self) -> np.ndarray:
+        return np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+def _run_node(node: FeatureNode, args, observe=None):
+    start, cpu_start = time.perf_counter(), time.process_time()
+    args = [arg.array() if isinstance(arg, SharedArray) else arg for arg in args]
+    result = node.function(*args)
+    wall = time.perf_counter() - start
+    if observe is not None:
+        observe(node.name, wall, time.process_time() - cpu_start)
+    return result, wall
+
+
+class FeatureGraph:
+    """A DAG of feature nodes, run as soon as each node's inputs are ready.
+
+    `observe(name, wall, cpu)`, if given, is called with the wall and CPU
+    seconds of every node, in the process that ran it.
+    """
+
+    def __init__(self, nodes: list[FeatureNode], observe=None):
+        self.nodes = {node.name: node for node in nodes}
+        self.observe = observe
+
+    def subgraph(self, targets) -> "FeatureGraph":
+        """The nodes that the `targets` nodes transitively depend on."""
+        needed, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name in self.nodes and name not in needed:
+                needed.add(name)
+                pending.extend(self.nodes[name].inputs)
+        return FeatureGraph(
+            [node for name, node in self.nodes.items() if name in needed], self.observe
+        )
+
+    def order(self, sources) -> list[str]:
+        """Topological order of the nodes, given the names of the graph inputs."""
+        ordered, available = [], set(sources)
+        remaining = list(self.nodes.values())
+        while remaining:
+            ready = [node for node in remaining if set(node.inputs) <= available]
+            if not ready:
+                missing = {node.name: node.inputs for node in remaining}
+                raise ValueError(f"Unsatisfiable or cyclic feature nodes: {missing}")
+            for node in ready:
+                ordered.append(node.name)
+                available.add(node.name)
+                remaining.remove(node)
+        return ordered
+
+    def run(self, sources: dict, executor=None) -> tuple[dict, dict]:
+        """Run every node; returns the value and the wall time of each node.
+
+        Without an executor the nodes run one after another in this process.
+        With a process pool executor, sources that are numpy arrays are put in
+        shared memory and every node whose inputs are ready runs concurrently.
+        """
+        order = self.order(list(sources))
+        values, timings = dict(sources), {}
+        if executor is None:
+            for name in order:
+                node = self.nodes[name]
+                values[name], timings[name] = _run_node(
+                    node, [values[node_input] for node_input in node.inputs], self.observe
+                )
+            return values, timings
+
+        shared = {
+            name: SharedArray(value)
+            for name, value in sources.items()
+            if isinstance(value, np.ndarray)
+        }
+        arguments = {**values, **shared}
+        running, waiting = {}, [self.nodes[name] for name in order]
+        try:
+            while waiting or running:
+                ready = [node for node in waiting if set(node.inputs) <= arguments.keys()]
+                for node in ready:
+                    waiting.remove(node)
+                    node_arguments = [arguments[name] for name in node.inputs]
+                    future = executor.submit(
+                        _run_node, node, node_arguments, self.observe
+                    )
+                    running[future] = node.name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    values[name], timings[name] = future.result()
+                    arguments[name] = values[name]
+        finally:
+            for shared_array in shared.values():
+                shared_array.release()
+        return values, timings
+
+    def critical_path(self, timings: dict) -> tuple[list[str], float]:
+        """The chain of nodes with the longest total wall time, and that time."""
+        paths = {}
+        for name in self.order(self.sources()):
+            node = self.nodes[name]
+            upstream = [paths[source] for source in node.inputs if source in paths]
+            chain, total = max(upstream, key=lambda path: path[1], default=([], 0.0))
+            paths[name] = (chain + [name], total + timings.get(name, 0.0))
+        return max(paths.values(), key=lambda path: path[1], default=([], 0.0))
+
+    def sources(self) -> set[str]:
+        """Names of the graph inputs, which no node computes."""
+        return {
+            node_input
+            for node in self.nodes.values()
+            for node_input in node.inputs
+            if node_input not in self.nodes
+        }
+
+
+def create_executor(workers: int) -> ProcessPoolExecutor | None:
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
@@ -0,0 +1,128 @@
+import os
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.analysis.service import STAGES
+from app.analysis.uploads import SpooledUpload
+from app.config import settings
+from app.models.analysis_job import AnalysisJob, utcnow
+
+
+async def create_job(
+    db: AsyncSession, filename: str, upload: SpooledUpload, result: dict | None = None
+) -> AnalysisJob:
+    """Queue an analysis, or record it as done straight away given a cached result.
+
+    The upload must be spooled under ANALYSIS_JOBS_PATH; it is moved into place
+    for the workers, or removed if the result is already known.
+    """
+    job_id = str(uuid.uuid4())
+    upload_path = os.path.join(settings.ANALYSIS_JOBS_PATH, job_id)
+    if result is None:
+        os.replace(upload.path, upload_path)
+    else:
+        upload.remove()
+
+    job = AnalysisJob(
+        id=job_id,
+        status="queued" if result is None else "done",
+        filename=filename,
+        upload_path=upload_path,
+        progress={stage: "pending" if result is None else "done" for stage in STAGES},
+        result=result,
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: str) -> AnalysisJob | None:
+    return await db.get(AnalysisJob, job_id)
+
+
+async def claim_job(db: AsyncSession) -> AnalysisJob | None:
+    """Take the oldest queued job, or a running one whose worker has died."""
+    now = utcnow()
+    stale = now - timedelta(seconds=settings.ANALYSIS_JOB_TIMEOUT)
+    result = await db.execute(
+        select(AnalysisJob)
+        .where(
+            or_(
+                AnalysisJob.status == "queued",
+                (AnalysisJob.status == "running") & (AnalysisJob.heartbeat_at < stale),
+            )
+        )
+        .order_by(AnalysisJob.created_at)
+        .limit(1)
+        # Lets any number of workers poll the same table without blocking
+        .with_for_update(skip_locked=True)
+    )
+    job = result.scalars().first()
+    if job is None:
+        return None
+
+    job.attempts += 1
+    if job.attempts > settings.ANALYSIS_JOB_MAX_ATTEMPTS:
+        job.status = "failed"
+        job.error = "Analysis did not complete after repeated attempts"
+        job.finished_at = now
+        await db.commit()
+        return await claim_job(db)
+
+    job.status = "running"
+    job.started_at = job.heartbeat_at = now
+    job.progress = {
+        stage: "running" if index == 0 else "pending"
+        for index, stage in enumerate(STAGES)
+    }
+    await db.commit()
+    return job
+
+
+async def heartbeat(db: AsyncSession, job_id: str):
+    await db.execute(
+        update(AnalysisJob).where(AnalysisJob.id == job_id).values(heartbeat_at=utcnow())
+    )
+    await db.commit()
+
+
+async def complete_stage(db: AsyncSession, job_id: str, stage: str):
+    job = await db.get(AnalysisJob, job_id)
+    progress = dict(job.progress)
+    progress[stage] = "done"
+    next_index = STAGES.index(stage) + 1
+    if next_index < len(STAGES):
+        progress[STAGES[next_index]] = "running"
+    job.progress = progress
+    job.heartbeat_at = utcnow()
+    await db.commit()
+
+
+async def finish_job(
+    db: AsyncSession, job_id: str, result: dict | None = None, error: str | None = None
+):
+    job = await db.get(AnalysisJob, job_id)
+    job.status = "failed" if error else "done"
+    job.result = result
+    job.error = error
+    job.finished_at = utcnow()
+    await db.commit()
+    if os.path.exists(job.upload_path):
+        os.remove(job.upload_path)
+
+
+def job_response(job: AnalysisJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,68 @@
+"""The analysis of one file, from decoding to features.
+
+Imports Essentia, librosa and TensorFlow: import it through
+app.analysis.service, only in the processes that run analyses.
+"""
+
+import librosa
+import numpy as np
+
+from app.analysis.audio import decode_audio
+from app.analysis.excerpts import analyze_excerpts, analyze_long_excerpts
+from app.analysis.features import extract_audio_features
+from app.analysis.uploads import audio_duration
+from app.analysis.windowed import analyze_windowed
+from app.config import settings
+from app.metrics import timed
+
+
+def convert_mp3_to_spectrogram(audio, sample_rate):
+    # Create a mel-spectrogram (frequently used spectrogram for audio analysis)
+    spectrogram = librosa.feature.melspectrogram(
+        y=audio, sr=sample_rate, n_mels=128, fmax=8000
+    )
+
+    # Convert the power spectrogram (amplitude squared) to decibels
+    spectrogram_db = librosa.power_to_db(spectrogram, ref=np.max)
+
+    return spectrogram_db, sample_rate
+
+
+def run_analysis(path: str, on_stage, features: list[str] | None, fast: bool) -> dict:
+    duration = audio_duration(path)
+    excerpts = settings.ANALYSIS_EXCERPTS
+    if duration is not None and duration > settings.ANALYSIS_WINDOWED_AFTER:
+        if fast:
+            # Read only a window's worth of each section, never the whole track
+            on_stage("decode", {"Duration": duration})
+            return analyze_long_excerpts(
+                path,
+                duration,
+                excerpts,
+                settings.ANALYSIS_EXCERPT_SECONDS,
+                settings.ANALYSIS_WINDOW_SEGMENT,
+                on_stage,
+                features,
+            )
+        return analyze_windowed(
+            path,
+            duration,
+            settings.ANALYSIS_WINDOW_SEGMENT,
+            settings.ANALYSIS_WINDOW_CONTEXT,
+            on_stage,
+            features,
+        )
+
+    # Decode once from the spooled upload; every algorithm and model reads
+    # these in-memory buffers
+    with timed("stage", "decode"):
+        buffers = decode_audio(path, max_duration=settings.ANALYSIS_MAX_DURATION)
+    on_stage("decode", {"Duration": buffers.duration})
+    if fast and buffers.duration > excerpts * settings.ANALYSIS_EXCERPT_SECONDS:
+        return analyze_excerpts(
+            buffers, excerpts, settings.ANALYSIS_EXCERPT_SECONDS, on_stage, features
+        )
+    # spectrogram = convert_mp3_to_spectrogram(buffers.audio44k, 44100)
+    audio_features = extract_audio_features(buffers, on_stage, features)
+
+    return audio_features
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config import settings
+from app.metrics import queue_wait_seconds, worker_exited
+
+logger = logging.getLogger(__name__)
+
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+]
+
+
+class AnalysisSaturated(Exception):
+    """Raised when every worker is busy and the queue is full."""
+
+
+def init_worker(threads: int, warmup: bool):
+    # Runs in the fresh worker process before anything heavy is imported, so
+    # the thread pools of numpy and TensorFlow pick these up
+    if threads:
+        for env_var in THREAD_ENV_VARS:
+            os.environ[env_var] = str(threads)
+        os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    if warmup:
+        import app.analysis.pipeline  # noqa: F401
+        from app.inference.models import registry
+
+        try:
+            registry.warmup()
+        except Exception as e:
+            # Models that failed to load are retried on first use
+            logger.error(f"Error warming up models: {e}")
+
+
+def run_queued(submitted: float, function, *args):
+    # Runs in the worker; both processes share the clock
+    queue_wait_seconds.labels("pool").observe(time.time() - submitted)
+    return function(*args)
+
+
+class AnalysisPool:
+    """Bounded pool of worker processes that run the CPU-bound analysis.
+
+    At most `workers` analyses run at once and `max_queue` more may wait for a
+    free worker; anything beyond that is rejected with AnalysisSaturated.
+    """
+
+    def __init__(
+        self, workers: int, max_queue: int, threads: int = 0, warmup: bool = True
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.threads = threads
+        self.warmup = warmup
+        self.pending = 0
+        self._executor = None
+        self._manager = None
+
+    def start(self):
+        if self._executor is None:
+            # Forking a process that has TensorFlow loaded is unsafe, so spawn
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.threads, self.warmup),
+            )
+            if self.warmup:
+                # Start every worker now rather than on the first requests
+                for _ in range(self.workers):
+                    self._executor.submit(os.getpid)
+
+    def shutdown(self):
+        if self._executor is not None:
+            pids = list(self._executor._processes or {})
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            for pid in pids:
+                worker_exited(pid)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.workers + self.max_queue
+
+    def queue(self):
+        """A queue that functions run in the pool can put results on."""
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager.Queue()
+
+    async def run(self, function, *args):
+        if self.saturated:
+            raise AnalysisSaturated()
+        self.start()
+        self.pending += 1
+        try:
+            future = self._executor.submit(run_queued, time.time(), function, *args)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # A function already running in a worker can't be stopped, so
+                # wait for it: callers may remove what it reads once cancelled
+                if not future.cancel():
+                    await asyncio.wait([asyncio.wrap_future(future)])
+                raise
+        finally:
+            self.pending -= 1
+
+
+analysis_pool = AnalysisPool(
+    workers=settings.ANALYSIS_WORKERS,
+    max_queue=settings.ANALYSIS_MAX_QUEUE,
+    threads=settings.ANALYSIS_THREADS_PER_WORKER,
+    warmup=settings.MODELS_WARMUP,
+)
@@ -1,24 +1,287 @@
+import asyncio
+import json
 import logging
+import queue
+import time
+from functools import partial
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.analysis.service import analyze_audio
+from app.analysis import jobs
+from app.analysis.cache import result_cache
+from app.analysis.pool import AnalysisSaturated, analysis_pool
+from app.analysis.selection import validate_features
+from app.analysis.service import (
+    StageReporter,
+    analyze_audio,
+    get_similar_songs,
+    model_stats,
+    to_jsonable,
+)
+from app.analysis.uploads import UPLOAD_REQUEST_BODY, receive_upload
+from app.config import settings
+from app.db import get_db
 
 analysis_router = APIRouter()
 logging.basicConfig(level=logging.DEBUG)
 
 
-@analysis_router.post("/")
-async def analyze(file: UploadFile = File(...)):
+MAX_UPLOAD_BYTES = settings.ANALYSIS_MAX_UPLOAD_MB * 1024 * 1024
+AUDIO_TYPES = ["audio/mpeg", "audio/wav"]
+
+
+def saturated_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many analyses in progress",
+        headers={"Retry-After": str(settings.ANALYSIS_RETRY_AFTER)},
+    )
+
+
+def requested_features(features: list[str] | None) -> list[str] | None:
+    if not features:
+        return None
+    try:
+        validate_features(features)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return features
+
+
+def cached_result(
+    digest: str, features: list[str] | None, fast: bool = False
+) -> tuple[str, dict | None]:
+    """Cache key of an analysis, and its result if it is already known.
+
+    The result of a full analysis of the same file answers any selection,
+    fast or not.
+    """
+    full_key = result_cache.key_from_digest(digest)
+    if features is None and not fast:
+        return full_key, result_cache.get(full_key)
+    selection = ",".join(sorted(features or []))
+    key = result_cache.key_from_digest(f"{digest}:{selection}:{'fast' if fast else ''}")
+    result = result_cache.get(full_key)
+    if result is not None:
+        return key, {feature: result[feature] for feature in features or result}
+    return key, result_cache.get(key)
+
+
+def catalog_percentiles_of(result: dict) -> dict | None:
+    """Where the features of an analysis fall across the song catalog.
+
+    None until `python -m app.catalog.build` has built the catalog. Never
+    cached with the result, since the catalog grows.
+    """
+    # Imported on first use, to keep numpy out of the API's startup
+    from app.catalog.percentiles import catalog_percentiles
+
     try:
-        logging.debug(f"Received file: {file.filename}, Type: {file.content_type}")
+        return catalog_percentiles().of_analysis(result)
+    except FileNotFoundError:
+        return None
 
-        if file.content_type not in ["audio/mpeg", "audio/wav"]:
-            raise HTTPException(status_code=400, detail="Invalid audio file type")
 
-        content = await file.read()
-        result = analyze_audio(content)
-        return result
+def with_percentiles(result: dict) -> dict:
+    percentiles = catalog_percentiles_of(result)
+    return result if percentiles is None else result | {"Percentiles": percentiles}
+
+
+@analysis_router.post("/", openapi_extra=UPLOAD_REQUEST_BODY)
+async def analyze(
+    request: Request,
+    features: list[str] | None = Query(None),
+    fast: bool = Query(False),
+):
+    # features, if given, limits the analysis to those features. Fast analyses
+    # are approximated from a few excerpts. Percentiles of the features over
+    # the song catalog are added under "Percentiles".
+    try:
+        features = requested_features(features)
+        upload = await receive_upload(
+            request,
+            settings.ANALYSIS_UPLOADS_PATH,
+            MAX_UPLOAD_BYTES,
+            settings.ANALYSIS_MAX_DURATION,
+            AUDIO_TYPES,
+        )
+        logging.debug(f"Received file: {upload.filename}, Type: {upload.content_type}")
+        try:
+            cache_key, result = cached_result(upload.digest, features, fast)
+            if result is None:
+                audio_features = await analysis_pool.run(
+                    analyze_audio, upload.path, None, features, fast
+                )
+                result = to_jsonable(audio_features)
+                result_cache.put(cache_key, result)
+        finally:
+            upload.remove()
+        return with_percentiles(result)
+    except AnalysisSaturated:
+        raise saturated_error()
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error analyzing file: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@analysis_router.post("/similar", openapi_extra=UPLOAD_REQUEST_BODY)
+async def similar(request: Request, count: int | None = Query(None, ge=1, le=100)):
+    """The songs of the search catalog most similar to a file, by clip votes.
+
+    Answers 503 until `python -m app.search.build` has built the catalog.
+    """
+    upload = await receive_upload(
+        request,
+        settings.ANALYSIS_UPLOADS_PATH,
+        MAX_UPLOAD_BYTES,
+        settings.ANALYSIS_MAX_DURATION,
+        AUDIO_TYPES,
+    )
+    try:
+        return await analysis_pool.run(get_similar_songs, upload.path, count)
+    except AnalysisSaturated:
+        raise saturated_error()
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="The search catalog is not built")
+    finally:
+        upload.remove()
+
+
+def server_sent_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def analysis_events(upload, cache_key: str, features: list[str] | None, fast: bool):
+    """Events of one analysis: each stage's features, then a summary."""
+    started = time.perf_counter()
+    stage_queue = analysis_pool.queue()
+    task = asyncio.create_task(
+        analysis_pool.run(
+            analyze_audio, upload.path, StageReporter(stage_queue), features, fast
+        )
+    )
+
+    def finish(task):
+        # Runs even if the client has gone away, so the result is still cached
+        upload.remove()
+        if not task.cancelled() and task.exception() is None:
+            result_cache.put(cache_key, to_jsonable(task.result()))
+
+    task.add_done_callback(finish)
+
+    loop = asyncio.get_running_loop()
+    stages = []
+    try:
+        while True:
+            try:
+                stage, stage_features = await loop.run_in_executor(
+                    None, partial(stage_queue.get, timeout=0.5)
+                )
+            except queue.Empty:
+                # Stages are queued before the analysis returns, so none are left
+                if task.done():
+                    break
+                continue
+            stages.append(stage)
+            yield server_sent_event(stage, stage_features)
+
+        result = to_jsonable(await task)
+        percentiles = catalog_percentiles_of(result)
+        if percentiles is not None:
+            yield server_sent_event("percentiles", percentiles)
+        summary = {"stages": stages, "cached": False}
+        yield server_sent_event(
+            "summary", summary | {"seconds": time.perf_counter() - started}
+        )
+    except AnalysisSaturated:
+        yield server_sent_event("error", {"detail": "Too many analyses in progress"})
+    except Exception as e:
+        logging.error(f"Error analyzing file: {e}")
+        yield server_sent_event("error", {"detail": "Internal server error"})
+
+
+async def cached_events(result: dict):
+    yield server_sent_event("result", with_percentiles(result))
+    yield server_sent_event("summary", {"stages": [], "cached": True, "seconds": 0.0})
+
+
+@analysis_router.post("/stream", openapi_extra=UPLOAD_REQUEST_BODY)
+async def analyze_stream(
+    request: Request,
+    features: list[str] | None = Query(None),
+    fast: bool = Query(False),
+):
+    """Analyze a file, sending results as Server-Sent Events.
+
+    Each stage sends an event named after it with the features it produced,
+    then a `percentiles` event tells where they fall across the song catalog
+    and a `summary` event ends the stream. A cached analysis is sent as a
+    single `result` event, percentiles included, before the summary, and
+    failures as an `error`.
+    Like POST /, it computes only the `features` asked for, if any, and
+    approximates them from excerpts if `fast` is set.
+    """
+    features = requested_features(features)
+    if analysis_pool.saturated:
+        raise saturated_error()
+
+    upload = await receive_upload(
+        request,
+        settings.ANALYSIS_UPLOADS_PATH,
+        MAX_UPLOAD_BYTES,
+        settings.ANALYSIS_MAX_DURATION,
+        AUDIO_TYPES,
+    )
+    logging.debug(f"Received file: {upload.filename}, Type: {upload.content_type}")
+    cache_key, result = cached_result(upload.digest, features, fast)
+    if result is not None:
+        upload.remove()
+        events = cached_events(result)
+    else:
+        events = analysis_events(upload, cache_key, features, fast)
+    # Tell nginx to pass events through rather than buffer the response
+    return StreamingResponse(
+        events, media_type="text/event-stream", headers={"X-Accel-Buffering": "no"}
+    )
+
+
+@analysis_router.get("/models")
+async def models():
+    # Models live in the pool workers, so ask one of them
+    try:
+        return await analysis_pool.run(model_stats)
+    except AnalysisSaturated:
+        raise saturated_error()
+
+
+@analysis_router.get("/cache")
+async def cache():
+    return result_cache.stats()
+
+
+@analysis_router.post("/jobs", status_code=202, openapi_extra=UPLOAD_REQUEST_BODY)
+async def create_job(request: Request, db: AsyncSession = Depends(get_db)):
+    # Spool straight into the jobs directory, so queueing is a rename
+    upload = await receive_upload(
+        request,
+        settings.ANALYSIS_JOBS_PATH,
+        MAX_UPLOAD_BYTES,
+        settings.ANALYSIS_MAX_DURATION,
+        AUDIO_TYPES,
+    )
+    logging.debug(f"Received file: {upload.filename}, Type: {upload.content_type}")
+    cached_result = result_cache.get(result_cache.key_from_digest(upload.digest))
+    job = await jobs.create_job(db, upload.filename, upload, result=cached_result)
+    return jobs.job_response(job)
+
+
+@analysis_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    job = await jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.job_response(job)
@@ -0,0 +1,34 @@
+"""Names of the features an analysis can return, and what computes each.
+
+Kept apart from the modules that compute them, which import Essentia and
+TensorFlow, so that the API can validate requests without loading either.
+"""
+
+from app.inference.outputs import MODEL_FEATURES
+
+# Node each descriptor feature is read from, and which of its values
+ALGORITHM_FEATURES = {
+    "Danceability": ("danceability", None),
+    "Loudness": ("loudness", None),
+    "BPM": ("rhythm", 0),
+    "Key": ("key", 0),
+    "Key Scale": ("key", 1),
+    "Energy": ("energy", None),
+    "Chords Significance": ("chords_significance", None),
+    "Inharmonicity": ("inharmonicity", None),
+    "Timbre": ("timbre", None),
+    "Onset Rate": ("onset_rate", None),
+    "Brightness": ("brightness", None),
+    "Dynamic Complexity": ("dynamic_complexity", None),
+    "Novelty": ("novelty", None),
+    "Time Signature": ("time_signature", None),
+}
+
+# Every feature an analysis can return
+FEATURES = list(ALGORITHM_FEATURES) + list(MODEL_FEATURES)
+
+
+def validate_features(features: list[str]):
+    unknown = [feature for feature in features if feature not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown features: {', '.join(unknown)}")
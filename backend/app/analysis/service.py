@@ -1,35 +1,81 @@
-import io
+"""Entry points of the analysis, as the API and the job worker call them.
 
-import librosa
-import numpy as np
-from app.analysis.features import extract_audio_features
+The pipeline itself imports Essentia, librosa and TensorFlow, which take
+seconds to load, so it is only imported by the processes that run it: the
+API process never does. Nor does it import numpy, or the catalog and search
+modules built on it, until a request needs them, so that starting the API
+only loads FastAPI and SQLAlchemy.
+"""
 
-def convert_mp3_to_spectrogram(audio, sample_rate):
-    # Create a mel-spectrogram (frequently used spectrogram for audio analysis)
-    spectrogram = librosa.feature.melspectrogram(
-        y=audio, sr=sample_rate, n_mels=128, fmax=8000
+from app.config import settings
+from app.metrics import timed, track_peak_rss
+
+# Stages of an analysis, in the order they complete
+STAGES = ["decode", "algorithms", "models"]
+
+
+def get_similar_songs(source, count: int | None = None) -> list[dict]:
+    """The songs of the search catalog most similar to an audio file.
+
+    Following the research paper, the file is split into clips of about 3
+    seconds, each clip keeps the SEARCH_TOP_CLIPS most similar clips of the
+    catalog, and the songs that most of these come from are returned, with
+    their number of votes.
+    """
+    from app.analysis.audio import decode_audio
+    from app.inference.models import registry
+    from app.search.clips import clip_catalog, clip_embeddings
+
+    frames = registry.get("vggish")(decode_audio(source).audio16k)
+    return clip_catalog().similar_songs(
+        clip_embeddings(frames), count or settings.SEARCH_SONGS, settings.SEARCH_TOP_CLIPS
     )
 
-    # Convert the power spectrogram (amplitude squared) to decibels
-    spectrogram_db = librosa.power_to_db(spectrogram, ref=np.max)
 
-    return spectrogram_db, sample_rate
+def to_jsonable(value):
+    """Convert the numpy values in a features dict to plain Python ones."""
+    import numpy as np
+
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class StageReporter:
+    """on_stage callback that sends each stage's features to a queue.
+
+    Picklable along with a multiprocessing manager queue, so that analyses
+    running in the pool can report to the API process.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __call__(self, stage: str, features: dict):
+        self.queue.put((stage, to_jsonable(features)))
+
 
+def analyze_audio(
+    path: str, on_stage=None, features: list[str] | None = None, fast: bool = False
+) -> dict:
+    # on_stage(stage, features) is called as each of STAGES completes, with
+    # the features it produced. Given a list of features, only those are
+    # computed and returned. Fast analyses only look at a few excerpts of
+    # the track, which they list under "Excerpts".
+    from app.analysis.pipeline import run_analysis
 
-def get_similar_songs(audio):
-    # Research paper:
-    #   Split the user's song into 3 second clips.
-    #   Calculate similarity score between each user clip with all clip embeddings
-    #       stored in vector database
-    #   For each user clip, keep the 10,000 highest similarity scores
-    #   Count how many times a song is present in the top similarity scores
-    #   Return the top 10 songs with the highest count 
-    return None
+    on_stage = on_stage or (lambda stage, features: None)
+    with track_peak_rss(), timed("analysis", "fast" if fast else "full"):
+        return run_analysis(path, on_stage, features, fast)
 
-def analyze_audio(file_bytes: bytes) -> dict:
-    audio, sr = librosa.load(io.BytesIO(file_bytes), sr=None)
-    #spectrogram = convert_mp3_to_spectrogram(audio, sr)
-    audio_features = extract_audio_features(audio)
 
+def model_stats() -> dict:
+    from app.inference.models import model_stats
 
-    return audio_features
+    return model_stats()
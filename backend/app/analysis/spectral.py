@@ -0,0 +1,89 @@
+from functools import cached_property, lru_cache
+
+import numpy as np
+import scipy.fft
+from essentia.standard import MelBands, Windowing
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Frames transformed per FFT call, to bound the size of the temporaries
+FFT_BLOCK_FRAMES = 1024
+
+
+@lru_cache
+def hann_window(frame_size: int) -> np.ndarray:
+    # Essentia's normalized Hann window. Its zero-phase rotation doesn't change
+    # magnitude spectra, so leave it out.
+    return Windowing(type="hann", zeroPhase=False)(np.ones(frame_size, dtype=np.float32))
+
+
+@lru_cache
+def mel_filterbank(spectrum_size: int, number_bands: int, sample_rate: int) -> np.ndarray:
+    """Matrix W such that MelBands()(spectrum) == W @ spectrum**2."""
+    # Essentia's default upper bound, unless that is above the Nyquist frequency
+    mel_bands = MelBands(
+        inputSize=spectrum_size,
+        numberBands=number_bands,
+        sampleRate=sample_rate,
+        highFrequencyBound=min(22050, sample_rate / 2),
+    )
+    # MelBands is linear in the power spectrum, so its response to each unit
+    # vector is one column of the filterbank
+    unit_spectra = np.eye(spectrum_size, dtype=np.float32)
+    return np.array([mel_bands(unit_spectrum) for unit_spectrum in unit_spectra]).T
+
+
+def mel_band_energies(magnitudes: np.ndarray, sample_rate: int = 44100) -> np.ndarray:
+    """Energies of 40 mel bands per frame of magnitude spectra, as in MelBands."""
+    filterbank = mel_filterbank(magnitudes.shape[1], 40, sample_rate)
+    return np.square(magnitudes) @ filterbank.T
+
+
+class SpectralFrontEnd:
+    """Frames, windows and transforms a signal once for all spectral descriptors.
+
+    Framing matches Essentia's FrameGenerator (the first frame is centred on
+    the first sample), so descriptors see the same frames as before. Everything
+    is computed on first access and cached for the lifetime of the request.
+    """
+
+    def __init__(
+        self,
+        audio: np.ndarray,
+        frame_size: int = 2048,
+        hop_size: int = 1024,
+        sample_rate: int = 44100,
+    ):
+        self.audio = audio
+        self.frame_size = frame_size
+        self.hop_size = hop_size
+        self.sample_rate = sample_rate
+
+    @cached_property
+    def frames(self) -> np.ndarray:
+        """Read-only (frames, frame_size) view of the zero-padded signal."""
+        half_frame = self.frame_size // 2
+        frame_count = -(-(len(self.audio) + half_frame) // self.hop_size)
+        padded = np.zeros(
+            (frame_count - 1) * self.hop_size + self.frame_size, dtype=np.float32
+        )
+        padded[half_frame : half_frame + len(self.audio)] = self.audio
+        return sliding_window_view(padded, self.frame_size)[:: self.hop_size]
+
+    @cached_property
+    def magnitudes(self) -> np.ndarray:
+        """Magnitude spectrum of every Hann-windowed frame."""
+        window = hann_window(self.frame_size)
+        magnitudes = np.empty(
+            (len(self.frames), self.frame_size // 2 + 1), dtype=np.float32
+        )
+        for start in range(0, len(self.frames), FFT_BLOCK_FRAMES):
+            block = self.frames[start : start + FFT_BLOCK_FRAMES] * window
+            magnitudes[start : start + FFT_BLOCK_FRAMES] = np.abs(
+                scipy.fft.rfft(block, axis=1)
+            )
+        return magnitudes
+
+    @cached_property
+    def mel_bands(self) -> np.ndarray:
+        """Energies of 40 mel bands per frame, as Essentia's MelBands computes them."""
+        return mel_band_energies(self.magnitudes, self.sample_rate)
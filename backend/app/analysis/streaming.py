@@ -0,0 +1,107 @@
+import numpy as np
+
+
+class StreamingQuantile:
+    """P² estimate of one quantile of each column of a stream of rows.
+
+    Keeps five markers per column instead of the observations (Jain and
+    Chlamtac, 1985), so memory doesn't grow with the stream. The first five
+    rows are kept as they are, and the estimate is exact until then.
+    """
+
+    def __init__(self, quantile: float = 0.5):
+        self.quantile = quantile
+        self.count = 0
+        self._first_rows = []
+        self._heights = None  # (5, columns) marker heights
+        self._positions = None  # (5, columns) actual marker positions
+        self._desired = 1 + np.array([0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4])
+        self._increments = np.array([0, quantile / 2, quantile, (1 + quantile) / 2, 1])
+
+    def update(self, rows: np.ndarray):
+        """Add one row per observation, or a 1-D array of single observations."""
+        rows = np.asarray(rows, dtype=np.float64)
+        for row in rows.reshape(len(rows), -1):
+            self._update(row)
+
+    def value(self) -> np.ndarray:
+        if self.count == 0:
+            raise ValueError("No observations")
+        if self._heights is None:
+            return np.median(self._first_rows, axis=0)
+        return self._heights[2].copy()
+
+    def _update(self, row: np.ndarray):
+        self.count += 1
+        if self._heights is None:
+            self._first_rows.append(row)
+            if self.count == 5:
+                self._heights = np.sort(self._first_rows, axis=0)
+                self._positions = np.tile(np.arange(1.0, 6.0)[:, None], (1, len(row)))
+                self._first_rows = []
+            return
+
+        heights, positions = self._heights, self._positions
+        heights[0] = np.minimum(heights[0], row)
+        heights[4] = np.maximum(heights[4], row)
+        # Cell of each observation, then shift every marker above it
+        cell = np.sum(heights[1:4] <= row, axis=0)
+        positions += np.arange(5)[:, None] > cell
+        self._desired = self._desired + self._increments
+
+        for i in range(1, 4):
+            offset = self._desired[i] - positions[i]
+            step = np.where(
+                (offset >= 1) & (positions[i + 1] - positions[i] > 1),
+                1.0,
+                np.where(
+                    (offset <= -1) & (positions[i - 1] - positions[i] < -1), -1.0, 0.0
+                ),
+            )
+            if not step.any():
+                continue
+            below = positions[i] - positions[i - 1]
+            above = positions[i + 1] - positions[i]
+            parabolic = heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+                (below + step) * (heights[i + 1] - heights[i]) / above
+                + (above - step) * (heights[i] - heights[i - 1]) / below
+            )
+            neighbour = np.where(step > 0, i + 1, i - 1)
+            columns = np.arange(heights.shape[1])
+            linear = heights[i] + step * (heights[neighbour, columns] - heights[i]) / (
+                positions[neighbour, columns] - positions[i]
+            )
+            inside = (heights[i - 1] < parabolic) & (parabolic < heights[i + 1])
+            moved = step != 0
+            heights[i] = np.where(moved, np.where(inside, parabolic, linear), heights[i])
+            positions[i] += step
+
+
+class StreamingSubsample:
+    """Evenly spaced rows of a stream, at most `capacity` of them.
+
+    Keeps every `stride`-th row; once that would be more than `capacity`
+    rows, every other kept row is dropped and the stride doubles. Streams
+    of up to `capacity` rows are kept whole.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.stride = 1
+        self.count = 0
+        self._rows = []
+        self._kept = 0
+
+    def update(self, rows: np.ndarray):
+        # Rows of the stream that fall on the stride, counting from its start
+        kept = rows[-self.count % self.stride :: self.stride]
+        self.count += len(rows)
+        self._rows.append(kept)
+        self._kept += len(kept)
+        while self._kept > self.capacity:
+            halved = np.concatenate(self._rows)[::2]
+            self._rows, self._kept = [halved], len(halved)
+            self.stride *= 2
+
+    def value(self) -> np.ndarray | None:
+        return np.concatenate(self._rows) if self._rows else None
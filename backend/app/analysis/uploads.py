@@ -0,0 +1,169 @@
+import hashlib
+import os
+import tempfile
+
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Bytes read from a spooled file at a time
+CHUNK_SIZE = 1024 * 1024
+
+# The request body receive_upload() parses, described for the OpenAPI docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+class SpooledUpload:
+    """An upload written to a file on disk, with the SHA-256 of its bytes."""
+
+    def __init__(self, path: str, digest: str, size: int):
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self.filename = None
+        self.content_type = None
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class FilePart:
+    """Multipart parser callbacks that write the "file" part to a spool file."""
+
+    def __init__(self, spool_file, content_types: list[str] | None):
+        self.spool_file = spool_file
+        self.content_types = content_types
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.filename = None
+        self.content_type = None
+        self._headers = {}
+        self._field, self._value = b"", b""
+        self._writing = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+        }
+
+    def on_part_begin(self):
+        self._headers, self._writing = {}, False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def on_headers_finished(self):
+        _, disposition = parse_options_header(self._headers.get(b"content-disposition"))
+        if disposition.get(b"name") != b"file" or self.filename is not None:
+            return
+        self.filename = disposition.get(b"filename", b"").decode(errors="replace")
+        self.content_type = self._headers.get(b"content-type", b"").decode()
+        # Before any of the file has been written
+        if self.content_types is not None and self.content_type not in self.content_types:
+            raise HTTPException(status_code=400, detail="Invalid audio file type")
+        self._writing = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._writing:
+            chunk = data[start:end]
+            self.digest.update(chunk)
+            self.size += len(chunk)
+            self.spool_file.write(chunk)
+
+
+async def receive_upload(
+    request: Request,
+    directory: str,
+    max_bytes: int,
+    max_duration: float,
+    content_types: list[str] | None = None,
+) -> SpooledUpload:
+    """Write the "file" part of a multipart request to `directory` as it arrives.
+
+    The body is parsed straight from the request stream, so the upload is
+    written to disk once, hashed on the way, and never held in memory.
+    Raises a 400 if the body has no file, or one not of `content_types`, as
+    soon as its headers arrive. Raises a 413 as soon as more than `max_bytes`
+    of the body have arrived, or once spooled if its header reports more
+    than `max_duration` seconds of audio.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart upload")
+    os.makedirs(directory, exist_ok=True)
+    spool_file = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+    upload = SpooledUpload(spool_file.name, "", 0)
+    part = FilePart(spool_file, content_types)
+    parser = MultipartParser(options[b"boundary"], part.callbacks())
+    try:
+        with spool_file:
+            received = 0
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_bytes:
+                    raise HTTPException(status_code=413, detail="Audio file too large")
+                parser.write(chunk)
+            parser.finalize()
+        if part.filename is None:
+            raise HTTPException(status_code=400, detail="No audio file uploaded")
+
+        duration = audio_duration(upload.path)
+        if duration is not None and duration > max_duration:
+            raise HTTPException(status_code=413, detail="Audio file too long")
+    except MultipartParseError:
+        upload.remove()
+        raise HTTPException(status_code=400, detail="Malformed multipart body")
+    except BaseException:
+        upload.remove()
+        raise
+
+    upload.digest, upload.size = part.digest.hexdigest(), part.size
+    upload.filename, upload.content_type = part.filename, part.content_type
+    return upload
+
+
+def audio_duration(path: str) -> float | None:
+    """Duration from the file's header, without decoding; None if unreadable."""
+    # soundfile imports numpy, which the API can do without until an upload
+    import soundfile
+
+    try:
+        return soundfile.info(path).duration
+    except Exception:
+        return None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as upload_file:
+        while chunk := upload_file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,245 @@
+"""Analysis of long tracks, one window at a time.
+
+The track is read in windows of `segment` seconds plus `context` seconds on
+either side, so consecutive windows overlap by twice the context. Each
+window is resampled on its own; the descriptors run on its segment, and the
+models on the whole window, keeping the frames that fall in the segment.
+Frame-level values go to streaming estimators and per-segment values to
+running totals, so memory depends on the window length, not the track's.
+Embedding frames, which are returned as they are, are thinned out evenly
+to at most ANALYSIS_MAX_EMBEDDINGS of them.
+"""
+
+from collections import Counter
+
+import numpy as np
+import soundfile
+from essentia.standard import NoveltyCurve
+
+from app.analysis.audio import ALGORITHMS_SAMPLE_RATE, MODELS_SAMPLE_RATE, resample
+from app.analysis.features import (
+    ALGORITHM_FEATURES,
+    ALGORITHMS_GRAPH,
+    graph_executor,
+    model_outputs,
+)
+from app.analysis.graph import FeatureGraph
+from app.analysis.streaming import StreamingQuantile, StreamingSubsample
+from app.config import settings
+from app.inference.runtime import model_features, model_predictions
+
+# Seconds below which the descriptors fail on a segment, Meter first: a
+# track's last segment, if that short, is analysed with the one before it
+MIN_SEGMENT = 5.0
+
+
+def read_windows(path: str, segment: float, context: float):
+    """Yield (audio, sample_rate, segment_start, segment_end) for each window.
+
+    segment_start and segment_end are offsets in samples within the window.
+    The last segment runs to the end of the track, up to MIN_SEGMENT seconds
+    longer than the others.
+    """
+    with soundfile.SoundFile(path) as audio_file:
+        sample_rate = audio_file.samplerate
+        segment_length = int(segment * sample_rate)
+        context_length = int(context * sample_rate)
+        min_length = int(MIN_SEGMENT * sample_rate)
+        start = 0
+        while start < audio_file.frames:
+            length = segment_length
+            if audio_file.frames - start - segment_length < min_length:
+                length = audio_file.frames - start
+            window_start = max(start - context_length, 0)
+            audio_file.seek(window_start)
+            audio = audio_file.read(
+                start - window_start + length + context_length,
+                dtype="float32",
+                always_2d=True,
+            ).mean(axis=1)
+            segment_start = start - window_start
+            segment_end = min(segment_start + length, len(audio))
+            yield audio, sample_rate, segment_start, segment_end
+            start += length
+
+
+def segment_frames(frame_count: int, window_length: int, start: int, end: int):
+    """Slice of the model frames whose centres fall in [start, end) samples."""
+    centres = (np.arange(frame_count) + 0.5) * window_length / frame_count
+    kept = np.flatnonzero((centres >= start) & (centres < end))
+    if len(kept) == 0:
+        return slice(0, 0)
+    return slice(kept[0], kept[-1] + 1)
+
+
+# Nodes that features are reduced from across segments, where these differ
+# from the node that gives the feature for a whole track
+WINDOWED_NODES = {"Loudness": "energy", "Novelty": "mel_bands"}
+
+
+class WindowedAggregator:
+    """Running reductions of the features over the segments seen so far.
+
+    Reductions are only fed by the nodes and heads that ran, so only the
+    `features` that were asked for (all of them by default) are returned.
+    Totals are multiplied by `scale`, the ratio of the track's length to
+    that of the segments, when these don't cover the whole track.
+    """
+
+    MEAN_FEATURES = {
+        "Danceability": "danceability",
+        "Inharmonicity": "inharmonicity",
+        "Timbre": "timbre",
+        "Onset Rate": "onset_rate",
+        "Brightness": "brightness",
+        "Dynamic Complexity": "dynamic_complexity",
+    }
+
+    def __init__(self, features: list[str] | None = None, scale: float = 1.0):
+        self.selected = features
+        self.scale = scale
+        self.sums = dict.fromkeys(self.MEAN_FEATURES, 0.0)
+        self.weights = dict.fromkeys(self.MEAN_FEATURES, 0.0)
+        self.energy = 0.0
+        self.bpm = StreamingQuantile()
+        self.novelty = StreamingQuantile()
+        self.keys = Counter()
+        self.time_signatures = Counter()
+        self.chords = Counter()
+        self.heads = {}  # Group name -> (head widths, StreamingQuantile)
+        self.embeddings = StreamingSubsample(settings.ANALYSIS_MAX_EMBEDDINGS)
+
+    def add_algorithms(self, values: dict, duration: float):
+        for feature, node in self.MEAN_FEATURES.items():
+            if values.get(node) is not None:
+                self.sums[feature] += float(values[node]) * duration
+                self.weights[feature] += duration
+        if "energy" in values:
+            self.energy += float(values["energy"])
+        if "rhythm" in values:
+            self.bpm.update([values["rhythm"][0]])
+        if "mel_bands" in values:
+            novelty_curve = NoveltyCurve()(values["mel_bands"])
+            self.novelty.update(np.abs(np.diff(novelty_curve)))
+        if "key" in values:
+            self.keys[values["key"]] += duration
+        if "time_signature" in values:
+            self.time_signatures[float(values["time_signature"])] += duration
+        if "chords_significance" in values:
+            self.chords.update(values["chords_significance"])
+
+    def add_models(self, groups: dict, embeddings: np.ndarray, window: tuple):
+        # window is (window length, segment start, segment end) in samples
+        for name, predictions in groups.items():
+            if name not in self.heads:
+                widths = {head: values.shape[1] for head, values in predictions.items()}
+                self.heads[name] = (widths, StreamingQuantile())
+            widths, quantile = self.heads[name]
+            stacked = np.hstack([predictions[head] for head in widths])
+            stacked = stacked[segment_frames(len(stacked), *window)]
+            if len(stacked):
+                quantile.update(stacked)
+        if embeddings is not None:
+            frames = segment_frames(len(embeddings), *window)
+            self.embeddings.update(embeddings[frames])
+
+    def algorithm_features(self) -> dict:
+        features = {
+            feature: self.sums[feature] / self.weights[feature]
+            if self.weights[feature]
+            else None
+            for feature in self.MEAN_FEATURES
+        }
+        # Loudness is a power of the energy, so the total energy gives it exactly
+        energy = self.energy * self.scale
+        features["Loudness"] = energy**0.67
+        features["Energy"] = energy
+        features["Chords Significance"] = {
+            chord: round(count * self.scale) for chord, count in self.chords.items()
+        }
+        if self.bpm.count:
+            features["BPM"] = self.bpm.value()[0]
+        if self.novelty.count:
+            features["Novelty"] = self.novelty.value()[0]
+        if self.keys:
+            (features["Key"], features["Key Scale"]), _ = self.keys.most_common(1)[0]
+        if self.time_signatures:
+            features["Time Signature"] = self.time_signatures.most_common(1)[0][0]
+        return {
+            feature: features[feature]
+            for feature in ALGORITHM_FEATURES
+            if self.selected is None or feature in self.selected
+        }
+
+    def model_features(self) -> dict:
+        predictions = {}
+        for widths, quantile in self.heads.values():
+            medians = quantile.value()
+            offsets = np.cumsum([0, *widths.values()])
+            for head, start, end in zip(widths, offsets, offsets[1:]):
+                predictions[head] = medians[start:end]
+        return model_features(predictions, self.embeddings.value(), self.selected)
+
+
+def selected_graph(features: list[str] | None) -> FeatureGraph:
+    """Descriptor nodes that segment-wise reductions of `features` need."""
+    return ALGORITHMS_GRAPH.subgraph(
+        WINDOWED_NODES.get(feature, node)
+        for feature, (node, _) in ALGORITHM_FEATURES.items()
+        if features is None or feature in features
+    )
+
+
+def analyze_segment(
+    aggregator: WindowedAggregator,
+    graph: FeatureGraph,
+    outputs: set[str],
+    audio: np.ndarray,
+    sample_rate: int,
+    start: int,
+    end: int,
+):
+    """Feed one window to the aggregator; its segment is [start, end) samples."""
+    audio16k = resample(audio, sample_rate, MODELS_SAMPLE_RATE)
+    if graph.nodes:
+        # Rescale the segment bounds from the file's rate to each buffer's
+        audio44k = resample(audio, sample_rate, ALGORITHMS_SAMPLE_RATE)
+        segment44k, segment16k = (
+            np.ascontiguousarray(
+                resampled[start * rate // sample_rate : end * rate // sample_rate]
+            )
+            for resampled, rate in [
+                (audio44k, ALGORITHMS_SAMPLE_RATE),
+                (audio16k, MODELS_SAMPLE_RATE),
+            ]
+        )
+        values, _ = graph.run(
+            {"audio44k": segment44k, "audio16k": segment16k}, graph_executor()
+        )
+        aggregator.add_algorithms(values, (end - start) / sample_rate)
+
+    if outputs:
+        groups, embeddings = model_predictions(audio16k, MODELS_SAMPLE_RATE, outputs)
+        aggregator.add_models(groups, embeddings, (len(audio), start, end))
+
+
+def analyze_windowed(
+    path: str,
+    duration: float,
+    segment: float,
+    context: float,
+    on_stage,
+    features: list[str] | None = None,
+) -> dict:
+    aggregator = WindowedAggregator(features)
+    graph, outputs = selected_graph(features), model_outputs(features)
+    for index, window in enumerate(read_windows(path, segment, context)):
+        if index == 0:
+            on_stage("decode", {"Duration": duration})
+        analyze_segment(aggregator, graph, outputs, *window)
+
+    algorithms = aggregator.algorithm_features()
+    on_stage("algorithms", algorithms)
+    models = aggregator.model_features()
+    on_stage("models", models)
+    return algorithms | models
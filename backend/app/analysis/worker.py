@@ -0,0 +1,77 @@
+"""Compute-tier worker that runs queued analysis jobs.
+
+Run as many of these as there are cores to spare with
+`python -m app.analysis.worker`; they coordinate through the jobs table.
+"""
+
+import asyncio
+import logging
+
+from app.analysis import jobs
+from app.analysis.cache import result_cache
+from app.analysis.service import analyze_audio, to_jsonable
+from app.analysis.uploads import file_digest
+from app.config import settings
+from app.db import AsyncSessionLocal, init_db
+from app.inference.models import registry
+from app.metrics import queue_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+
+async def keep_alive(job_id: str):
+    while True:
+        await asyncio.sleep(settings.ANALYSIS_JOB_TIMEOUT / 4)
+        async with AsyncSessionLocal() as db:
+            await jobs.heartbeat(db, job_id)
+
+
+async def process_job(job):
+    loop = asyncio.get_running_loop()
+
+    async def complete_stage(stage):
+        async with AsyncSessionLocal() as db:
+            await jobs.complete_stage(db, job.id, stage)
+
+    def on_stage(stage, features):
+        # Called from the analysis thread
+        asyncio.run_coroutine_threadsafe(complete_stage(stage), loop).result()
+
+    heartbeat = asyncio.create_task(keep_alive(job.id))
+    try:
+        features = await loop.run_in_executor(
+            None, analyze_audio, job.upload_path, on_stage
+        )
+        result, error = to_jsonable(features), None
+        cache_key = result_cache.key_from_digest(file_digest(job.upload_path))
+        result_cache.put(cache_key, result)
+    except Exception as e:
+        logger.error(f"Error analyzing job {job.id}: {e}")
+        result, error = None, str(e)
+    finally:
+        heartbeat.cancel()
+
+    async with AsyncSessionLocal() as db:
+        await jobs.finish_job(db, job.id, result=result, error=error)
+
+
+async def run_worker():
+    await init_db()
+    if settings.MODELS_WARMUP:
+        registry.warmup()
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            job = await jobs.claim_job(db)
+        if job is None:
+            await asyncio.sleep(settings.ANALYSIS_JOB_POLL_INTERVAL)
+            continue
+        logger.info(f"Processing job {job.id} (attempt {job.attempts})")
+        wait = (job.started_at - job.created_at).total_seconds()
+        queue_wait_seconds.labels("jobs").observe(wait)
+        await process_job(job)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker())
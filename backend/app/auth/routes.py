@@ -1,4 +1,5 @@
 from datetime import timedelta
+from functools import cache
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
@@ -13,14 +14,15 @@ class UserLogin(BaseModel):
     password: str
 
 
-fake_user_db = {
-    "user": {"username": "user", "hashed_password": hash_password("password")}
-}
+@cache
+def fake_user_db() -> dict:
+    # Hashing takes a few hundred milliseconds with bcrypt, so not at import
+    return {"user": {"username": "user", "hashed_password": hash_password("password")}}
 
 
 @auth_router.post("/login")
 def login(user: UserLogin):
-    user_data = fake_user_db.get(user.username)
+    user_data = fake_user_db().get(user.username)
     if not user_data or not verify_password(user.password, user_data["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token(
@@ -1,22 +1,30 @@
 from datetime import datetime, timedelta
-
-from jose import jwt
-from passlib.context import CryptContext
+from functools import cache
 
 SECRET_KEY = "your_secret_key"  # Use .env to load secrets
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# python-jose and passlib load the cryptography bindings, so they are only
+# imported once a password or token is handled rather than at startup
+@cache
+def pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta):
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
@@ -0,0 +1,85 @@
+"""Compute the song catalog's feature statistics, matrix and sorted columns.
+
+    python -m app.catalog.build
+    python -m app.catalog.build --rebuild
+
+Only the songs that the statistics at CATALOG_STATS_PATH don't count yet
+are read from `songs`, in one query, unless --rebuild starts over. Run it
+after songs are ingested to bring all three up to date; API processes pick
+up the additions.
+"""
+
+import argparse
+import asyncio
+import os
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.catalog.matrix import FeatureMatrix
+from app.catalog.percentiles import CatalogPercentiles
+from app.catalog.stats import COLUMNS, FEATURES, FeatureStats
+from app.config import settings
+
+NEW_SONGS = text(
+    f"SELECT video_id, {', '.join(FEATURES + COLUMNS)} FROM songs "
+    "WHERE NOT (video_id = ANY(:known))"
+)
+
+
+async def read_songs(
+    known: list[str], batch_size: int = 10_000
+) -> tuple[np.ndarray, np.ndarray]:
+    """Video IDs, FEATURES and then COLUMNS of the songs whose video ID isn't `known`."""
+    engine = create_async_engine(settings.DATABASE_URL)
+    video_ids, values = [], []
+    async with engine.connect() as connection:
+        rows = await connection.stream(NEW_SONGS, {"known": known})
+        async for batch in rows.partitions(batch_size):
+            for video_id, *features in batch:
+                video_ids.append(video_id)
+                values.append([np.nan if value is None else value for value in features])
+    await engine.dispose()
+    return (
+        np.array(video_ids, dtype=str),
+        np.array(values, dtype=np.float64).reshape(-1, len(FEATURES) + len(COLUMNS)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stats", default=settings.CATALOG_STATS_PATH)
+    parser.add_argument("--matrix", default=settings.CATALOG_MATRIX_PATH)
+    parser.add_argument("--percentiles", default=settings.CATALOG_PERCENTILES_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Read every song again")
+    arguments = parser.parse_args()
+
+    built = [
+        arguments.stats,
+        os.path.join(arguments.matrix, "values.npy"),
+        os.path.join(arguments.percentiles, "offsets.npy"),
+    ]
+    if arguments.rebuild or not all(os.path.exists(path) for path in built):
+        stats, matrix = FeatureStats.empty(), FeatureMatrix.empty()
+        percentiles = CatalogPercentiles.empty()
+    else:
+        stats, matrix = FeatureStats.load(arguments.stats), FeatureMatrix.load(
+            arguments.matrix
+        )
+        percentiles = CatalogPercentiles.load(arguments.percentiles)
+    video_ids, values = asyncio.run(read_songs(stats.video_ids.tolist()))
+    stats.update(video_ids, values[:, : len(FEATURES)])
+    stats.save(arguments.stats)
+    # Loaded ones save their own updates
+    matrix.update(video_ids, values[:, len(FEATURES) :])
+    if matrix.path is None:
+        matrix.save(arguments.matrix)
+    percentiles.update(values[:, : len(FEATURES)])
+    if percentiles.path is None:
+        percentiles.save(arguments.percentiles)
+    print(f"{len(video_ids)} new songs, {len(stats)} in the catalog")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""The song catalog's feature columns as one float32 matrix, by video ID.
+
+Row i of `values` holds the COLUMNS of `songs` for video_ids[i], NaN where
+a song lacks a feature. The matrix is saved as .npy files that every
+process loads memory-mapped, sharing the pages read-only, so comparing an
+upload with any K songs is a row gather and a few array operations rather
+than K queries.
+"""
+
+import os
+
+import numpy as np
+
+from app.catalog.stats import COLUMNS
+from app.config import settings
+from app.search.ann import save_array
+
+
+class FeatureMatrix:
+    """(songs, COLUMNS) float32 feature values and the video ID of each row."""
+
+    FILES = ["values", "video_ids"]
+
+    def __init__(
+        self, values: np.ndarray, video_ids: np.ndarray, path: str | None = None
+    ):
+        self.values = values
+        self.video_ids = video_ids
+        # Where the matrix was loaded from, which updates are saved to
+        self.path = path
+        self._mtime = self.mtime()
+        self._order = None
+        self._spread = None
+
+    @classmethod
+    def empty(cls) -> "FeatureMatrix":
+        return cls(np.empty((0, len(COLUMNS)), dtype=np.float32), np.empty(0, dtype=str))
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureMatrix":
+        return cls(
+            *(
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in cls.FILES
+            ),
+            path=path,
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        # Video IDs first, since readers reload when values.npy changes
+        for name in reversed(self.FILES):
+            save_array(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+        self.path = path
+        self._mtime = self.mtime()
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    def mtime(self) -> int | None:
+        if self.path is None:
+            return None
+        try:
+            return os.stat(os.path.join(self.path, "values.npy")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Pick up the songs another process added since this one loaded."""
+        mtime = self.mtime()
+        if mtime is None or mtime == self._mtime:
+            return
+        updated = FeatureMatrix.load(self.path)
+        # Caught between the two files of an update: take it up next time
+        if len(updated.values) == len(updated.video_ids):
+            self.values, self.video_ids = updated.values, updated.video_ids
+            self._mtime, self._order, self._spread = mtime, None, None
+
+    def update(self, video_ids, values: np.ndarray):
+        """Add the rows of songs not in the matrix yet, saving them if loaded from disk.
+
+        Only one process should update a matrix at a time.
+        """
+        video_ids = np.asarray(video_ids, dtype=str)
+        new = np.zeros(len(video_ids), dtype=bool)
+        new[np.unique(video_ids, return_index=True)[1]] = True
+        new &= self.rows(video_ids) < 0
+        if not new.any():
+            return
+        self.values = np.vstack([self.values, np.asarray(values, dtype=np.float32)[new]])
+        self.video_ids = np.concatenate([self.video_ids, video_ids[new]])
+        self._order = self._spread = None
+        if self.path is not None:
+            self.save(self.path)
+
+    def rows(self, video_ids) -> np.ndarray:
+        """Row of each video ID, or -1 for those not in the matrix."""
+        if self._order is None:
+            self._order = np.argsort(self.video_ids)
+        video_ids = np.asarray(video_ids, dtype=str)
+        if len(self) == 0:
+            return np.full(len(video_ids), -1)
+        positions = np.searchsorted(self.video_ids, video_ids, sorter=self._order)
+        rows = self._order[np.minimum(positions, len(self) - 1)]
+        return np.where(self.video_ids[rows] == video_ids, rows, -1)
+
+    @property
+    def spread(self) -> np.ndarray:
+        """Standard deviation of every column over the catalog."""
+        if self._spread is None:
+            with np.errstate(all="ignore"):
+                self._spread = np.nanstd(self.values, axis=0, dtype=np.float64)
+        return self._spread
+
+    def compare(self, upload: np.ndarray, video_ids) -> dict:
+        """How an upload's normalized COLUMNS vector differs from some songs.
+
+        Returns (songs, COLUMNS) arrays of the `songs`' values, of the
+        `deltas` of the upload from each and of their `z_scores`, deltas in
+        catalog standard deviations, and for each song the columns `ranked`
+        by how far the upload is from it, furthest first, with NaN deltas
+        last. Songs not in the matrix have NaN rows.
+        """
+        rows = self.rows(video_ids)
+        songs = np.full((len(rows), len(COLUMNS)), np.nan, dtype=np.float32)
+        songs[rows >= 0] = self.values[rows[rows >= 0]]
+        deltas = np.asarray(upload, dtype=np.float32) - songs
+        spread = self.spread
+        z_scores = np.divide(
+            deltas, spread, out=np.full(deltas.shape, np.nan), where=spread > 0
+        )
+        distance = np.nan_to_num(np.abs(z_scores), nan=-1)
+        return {
+            "songs": songs,
+            "deltas": deltas,
+            "z_scores": z_scores,
+            "ranked": np.argsort(-distance, axis=1, kind="stable"),
+        }
+
+    def differences(self, upload: np.ndarray, video_ids) -> list[dict]:
+        """compare() of each song, keyed by column, leaving out NaN deltas."""
+        comparison = self.compare(upload, video_ids)
+        differences = []
+        for deltas, z_scores, ranked in zip(
+            comparison["deltas"], comparison["z_scores"], comparison["ranked"]
+        ):
+            compared = [column for column in ranked if not np.isnan(deltas[column])]
+            differences.append(
+                {
+                    "deltas": {
+                        COLUMNS[column]: float(deltas[column]) for column in compared
+                    },
+                    "z_scores": {
+                        COLUMNS[column]: float(z_scores[column]) for column in compared
+                    },
+                    "ranked": [COLUMNS[column] for column in compared],
+                }
+            )
+        return differences
+
+
+_matrix = None
+
+
+def feature_matrix() -> FeatureMatrix:
+    """The matrix at CATALOG_MATRIX_PATH, loaded once per process and kept current."""
+    global _matrix
+    if _matrix is None:
+        _matrix = FeatureMatrix.load(settings.CATALOG_MATRIX_PATH)
+    _matrix.refresh()
+    return _matrix
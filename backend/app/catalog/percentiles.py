@@ -0,0 +1,132 @@
+"""Where an analysis's features fall across the song catalog.
+
+Every FEATURES column of `songs` is kept sorted, so the percentile of a
+value is a pair of binary searches in its column: no COUNT(*) per feature
+and request. Columns are saved as .npy files that every process loads
+memory-mapped, and songs are added by merging their values in, without
+sorting a column again.
+"""
+
+import os
+
+import numpy as np
+
+from app.catalog.stats import ANALYSIS_NAMES, FEATURES, analysis_vector
+from app.config import settings
+from app.search.ann import save_array
+
+
+class CatalogPercentiles:
+    """Sorted values of every feature over the catalog, NaN left out.
+
+    The values of feature i are values[offsets[i] : offsets[i + 1]].
+    """
+
+    FILES = ["values", "offsets"]
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray, path: str | None = None):
+        self.values = values
+        self.offsets = offsets
+        # Where the columns were loaded from, which updates are saved to
+        self.path = path
+        self._mtime = self.mtime()
+
+    @classmethod
+    def empty(cls) -> "CatalogPercentiles":
+        return cls(np.empty(0), np.zeros(len(FEATURES) + 1, dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: str) -> "CatalogPercentiles":
+        return cls(
+            *(
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in cls.FILES
+            ),
+            path=path,
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        # Offsets last, since readers reload when offsets.npy changes
+        for name in self.FILES:
+            save_array(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+        self.path = path
+        self._mtime = self.mtime()
+
+    def mtime(self) -> int | None:
+        if self.path is None:
+            return None
+        try:
+            return os.stat(os.path.join(self.path, "offsets.npy")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Pick up the songs another process added since this one loaded."""
+        mtime = self.mtime()
+        if mtime is None or mtime == self._mtime:
+            return
+        updated = CatalogPercentiles.load(self.path)
+        # Caught between the two files of an update: take it up next time
+        if updated.offsets[-1] == len(updated.values):
+            self.values, self.offsets = updated.values, updated.offsets
+            self._mtime = mtime
+
+    def column(self, feature: int) -> np.ndarray:
+        return self.values[self.offsets[feature] : self.offsets[feature + 1]]
+
+    def update(self, values: np.ndarray):
+        """Merge in the features of new songs, a (songs, FEATURES) array.
+
+        Saved if the columns were loaded from disk. Only one process should
+        update them at a time.
+        """
+        columns = []
+        for feature in range(len(FEATURES)):
+            column, new = self.column(feature), np.sort(values[:, feature])
+            new = new[~np.isnan(new)]
+            columns.append(np.insert(column, np.searchsorted(column, new), new))
+        self.values = np.concatenate(columns)
+        self.offsets = np.concatenate(
+            [[0], np.cumsum([len(column) for column in columns])]
+        )
+        if self.path is not None:
+            self.save(self.path)
+
+    def percentiles(self, values: np.ndarray) -> np.ndarray:
+        """Percent of the catalog below each of a FEATURES vector's values.
+
+        Songs of the same value count half. Missing values, and features no
+        song has, are NaN.
+        """
+        percentiles = np.full(len(FEATURES), np.nan)
+        for feature, value in enumerate(values):
+            column = self.column(feature)
+            if np.isnan(value) or len(column) == 0:
+                continue
+            below = np.searchsorted(column, value, side="left")
+            above = np.searchsorted(column, value, side="right")
+            percentiles[feature] = 100 * (below + above) / 2 / len(column)
+        return percentiles
+
+    def of_analysis(self, result: dict) -> dict[str, float]:
+        """Percentile of each catalog feature of an analysis result, by its name there."""
+        return {
+            ANALYSIS_NAMES[feature]: float(percentile)
+            for feature, percentile in zip(
+                FEATURES, self.percentiles(analysis_vector(result))
+            )
+            if not np.isnan(percentile)
+        }
+
+
+_percentiles = None
+
+
+def catalog_percentiles() -> CatalogPercentiles:
+    """The columns at CATALOG_PERCENTILES_PATH, loaded once per process, kept current."""
+    global _percentiles
+    if _percentiles is None:
+        _percentiles = CatalogPercentiles.load(settings.CATALOG_PERCENTILES_PATH)
+    _percentiles.refresh()
+    return _percentiles
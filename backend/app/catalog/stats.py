@@ -0,0 +1,276 @@
+"""Statistics of the feature columns of the song catalog.
+
+Minimum, maximum, mean, standard deviation and a few quantiles of every
+feature column of `songs`, computed in one pass over the rows and saved
+to a file that each process loads once, rather than asking Postgres for
+the MIN and MAX of every feature on every comparison.
+
+New songs are merged in without going over the catalog again: counts,
+extremes and moments exactly, quantiles from a uniform sample of at most
+SAMPLE_SIZE songs, which is the whole catalog while it is smaller.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from app.analysis.selection import FEATURES as ANALYSIS_FEATURES
+from app.config import settings
+
+# Feature columns of `songs`, each with a `<feature>_normalized` column
+# scaled to [0, 1] over the catalog, except for the RAW ones
+FEATURES = [
+    "danceability",
+    "loudness",
+    "bpm",
+    "energy",
+    "inharmonicity",
+    "timbre",
+    "onset_rate",
+    "brightness",
+    "dynamic_complexity",
+    "novelty",
+    "approachability",
+    "engagement",
+    "valence",
+    "arousal",
+    "aggressive",
+    "happy",
+    "party",
+    "relaxed",
+    "sad",
+    "acoustic",
+    "electronic",
+    "voice",
+    "instrumental",
+    "female",
+    "male",
+    "bright",
+    "dark",
+    "dry",
+    "wet",
+]
+RAW_FEATURES = {"bpm", "onset_rate"}
+# Name of the column each feature is compared by
+COLUMNS = [
+    feature if feature in RAW_FEATURES else f"{feature}_normalized"
+    for feature in FEATURES
+]
+# Name of each feature in an analysis result, "BPM" for "bpm"
+ANALYSIS_NAMES = {
+    name.lower().replace(" ", "_"): name
+    for name in ANALYSIS_FEATURES
+    if name.lower().replace(" ", "_") in FEATURES
+}
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+SAMPLE_SIZE = 10_000
+
+
+def feature_vector(features: dict) -> np.ndarray:
+    """A dict of the FEATURES, as the scripts' analyses are, as a float64 vector.
+
+    Missing features are NaN.
+    """
+    return np.array(
+        [
+            np.nan if features.get(feature) is None else float(features[feature])
+            for feature in FEATURES
+        ]
+    )
+
+
+def analysis_vector(result: dict) -> np.ndarray:
+    """The FEATURES of an analysis result, keyed by ANALYSIS_NAMES, as a vector.
+
+    Missing features, and those the analysis couldn't compute, are NaN.
+    """
+    values = np.full(len(FEATURES), np.nan)
+    for index, feature in enumerate(FEATURES):
+        value = result.get(ANALYSIS_NAMES[feature])
+        if isinstance(value, (int, float, np.number)):
+            values[index] = value
+    return values
+
+
+class FeatureStats:
+    """Running statistics of the FEATURES of the songs with the given video IDs.
+
+    `count`, `minimum`, `maximum`, `mean` and `m2` (the sum of squared
+    deviations from the mean) are per feature, over the songs that have
+    it. `sample` holds the features of a uniform sample of the songs.
+    """
+
+    def __init__(
+        self,
+        video_ids: np.ndarray,
+        count: np.ndarray,
+        minimum: np.ndarray,
+        maximum: np.ndarray,
+        mean: np.ndarray,
+        m2: np.ndarray,
+        sample: np.ndarray,
+    ):
+        self.video_ids = video_ids
+        self.count = count
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = mean
+        self.m2 = m2
+        self.sample = sample
+        self._known = None
+
+    @classmethod
+    def empty(cls) -> "FeatureStats":
+        features = len(FEATURES)
+        return cls(
+            np.empty(0, dtype=str),
+            np.zeros(features, dtype=np.int64),
+            np.full(features, np.nan),
+            np.full(features, np.nan),
+            np.zeros(features),
+            np.zeros(features),
+            np.empty((0, features)),
+        )
+
+    @classmethod
+    def from_songs(cls, video_ids, values: np.ndarray) -> "FeatureStats":
+        """Statistics of songs, given a (songs, FEATURES) array with NaN gaps."""
+        stats = cls.empty()
+        stats.update(video_ids, values)
+        return stats
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureStats":
+        with np.load(path) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    def save(self, path: str):
+        """Write the statistics atomically, so readers never see half of them."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path) or ".", suffix=".npz", delete=False
+        ) as file:
+            np.savez(
+                file,
+                video_ids=self.video_ids,
+                count=self.count,
+                minimum=self.minimum,
+                maximum=self.maximum,
+                mean=self.mean,
+                m2=self.m2,
+                sample=self.sample,
+            )
+        os.replace(file.name, path)
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    def __contains__(self, video_id: str) -> bool:
+        if self._known is None:
+            self._known = set(self.video_ids.tolist())
+        return video_id in self._known
+
+    def update(self, video_ids, values: np.ndarray):
+        """Merge in the features of new songs, a (songs, FEATURES) array.
+
+        Songs already counted are skipped, so the same rows can be offered
+        more than once.
+        """
+        video_ids = np.asarray(video_ids, dtype=str)
+        new = np.zeros(len(video_ids), dtype=bool)
+        new[np.unique(video_ids, return_index=True)[1]] = True
+        new &= np.array([video_id not in self for video_id in video_ids], dtype=bool)
+        video_ids, values = video_ids[new], np.asarray(values, dtype=np.float64)[new]
+        if len(video_ids) == 0:
+            return
+
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        mean = np.nansum(values, axis=0) / np.maximum(count, 1)
+        m2 = np.nansum((values - mean) ** 2, axis=0)
+        # Chan et al.'s merge of the moments of two sets
+        total = self.count + count
+        delta = mean - self.mean
+        share = np.divide(count, total, out=np.zeros(len(FEATURES)), where=total > 0)
+        self.m2 = self.m2 + m2 + delta**2 * self.count * share
+        self.mean = self.mean + delta * share
+        self.count = total
+        self.minimum = np.fmin(self.minimum, np.where(present, values, np.inf).min(0))
+        self.maximum = np.fmax(self.maximum, np.where(present, values, -np.inf).max(0))
+        self.minimum[self.count == 0] = self.maximum[self.count == 0] = np.nan
+
+        self.sample = self._sampled(values)
+        self.video_ids = np.concatenate([self.video_ids, video_ids])
+        self._known = None
+
+    def _sampled(self, values: np.ndarray) -> np.ndarray:
+        """The sample with new songs drawn into it, by reservoir sampling."""
+        seen = len(self)
+        room = max(SAMPLE_SIZE - len(self.sample), 0)
+        sample = np.vstack([self.sample, values[:room]])
+        rest = values[room:]
+        if len(rest):
+            rng = np.random.default_rng(seen)
+            # Song i of the catalog replaces a random sampled one with
+            # probability SAMPLE_SIZE / (i + 1)
+            slots = rng.integers(0, seen + room + np.arange(len(rest)) + 1)
+            kept = slots < SAMPLE_SIZE
+            sample[slots[kept]] = rest[kept]
+        return sample
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2 / np.maximum(self.count, 1))
+
+    def quantiles(self, quantiles=QUANTILES) -> np.ndarray:
+        """(quantiles, FEATURES) array of the features' quantiles."""
+        if len(self.sample) == 0:
+            return np.full((len(quantiles), len(FEATURES)), np.nan)
+        with np.errstate(all="ignore"):
+            return np.nanquantile(self.sample, quantiles, axis=0)
+
+    def normalize(self, values: np.ndarray) -> np.ndarray:
+        """Features scaled to [0, 1] like the `_normalized` columns of `songs`.
+
+        `values` is a FEATURES vector, or an array of them. RAW_FEATURES are
+        left as they are, and features of a single value in the catalog are 0.
+        """
+        span = self.maximum - self.minimum
+        scaled = np.divide(
+            values - self.minimum,
+            span,
+            out=np.zeros(np.shape(values)),
+            where=span > 0,
+        )
+        raw = np.isin(FEATURES, list(RAW_FEATURES))
+        return np.where(raw | np.isnan(values), values, scaled)
+
+    def summary(self) -> dict:
+        """Statistics of every feature, by name."""
+        quantiles = self.quantiles()
+        return {
+            feature: {
+                "count": int(self.count[index]),
+                "min": float(self.minimum[index]),
+                "max": float(self.maximum[index]),
+                "mean": float(self.mean[index]),
+                "std": float(self.std[index]),
+                "quantiles": {
+                    str(quantile): float(value)
+                    for quantile, value in zip(QUANTILES, quantiles[:, index])
+                },
+            }
+            for index, feature in enumerate(FEATURES)
+        }
+
+
+_stats = None
+
+
+def feature_stats() -> FeatureStats:
+    """The statistics at CATALOG_STATS_PATH, loaded once per process."""
+    global _stats
+    if _stats is None:
+        _stats = FeatureStats.load(settings.CATALOG_STATS_PATH)
+    return _stats
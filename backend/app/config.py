@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -16,6 +17,91 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str = ""
 
+    # Essentia TensorFlow models
+    MODELS_PATH: str = "/backend/models"
+    DATA_PATH: str = "/backend/data"
+    MODELS_WARMUP: bool = True
+    MODELS_MEMORY_BUDGET_MB: int = 0  # 0 keeps every loaded model resident
+    MODELS_CACHE_PATH: str = os.path.join(tempfile.gettempdir(), "popcast-models")
+
+    # Analysis worker pool, per API worker
+    ANALYSIS_WORKERS: int = 1
+    ANALYSIS_THREADS_PER_WORKER: int = 0  # 0 lets numpy and TensorFlow decide
+    ANALYSIS_MAX_QUEUE: int = 4
+    ANALYSIS_RETRY_AFTER: int = 30
+    # Processes each analysis spreads its descriptors over; 0 or 1 runs them inline
+    ANALYSIS_GRAPH_WORKERS: int = 0
+
+    # Uploads are spooled to disk, and refused beyond these limits
+    ANALYSIS_UPLOADS_PATH: str = tempfile.gettempdir()
+    ANALYSIS_MAX_UPLOAD_MB: int = 500
+    ANALYSIS_MAX_DURATION: int = 3 * 3600  # Seconds of audio
+
+    # Tracks longer than this are analyzed in windows of a segment plus some
+    # context on either side, to bound memory
+    ANALYSIS_WINDOWED_AFTER: int = 15 * 60
+    ANALYSIS_WINDOW_SEGMENT: int = 120
+    ANALYSIS_WINDOW_CONTEXT: int = 5
+    # Embedding frames a windowed analysis returns at most, evenly spaced
+    ANALYSIS_MAX_EMBEDDINGS: int = 1024
+
+    # Where every process writes its Prometheus samples, emptied before the
+    # service starts by app.metrics_reset
+    METRICS_PATH: str = os.path.join(tempfile.gettempdir(), "popcast-metrics")
+
+    # Fast mode analyzes this many excerpts of a track, of so many seconds each
+    ANALYSIS_EXCERPTS: int = 3
+    ANALYSIS_EXCERPT_SECONDS: int = 30
+
+    # Analysis jobs, run by `python -m app.analysis.worker`
+    ANALYSIS_JOBS_PATH: str = "/backend/jobs"  # Must be shared with the workers
+    ANALYSIS_JOB_TIMEOUT: int = 1800  # Seconds without heartbeat before a retry
+    ANALYSIS_JOB_MAX_ATTEMPTS: int = 3
+    ANALYSIS_JOB_POLL_INTERVAL: float = 1.0
+
+    # Analysis result cache. Bump ANALYSIS_VERSION whenever the extractor or its
+    # models change, so that stale results are never served.
+    ANALYSIS_VERSION: str = "1"
+    ANALYSIS_CACHE_PATH: str = "/backend/cache"  # Empty disables the disk tier
+    ANALYSIS_CACHE_ENTRIES: int = 128
+    ANALYSIS_CACHE_DISK_MB: int = 1024
+    ANALYSIS_CACHE_MAX_AGE: int = 30 * 24 * 3600
+
+    # Similar songs, voted for by the clips of a catalog that
+    # `python -m app.search.build` makes
+    SEARCH_CATALOG_PATH: str = "/backend/search"
+    SEARCH_TOP_CLIPS: int = 10_000  # Catalog clips that vote, per query clip
+    SEARCH_SONGS: int = 10
+    # In-process index of the song embeddings, that `python -m
+    # app.search.build_index` makes; queries scan this many of its clusters
+    SEARCH_INDEX_PATH: str = "/backend/search/songs"
+    SEARCH_INDEX_PROBES: int = 8
+    # Candidates of a compressed index that are ranked by their full vectors
+    SEARCH_INDEX_RERANK: int = 300
+
+    # Statistics, feature matrix and sorted feature columns of the songs
+    # catalog, that `python -m app.catalog.build` computes and brings up to date
+    CATALOG_STATS_PATH: str = "/backend/catalog/stats.npz"
+    CATALOG_MATRIX_PATH: str = "/backend/catalog/features"
+    CATALOG_PERCENTILES_PATH: str = "/backend/catalog/percentiles"
+
+    # Improvement suggestions: the upload is compared with this many of the
+    # songs whose CLAP embeddings are nearest to its own, which a pool of
+    # this many workers, apart from the analysis pool, computes
+    CLAP_MODEL_PATH: str = "/backend/models/music_audioset_epoch_15_esc_90.14.pt"
+    IMPROVEMENT_SIMILAR_SONGS: int = 3
+    IMPROVEMENT_EMBEDDING_WORKERS: int = 1
+
+    # pgvector index of audio_embeddings, which the Alembic migrations create
+    # as set here. Changing these takes a downgrade and upgrade of the index.
+    VECTOR_INDEX: str = "hnsw"  # Or "ivfflat"
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_IVFFLAT_LISTS: int = 0  # 0 picks one from the number of rows
+    # Defaults of the per-query knobs: higher finds more true neighbours, slower
+    VECTOR_EF_SEARCH: int = 40
+    VECTOR_PROBES: int = 1
+
 
 # Default values
 POSTGRES_HOST = "localhost"
@@ -15,8 +15,9 @@ AsyncSessionLocal = sessionmaker(
 async def init_db():
     from app.models import user
 
+    # The other tables, analysis_jobs among them, are made by `alembic upgrade head`
     async with engine.begin() as conn:
-        await conn.run_sync(user.Base.metadata.create_all)
+        await conn.run_sync(user.Base.metadata.create_all, tables=[user.User.__table__])
 
 
 async def get_db():
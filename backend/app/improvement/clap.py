@@ -0,0 +1,39 @@
+"""CLAP embeddings of audio, the vectors that audio_embeddings holds.
+
+laion_clap brings in PyTorch, so like the analysis pipeline this module is
+only imported by the worker processes that compute embeddings.
+"""
+
+import laion_clap
+import numpy as np
+import torch
+
+from app.analysis.audio import decode_audio, resample
+from app.config import settings
+
+# The rate CLAP was trained at, whatever the rate of the file
+SAMPLE_RATE = 48000
+
+_model = None
+
+
+def clap_model() -> laion_clap.CLAP_Module:
+    """The CLAP model at CLAP_MODEL_PATH, loaded once per process."""
+    global _model
+    if _model is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        _model = laion_clap.CLAP_Module(
+            enable_fusion=False, device=device, amodel="HTSAT-base"
+        )
+        _model.load_ckpt(settings.CLAP_MODEL_PATH)
+    return _model
+
+
+def clap_embedding(path: str) -> np.ndarray:
+    """The 512-dimensional CLAP embedding of an audio file."""
+    audio = decode_audio(path)
+    audio48k = resample(audio.audio, audio.sample_rate, SAMPLE_RATE)
+    embedding = clap_model().get_audio_embedding_from_data(
+        x=audio48k.reshape(1, -1), use_tensor=False
+    )
+    return np.asarray(embedding[0], dtype=np.float32)
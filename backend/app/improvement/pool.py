@@ -0,0 +1,15 @@
+"""The worker pool CLAP embeddings of uploads are computed in.
+
+Apart from app.improvement.service, which imports numpy and the catalog,
+so that the API can manage the pool without loading either at startup.
+"""
+
+from app.analysis.pool import AnalysisPool
+from app.config import settings
+
+embedding_pool = AnalysisPool(
+    workers=settings.IMPROVEMENT_EMBEDDING_WORKERS,
+    max_queue=settings.ANALYSIS_MAX_QUEUE,
+    threads=settings.ANALYSIS_THREADS_PER_WORKER,
+    warmup=False,
+)
@@ -0,0 +1,48 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analysis.pool import AnalysisSaturated
+from app.analysis.routes import AUDIO_TYPES, MAX_UPLOAD_BYTES, saturated_error
+from app.analysis.uploads import UPLOAD_REQUEST_BODY, receive_upload
+from app.config import settings
+from app.db import get_db
+
+improvement_router = APIRouter()
+
+
+@improvement_router.post("/", openapi_extra=UPLOAD_REQUEST_BODY)
+async def improve(
+    request: Request,
+    count: int | None = Query(None, ge=1, le=50),
+    db: AsyncSession = Depends(get_db),
+):
+    """Compare an upload with the `count` catalog songs that sound most like it.
+
+    Returns its features, their percentiles over the catalog, and for each
+    similar song its row of `songs` and how far the upload's normalized
+    features are from it, furthest first.
+    """
+    # The service imports numpy and the catalog, so only once it is used
+    from app.improvement.service import CatalogNotBuilt, improve_audio
+
+    upload = await receive_upload(
+        request,
+        settings.ANALYSIS_UPLOADS_PATH,
+        MAX_UPLOAD_BYTES,
+        settings.ANALYSIS_MAX_DURATION,
+        AUDIO_TYPES,
+    )
+    logging.debug(f"Received file: {upload.filename}, Type: {upload.content_type}")
+    try:
+        return await improve_audio(db, upload.path, count)
+    except AnalysisSaturated:
+        raise saturated_error()
+    except CatalogNotBuilt:
+        raise HTTPException(status_code=503, detail="The song catalog isn't built yet")
+    except Exception as e:
+        logging.error(f"Error improving file: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        upload.remove()
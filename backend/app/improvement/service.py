@@ -0,0 +1,99 @@
+"""How an upload compares with the catalog songs that sound most like it.
+
+The CLAP embedding of the upload is computed in its own worker pool, and
+the songs nearest to it looked up in Postgres, while the analysis pool
+computes its Essentia features, so an improvement takes about as long as
+the slower of the two rather than the sum of every stage. Similar songs
+come from the in-process song index when it has been built, and from the
+pgvector index of Postgres otherwise.
+"""
+
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analysis.pool import analysis_pool
+from app.analysis.service import analyze_audio, to_jsonable
+from app.catalog.matrix import feature_matrix
+from app.catalog.percentiles import catalog_percentiles
+from app.catalog.stats import ANALYSIS_NAMES, analysis_vector, feature_stats
+from app.config import settings
+from app.improvement.pool import embedding_pool
+from app.search.ann import song_index
+from app.search.vectors import nearest_songs
+
+SONGS = text("SELECT * FROM songs WHERE video_id = ANY(:video_ids)")
+# The analysis features that songs are compared by
+FEATURES = list(ANALYSIS_NAMES.values())
+
+
+class CatalogNotBuilt(Exception):
+    """Raised when `python -m app.catalog.build` hasn't been run yet."""
+
+
+def clap_embedding(path: str):
+    from app.improvement.clap import clap_embedding
+
+    return clap_embedding(path)
+
+
+async def song_rows(db: AsyncSession, video_ids: list[str]) -> dict[str, dict]:
+    """Rows of `songs` by video ID, in one query."""
+    rows = await db.execute(SONGS, {"video_ids": video_ids})
+    return {row.video_id: dict(row._mapping) for row in rows}
+
+
+async def nearest(db: AsyncSession, embedding, count: int) -> list[dict]:
+    """Video ID and similarity of the `count` songs nearest to an embedding."""
+    try:
+        index = song_index()
+    except FileNotFoundError:
+        return await nearest_songs(db, embedding, count)
+    return [
+        {"video_id": video_id, "similarity": similarity}
+        for video_id, similarity in index.search(embedding, count)[0]
+    ]
+
+
+async def similar_songs(db: AsyncSession, path: str, count: int) -> list[dict]:
+    """The `count` songs nearest to the upload by CLAP embedding, with their row."""
+    embedding = await embedding_pool.run(clap_embedding, path)
+    songs = await nearest(db, embedding, count)
+    rows = await song_rows(db, [song["video_id"] for song in songs])
+    return [song | {"song": rows.get(song["video_id"])} for song in songs]
+
+
+async def improve_audio(db: AsyncSession, path: str, count: int | None = None) -> dict:
+    """An upload's features, their percentiles, and how they differ from similar songs."""
+    try:
+        stats, matrix, percentiles = (
+            feature_stats(),
+            feature_matrix(),
+            catalog_percentiles(),
+        )
+    except FileNotFoundError as e:
+        raise CatalogNotBuilt() from e
+
+    # If either stage fails, the other is cancelled and awaited before this
+    # raises, so the caller can remove the upload both of them read
+    try:
+        async with asyncio.TaskGroup() as stages:
+            songs = stages.create_task(
+                similar_songs(db, path, count or settings.IMPROVEMENT_SIMILAR_SONGS)
+            )
+            features = stages.create_task(
+                analysis_pool.run(analyze_audio, path, None, FEATURES, False)
+            )
+    except ExceptionGroup as group:
+        raise group.exceptions[0]
+    songs, features = songs.result(), to_jsonable(features.result())
+    upload = stats.normalize(analysis_vector(features))
+    differences = matrix.differences(upload, [song["video_id"] for song in songs])
+    return {
+        "features": features,
+        "percentiles": percentiles.of_analysis(features),
+        "similar_songs": [
+            song | song_differences for song, song_differences in zip(songs, differences)
+        ],
+    }
@@ -0,0 +1,14 @@
+import librosa
+import numpy as np
+
+# Rate the TensorFlow models were trained on
+MODELS_SAMPLE_RATE = 16000
+
+
+def resample(audio: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    if sample_rate != target_rate:
+        audio = librosa.resample(
+            audio, orig_sr=sample_rate, target_sr=target_rate, res_type="soxr_hq"
+        )
+    # Essentia works on contiguous float32, anything else gets copied per call
+    return np.ascontiguousarray(audio, dtype=np.float32)
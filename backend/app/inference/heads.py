@@ -0,0 +1,181 @@
+import hashlib
+import os
+
+import numpy as np
+from essentia import Pool
+from essentia.standard import TensorflowPredict
+
+# Defaults of TensorflowPredict2D, which the heads were exported for
+HEAD_INPUT = "model/Placeholder"
+HEAD_OUTPUT = "model/Sigmoid"
+FUSED_INPUT = "embeddings"
+
+# Protobuf field numbers of the GraphDef messages we need to rewrite
+GRAPH_NODE = 1
+NODE_NAME = 1
+NODE_INPUT = 3
+NODE_ATTR = 5
+ATTR_KEY = 1
+
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+
+def _read_varint(buffer: bytes, position: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def _fields(buffer: bytes):
+    """Yield (field number, wire type, payload, raw bytes) of a protobuf message."""
+    position = 0
+    while position < len(buffer):
+        start = position
+        key, position = _read_varint(buffer, position)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == VARINT:
+            payload, position = _read_varint(buffer, position)
+        elif wire_type == FIXED64:
+            payload, position = buffer[position : position + 8], position + 8
+        elif wire_type == FIXED32:
+            payload, position = buffer[position : position + 4], position + 4
+        elif wire_type == LENGTH_DELIMITED:
+            length, position = _read_varint(buffer, position)
+            payload, position = buffer[position : position + length], position + length
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield number, wire_type, payload, buffer[start:position]
+
+
+def _message_field(number: int, payload: bytes) -> bytes:
+    return _varint(number << 3 | LENGTH_DELIMITED) + _varint(len(payload)) + payload
+
+
+def _rename_node(node: bytes, name) -> bytes:
+    """Re-encode a NodeDef with `name` applied to its own name and its inputs."""
+    renamed = b""
+    for number, _, payload, raw in _fields(node):
+        if number == NODE_NAME:
+            raw = _message_field(NODE_NAME, name(payload.decode()).encode())
+        elif number == NODE_INPUT:
+            node_input = payload.decode()
+            control = "^" if node_input.startswith("^") else ""
+            input_name, _, port = node_input.lstrip("^").partition(":")
+            node_input = control + name(input_name) + (":" + port if port else "")
+            raw = _message_field(NODE_INPUT, node_input.encode())
+        elif number == NODE_ATTR:
+            key = next(
+                value for field, _, value, _ in _fields(payload) if field == ATTR_KEY
+            )
+            # Colocation hints reference node names; they are optional, so drop them
+            if key == b"_class":
+                continue
+        renamed += raw
+    return renamed
+
+
+def _node_name(node: bytes) -> str:
+    return next(
+        value for field, _, value, _ in _fields(node) if field == NODE_NAME
+    ).decode()
+
+
+def merge_head_graphs(graphs: dict[str, bytes], input_name: str = HEAD_INPUT) -> bytes:
+    """Combine frozen head graphs into one graph fed by a single input.
+
+    Every node of a head is moved under a `<head>/` scope, and each head's
+    input placeholder is replaced by the shared `FUSED_INPUT` placeholder, so one
+    session run evaluates all heads on the same embeddings.
+    """
+    merged = b""
+    shared_input = None
+    for index, (head, graph) in enumerate(graphs.items()):
+
+        def name(node_name, head=head):
+            return FUSED_INPUT if node_name == input_name else f"{head}/{node_name}"
+
+        head_input = None
+        for number, _, payload, raw in _fields(graph):
+            if number != GRAPH_NODE:
+                # Versions and the (empty) function library are the same for
+                # every head; keep the first graph's copy
+                if index == 0:
+                    merged += raw
+            elif _node_name(payload) == input_name:
+                head_input = _message_field(GRAPH_NODE, _rename_node(payload, name))
+            else:
+                merged += _message_field(GRAPH_NODE, _rename_node(payload, name))
+        if head_input is None:
+            raise ValueError(f"Head {head} has no input node {input_name}")
+        shared_input = shared_input or head_input
+    return shared_input + merged
+
+
+class FusedHeads:
+    """Runs all the classifier heads that share one embedding in a single session."""
+
+    def __init__(self, specs: list, models_path: str, cache_path: str):
+        self.heads = [spec.name for spec in specs]
+        self.outputs = [f"{spec.name}/{spec.output or HEAD_OUTPUT}" for spec in specs]
+
+        graphs = {}
+        for spec in specs:
+            with open(spec.graph_path(models_path), "rb") as graph_file:
+                graphs[spec.name] = graph_file.read()
+        merged = merge_head_graphs(graphs)
+
+        # Essentia only loads graphs from disk. Name the merged graph after its
+        # content so that workers and restarts reuse the same file.
+        os.makedirs(cache_path, exist_ok=True)
+        digest = hashlib.sha1(merged).hexdigest()[:16]
+        graph_filename = os.path.join(cache_path, f"fused-heads-{digest}.pb")
+        if not os.path.exists(graph_filename):
+            temporary_filename = f"{graph_filename}.{os.getpid()}.tmp"
+            with open(temporary_filename, "wb") as graph_file:
+                graph_file.write(merged)
+            os.replace(temporary_filename, graph_filename)
+
+        self.model = TensorflowPredict(
+            graphFilename=graph_filename, inputs=[FUSED_INPUT], outputs=self.outputs
+        )
+
+    def __call__(self, embeddings: np.ndarray) -> dict[str, np.ndarray]:
+        frames = len(embeddings)
+        pool = Pool()
+        # TensorflowPredict takes 4D tensors and squeezes them to the 2D input
+        pool.set(
+            FUSED_INPUT,
+            np.ascontiguousarray(embeddings, dtype=np.float32)[:, None, None, :],
+        )
+        predictions = self.model(pool)
+        return {
+            head: predictions[output].reshape(frames, -1)
+            for head, output in zip(self.heads, self.outputs)
+        }
+
+
+def median_predictions(predictions: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Reduce every head's frame predictions to their median in one pass."""
+    widths = [head_predictions.shape[1] for head_predictions in predictions.values()]
+    medians = np.median(np.hstack(list(predictions.values())), axis=0)
+    return dict(zip(predictions, np.split(medians, np.cumsum(widths)[:-1])))
@@ -0,0 +1,369 @@
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from collections import OrderedDict
+
+from essentia.standard import (
+    TensorflowPredict2D,
+    TensorflowPredictEffnetDiscogs,
+    TensorflowPredictVGGish,
+)
+
+from app.config import settings
+from app.inference.audio import MODELS_SAMPLE_RATE
+from app.inference.heads import FusedHeads
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSpec:
+    """Everything needed to build one Essentia TensorFlow model on demand."""
+
+    def __init__(
+        self,
+        name: str,
+        algorithm,
+        graph: str | None,
+        output: str | None = None,
+        embedding: str | None = None,
+        metadata: str | None = None,
+        sample_rate: int | None = None,
+    ):
+        self.name = name
+        self.algorithm = algorithm
+        self.graph = graph
+        self.output = output
+        # Name of the embedding model whose output feeds this head.
+        # Embedding models themselves have no embedding and are never evicted.
+        self.embedding = embedding
+        self.metadata = metadata
+        # Rate of the audio an embedding model was trained on, which it is
+        # always given whatever rate the caller decoded at
+        self.sample_rate = sample_rate
+
+    @property
+    def pinned(self) -> bool:
+        return self.embedding is None
+
+    def graph_path(self, models_path: str) -> str:
+        return os.path.join(models_path, self.graph)
+
+    def graph_size(self, models_path: str) -> int:
+        graph_path = self.graph_path(models_path)
+        return os.path.getsize(graph_path) if os.path.exists(graph_path) else 0
+
+    def build(self, models_path: str):
+        params = {"graphFilename": self.graph_path(models_path)}
+        if self.output:
+            params["output"] = self.output
+        return self.algorithm(**params)
+
+
+MODEL_SPECS = [
+    ModelSpec(
+        "discogs",
+        TensorflowPredictEffnetDiscogs,
+        "discogs-effnet-bs64-1.pb",
+        output="PartitionedCall:1",
+        sample_rate=MODELS_SAMPLE_RATE,
+    ),
+    ModelSpec(
+        "vggish",
+        TensorflowPredictVGGish,
+        "audioset-vggish-3.pb",
+        output="model/vggish/embeddings",
+        sample_rate=MODELS_SAMPLE_RATE,
+    ),
+    ModelSpec(
+        "approachability",
+        TensorflowPredict2D,
+        "approachability_regression-discogs-effnet-1.pb",
+        output="model/Identity",
+        embedding="discogs",
+    ),
+    ModelSpec(
+        "engagement",
+        TensorflowPredict2D,
+        "engagement_regression-discogs-effnet-1.pb",
+        output="model/Identity",
+        embedding="discogs",
+    ),
+    ModelSpec(
+        "arousal_valence",
+        TensorflowPredict2D,
+        "deam-audioset-vggish-2.pb",
+        output="model/Identity",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "aggressive",
+        TensorflowPredict2D,
+        "mood_aggressive-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "happy",
+        TensorflowPredict2D,
+        "mood_happy-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "party",
+        TensorflowPredict2D,
+        "mood_party-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "relaxed",
+        TensorflowPredict2D,
+        "mood_relaxed-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "sad",
+        TensorflowPredict2D,
+        "mood_sad-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "jamendo",
+        TensorflowPredict2D,
+        "mtg_jamendo_moodtheme-discogs-effnet-1.pb",
+        embedding="discogs",
+        metadata="mtg_jamendo_moodtheme-discogs-effnet-1.json",
+    ),
+    ModelSpec(
+        "jamendo_instrument",
+        TensorflowPredict2D,
+        "mtg_jamendo_instrument-discogs-effnet-1.pb",
+        embedding="discogs",
+        metadata="mtg_jamendo_instrument-discogs-effnet-1.json",
+    ),
+    ModelSpec(
+        "acoustic",
+        TensorflowPredict2D,
+        "mood_acoustic-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "electronic",
+        TensorflowPredict2D,
+        "mood_electronic-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "voice_instrumental",
+        TensorflowPredict2D,
+        "voice_instrumental-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "gender",
+        TensorflowPredict2D,
+        "gender-audioset-vggish-1.pb",
+        output="model/Softmax",
+        embedding="vggish",
+    ),
+    ModelSpec(
+        "timbre",
+        TensorflowPredict2D,
+        "timbre-discogs-effnet-1.pb",
+        output="model/Softmax",
+        embedding="discogs",
+    ),
+    ModelSpec(
+        "reverb",
+        TensorflowPredict2D,
+        "nsynth_reverb-discogs-effnet-1.pb",
+        output="model/Softmax",
+        embedding="discogs",
+    ),
+]
+
+
+class FusedHeadsSpec(ModelSpec):
+    """All heads of one embedding model, merged into a single graph."""
+
+    def __init__(self, name: str, heads: list[ModelSpec], cache_path: str):
+        super().__init__(name, FusedHeads, graph=None, embedding=heads[0].embedding)
+        self.heads = heads
+        self.cache_path = cache_path
+
+    def graph_size(self, models_path: str) -> int:
+        return sum(head.graph_size(models_path) for head in self.heads)
+
+    def build(self, models_path: str):
+        return FusedHeads(self.heads, models_path, self.cache_path)
+
+
+FUSED_SPECS = [
+    FusedHeadsSpec(
+        f"{embedding}_heads",
+        [spec for spec in MODEL_SPECS if spec.embedding == embedding],
+        cache_path=settings.MODELS_CACHE_PATH,
+    )
+    for embedding in ["discogs", "vggish"]
+]
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak RSS, which is the best we can get
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoadedModel:
+    def __init__(self, model, load_seconds: float, resident_bytes: int):
+        self.model = model
+        self.load_seconds = load_seconds
+        self.resident_bytes = resident_bytes
+        self.uses = 0
+        self.last_used = time.time()
+
+
+class ModelRegistry:
+    """Loads Essentia TensorFlow graphs on first use and keeps them per process.
+
+    Heads that go unused are evicted least-recently-used first once the resident
+    size of all loaded models exceeds `memory_budget` bytes (0 disables eviction).
+    Embedding models are pinned since every analysis needs them.
+    """
+
+    def __init__(
+        self,
+        specs: list[ModelSpec],
+        models_path: str,
+        data_path: str,
+        memory_budget: int = 0,
+        loader=None,
+        default_models: list[str] | None = None,
+    ):
+        self.specs = {spec.name: spec for spec in specs}
+        # What warmup() loads when not told otherwise
+        self.default_models = default_models or list(self.specs)
+        self.models_path = models_path
+        self.data_path = data_path
+        self.memory_budget = memory_budget
+        self.loader = loader or (lambda spec: spec.build(self.models_path))
+        self._loaded: OrderedDict[str, LoadedModel] = OrderedDict()
+        self._classes: dict[str, list[str]] = {}
+        self._load_stats: dict[str, dict] = {}
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def get(self, name: str):
+        with self._lock:
+            loaded = self._loaded.get(name)
+            if loaded is None:
+                loaded = self._load(name)
+            self._loaded.move_to_end(name)
+            loaded.uses += 1
+            loaded.last_used = time.time()
+            return loaded.model
+
+    def classes(self, name: str) -> list[str]:
+        """Class labels of a head, read from its Essentia metadata file."""
+        if name not in self._classes:
+            spec = self.specs[name]
+            with open(os.path.join(self.data_path, spec.metadata), "r") as metadata_file:
+                self._classes[name] = json.load(metadata_file)["classes"]
+        return self._classes[name]
+
+    def warmup(self, names: list[str] | None = None) -> dict:
+        for name in names or self.default_models:
+            self.get(name)
+        return self.stats()
+
+    def evict(self, name: str) -> bool:
+        with self._lock:
+            loaded = self._loaded.pop(name, None)
+            if loaded is None:
+                return False
+            self._evictions += 1
+            logger.info(f"Evicted model {name} ({loaded.resident_bytes} bytes)")
+            return True
+
+    def resident_bytes(self) -> int:
+        return sum(loaded.resident_bytes for loaded in self._loaded.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = {}
+            for name in self.specs:
+                loaded = self._loaded.get(name)
+                models[name] = {
+                    "loaded": loaded is not None,
+                    "pinned": self.specs[name].pinned,
+                    **self._load_stats.get(name, {}),
+                    "uses": loaded.uses if loaded else 0,
+                }
+            return {
+                "models": models,
+                "resident_bytes": self.resident_bytes(),
+                "memory_budget": self.memory_budget,
+                "evictions": self._evictions,
+            }
+
+    def _load(self, name: str) -> LoadedModel:
+        spec = self.specs[name]
+        rss_before = current_rss()
+        start = time.perf_counter()
+        model = self.loader(spec)
+        load_seconds = time.perf_counter() - start
+        resident_bytes = current_rss() - rss_before
+        if resident_bytes <= 0:
+            # The allocator reused freed pages, so the RSS delta says nothing.
+            # The frozen graph size is a lower bound on what the model holds.
+            resident_bytes = spec.graph_size(self.models_path)
+        logger.info(
+            f"Loaded model {name} in {load_seconds:.3f}s ({resident_bytes} bytes)"
+        )
+
+        loaded = LoadedModel(model, load_seconds, resident_bytes)
+        self._loaded[name] = loaded
+        self._load_stats[name] = {
+            "load_seconds": load_seconds,
+            "resident_bytes": resident_bytes,
+            "loads": self._load_stats.get(name, {}).get("loads", 0) + 1,
+        }
+        self._enforce_budget(keep=name)
+        return loaded
+
+    def _enforce_budget(self, keep: str):
+        if not self.memory_budget:
+            return
+        # _loaded is ordered from least to most recently used
+        for name in list(self._loaded):
+            if self.resident_bytes() <= self.memory_budget:
+                break
+            if name != keep and not self.specs[name].pinned:
+                self.evict(name)
+
+
+registry = ModelRegistry(
+    MODEL_SPECS + FUSED_SPECS,
+    models_path=settings.MODELS_PATH,
+    data_path=settings.DATA_PATH,
+    memory_budget=settings.MODELS_MEMORY_BUDGET_MB * 1024 * 1024,
+    # The analysis runs the heads fused, so there's no point loading them one by one
+    default_models=["discogs", "vggish", "discogs_heads", "vggish_heads"],
+)
+
+
+def model_stats() -> dict:
+    return registry.stats()
@@ -0,0 +1,41 @@
+"""Model outputs each model feature is read from.
+
+Free of Essentia and TensorFlow imports, like app.analysis.selection,
+which lists these features alongside the descriptors.
+"""
+
+# Where each model feature comes from: the output of a head, or the frames of
+# an embedding model, and which of its values ("classes" labels all of them)
+MODEL_FEATURES = {
+    "Approachability": ("approachability", 0),
+    "Engagement": ("engagement", 0),
+    "Valence": ("arousal_valence", 0),
+    "Arousal": ("arousal_valence", 1),
+    "Aggressive": ("aggressive", 0),
+    "Happy": ("happy", 0),
+    "Party": ("party", 0),
+    "Relaxed": ("relaxed", 0),
+    "Sad": ("sad", 0),
+    "Jamendo Labels": ("jamendo", "classes"),
+    "Jamendo Instruments": ("jamendo_instrument", "classes"),
+    "Acoustic": ("acoustic", 0),
+    "Electronic": ("electronic", 0),
+    "Voice": ("voice_instrumental", 0),
+    "Instrumental": ("voice_instrumental", 1),
+    "Female": ("gender", 0),
+    "Male": ("gender", 1),
+    "Bright": ("timbre", 0),
+    "Dark": ("timbre", 1),
+    "Dry": ("reverb", 0),
+    "Wet": ("reverb", 1),
+    "Embeddings": ("vggish", None),
+}
+
+
+def model_outputs(features=None) -> set[str]:
+    """Heads and embedding models the given model features are read from."""
+    return {
+        output
+        for feature, (output, _) in MODEL_FEATURES.items()
+        if features is None or feature in features
+    }
@@ -0,0 +1,109 @@
+"""Running the TensorFlow models on audio, one song or many at a time.
+
+The models live in `registry`, built once per process and reused by every
+call, by the analysis as much as by the scripts. Callers pass audio at
+whatever rate they decoded it, and each embedding model is given it at
+the rate it was trained on.
+"""
+
+import numpy as np
+
+from app.inference.audio import resample
+from app.inference.heads import median_predictions
+from app.inference.models import registry
+from app.inference.outputs import MODEL_FEATURES, model_outputs
+from app.metrics import timed
+
+EMBEDDINGS = ["discogs", "vggish"]
+
+
+def batch_predictions(songs, outputs=None) -> list[tuple[dict, np.ndarray | None]]:
+    """Frame-level predictions of the heads for each of some songs.
+
+    `songs` are (audio, sample_rate) pairs. For each song, returns the
+    predictions grouped by embedding model, and the VGGish frames. Embedding
+    models take one song at a time, since their frames can't span two, but
+    the fused heads of each run once over the frames of all the songs.
+    Only the embedding models and fused heads that `outputs` need are run.
+    """
+    outputs = model_outputs() if outputs is None else outputs
+    # Each song resampled once to each rate the embedding models need
+    inputs = [{} for _ in songs]
+    groups = [{} for _ in songs]
+    embeddings = [{} for _ in songs]
+    for embedding in EMBEDDINGS:
+        heads = [
+            output for output in outputs if registry.specs[output].embedding == embedding
+        ]
+        if not heads and embedding not in outputs:
+            continue
+        rate = registry.specs[embedding].sample_rate
+        with timed("model", embedding):
+            for song_inputs, song_embeddings, (audio, sample_rate) in zip(
+                inputs, embeddings, songs
+            ):
+                if rate not in song_inputs:
+                    song_inputs[rate] = resample(audio, sample_rate, rate)
+                song_embeddings[embedding] = registry.get(embedding)(song_inputs[rate])
+        if heads:
+            frames = [song_embeddings[embedding] for song_embeddings in embeddings]
+            # Run all heads of the embedding in one fused call for the batch
+            with timed("model", f"{embedding}_heads"):
+                predictions = registry.get(f"{embedding}_heads")(np.concatenate(frames))
+            bounds = np.cumsum([len(song_frames) for song_frames in frames])[:-1]
+            split = {
+                head: np.split(head_predictions, bounds)
+                for head, head_predictions in predictions.items()
+            }
+            for index, song_groups in enumerate(groups):
+                song_groups[embedding] = {
+                    head: head_predictions[index]
+                    for head, head_predictions in split.items()
+                }
+    return [
+        (song_groups, song_embeddings.get("vggish"))
+        for song_groups, song_embeddings in zip(groups, embeddings)
+    ]
+
+
+def model_predictions(audio, sample_rate: int, outputs=None):
+    """batch_predictions() of a single song."""
+    return batch_predictions([(audio, sample_rate)], outputs)[0]
+
+
+def model_features(predictions, vggish_embeddings, features=None):
+    """Features from the predictions of the heads, reduced over frames."""
+    outputs = predictions | {"vggish": vggish_embeddings}
+    model_features = {}
+    for feature, (output, index) in MODEL_FEATURES.items():
+        if features is not None and feature not in features:
+            continue
+        value = outputs[output]
+        if index == "classes":
+            value = dict(zip(registry.classes(output), value))
+        elif index is not None:
+            value = value[index]
+        model_features[feature] = value
+    return model_features
+
+
+def run_models_batch(songs, features=None) -> list[dict]:
+    """The model features of each of some (audio, sample_rate) pairs.
+
+    Given a list of features, only the models they need are run.
+    """
+    outputs = model_outputs(features)
+    if not outputs:
+        return [{} for _ in songs]
+    results = []
+    for groups, vggish_embeddings in batch_predictions(songs, outputs):
+        predictions = {}
+        for group in groups.values():
+            predictions |= median_predictions(group)
+        results.append(model_features(predictions, vggish_embeddings, features))
+    return results
+
+
+def run_models(audio, sample_rate: int, features=None) -> dict:
+    """run_models_batch() of a single song."""
+    return run_models_batch([(audio, sample_rate)], features)[0]
@@ -1,9 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 
+from app.analysis.pool import analysis_pool
 from app.analysis.routes import analysis_router
 from app.auth.routes import auth_router
+from app.improvement.routes import improvement_router
+from app.improvement.pool import embedding_pool
 from app.users.routes import user_router
+from app.config import settings
 from app.db import init_db
+from app.metrics import metrics_text
 
 
 app = FastAPI()
@@ -12,6 +18,26 @@ app = FastAPI()
 @app.on_event("startup")
 async def startup_event():
     await init_db()
+    analysis_pool.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    analysis_pool.shutdown()
+    embedding_pool.shutdown()
+
+
+@app.middleware("http")
+async def limit_body_size(request: Request, call_next):
+    # Refuse oversized uploads before their body is read; uploads without a
+    # Content-Length are cut off while they arrive instead
+    content_length = request.headers.get("content-length", "")
+    if (
+        content_length.isdigit()
+        and int(content_length) > settings.ANALYSIS_MAX_UPLOAD_MB * 1024 * 1024
+    ):
+        return JSONResponse(status_code=413, content={"detail": "Request too large"})
+    return await call_next(request)
 
 
 @app.get("/")
@@ -19,7 +45,14 @@ async def root():
     return {"message": "Hello, World!"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = metrics_text()
+    return Response(content=content, media_type=content_type)
+
+
 # Include routers
 app.include_router(user_router, prefix="/users", tags=["Users"])
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 app.include_router(analysis_router, prefix="/analysis", tags=["Analysis"])
+app.include_router(improvement_router, prefix="/improvement", tags=["Improvement"])
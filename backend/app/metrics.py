@@ -0,0 +1,140 @@
+"""Prometheus metrics of the analysis, shared by every process that runs it.
+
+Analyses run in pool and graph worker processes, so metrics use the
+multiprocess mode of prometheus_client: each process writes its samples
+under METRICS_PATH and /metrics adds them up. The directory must be set
+before prometheus_client is imported, hence this module sets it on import.
+It is emptied by app.metrics_reset before the service starts, so samples
+of a previous run don't add up with the new ones, and pools mark their
+workers dead with worker_exited() once they stop.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from app.metrics_reset import metrics_directory
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", metrics_directory())
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+SECONDS_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+BYTES_BUCKETS = tuple(
+    2**power * 1024 * 1024 for power in range(5, 15)
+)  # 32 MiB to 16 GiB
+
+wall_seconds = Histogram(
+    "analysis_wall_seconds",
+    "Wall time of each part of an analysis",
+    ["kind", "name"],
+    buckets=SECONDS_BUCKETS,
+)
+cpu_seconds = Histogram(
+    "analysis_cpu_seconds",
+    "CPU time of each part of an analysis, in the process that ran it",
+    ["kind", "name"],
+    buckets=SECONDS_BUCKETS,
+)
+peak_rss_bytes = Histogram(
+    "analysis_peak_rss_bytes",
+    "Peak resident set size of the process during each analysis",
+    buckets=BYTES_BUCKETS,
+)
+queue_wait_seconds = Histogram(
+    "analysis_queue_wait_seconds",
+    "Time analyses wait for a worker",
+    ["queue"],
+    buckets=SECONDS_BUCKETS,
+)
+cache_lookups = Counter(
+    "analysis_cache_lookups_total", "Result cache lookups by outcome", ["result"]
+)
+cache_evictions = Counter("analysis_cache_evictions_total", "Result cache evictions")
+
+
+def observe(kind: str, name: str, wall: float, cpu: float):
+    """Record one timed part of an analysis: a stage, model or descriptor."""
+    wall_seconds.labels(kind, name).observe(wall)
+    cpu_seconds.labels(kind, name).observe(cpu)
+
+
+def observe_descriptor(name: str, wall: float, cpu: float):
+    observe("descriptor", name, wall, cpu)
+
+
+@contextmanager
+def timed(kind: str, name: str):
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        observe(kind, name, time.perf_counter() - start, time.process_time() - cpu_start)
+
+
+def reset_peak_rss():
+    # Linux resets the peak RSS of a process when "5" is written here
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss() -> int | None:
+    """Peak RSS in bytes since the last reset_peak_rss(), where Linux tells."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+@contextmanager
+def track_peak_rss():
+    reset_peak_rss()
+    try:
+        yield
+    finally:
+        peak = peak_rss()
+        if peak is not None:
+            peak_rss_bytes.observe(peak)
+
+
+def worker_exited(pid: int):
+    """Drop the live samples of a worker process that has exited."""
+    multiprocess.mark_process_dead(pid)
+
+
+def metrics_text() -> tuple[bytes, str]:
+    """Metrics of every process, in the Prometheus text format, and its type."""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
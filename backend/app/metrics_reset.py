@@ -0,0 +1,29 @@
+"""Empty the multiprocess metrics directory of a previous run.
+
+Processes that have imported prometheus_client keep writing to the files
+they opened in the directory, so it can only be emptied before any process
+of the service starts: removing the files later would lose every sample
+recorded since. The image runs this module before the service for that.
+"""
+
+import os
+
+from app.config import settings
+
+
+def metrics_directory() -> str:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR", settings.METRICS_PATH)
+
+
+def clear_metrics():
+    """Remove the samples every process of a previous run left behind."""
+    directory = metrics_directory()
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(".db"):
+            os.remove(os.path.join(directory, name))
+
+
+if __name__ == "__main__":
+    clear_metrics()
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String, func
+
+from app.models.user import Base
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False, index=True, default="queued")
+    filename = Column(String)
+    upload_path = Column(String, nullable=False)
+    progress = Column(JSON, nullable=False, default=dict)
+    result = Column(JSON)
+    error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Instants rather than wall-clock times, stamped in UTC by the API and the
+    # workers, so that their differences are durations whatever the timezones
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, default=utcnow, server_default=func.now()
+    )
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    # Refreshed by the worker on every progress update; a running job whose
+    # heartbeat is too old belongs to a dead worker and is picked up again
+    heartbeat_at = Column(DateTime(timezone=True))
@@ -0,0 +1,424 @@
+"""Approximate nearest neighbours of song embeddings, in process.
+
+An inverted file (IVF) index: vectors are clustered by spherical k-means,
+stored sorted by cluster, and a query only scores the vectors of the
+`probes` clusters whose centroids are nearest to it. Vectors are unit
+length, so scores are cosine similarities, like pgvector's <=> ordering.
+
+The index is a directory of .npy files that every process loads
+memory-mapped, sharing the pages. Vectors inserted after the build are
+kept apart and always scored exactly, until the next build takes them in.
+
+Optionally the index also keeps a compressed copy of every vector: int8
+scalar quantization (4x smaller) or product quantization (32x smaller
+with the default 64 subvectors), of its residual from its centroid. A
+search then scans the compact codes of the probed clusters, and scores
+exactly, by their full vectors read from disk, only the `rerank` best of
+them. Only the codes need to stay in memory.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from app.config import settings
+from app.search.clips import normalize
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 65536):
+    """Index of the nearest centroid of every vector.
+
+    Nearest by Euclidean distance, which for unit-length centroids is the
+    highest dot product.
+    """
+    # |x - c|^2 = |x|^2 - 2 (x.c - |c|^2 / 2), and |x|^2 is the same for all c
+    half_norms = np.einsum("ij,ij->i", centroids, centroids) / 2
+    return np.concatenate(
+        [
+            np.argmax(
+                vectors[start : start + block_size] @ centroids.T - half_norms, axis=1
+            )
+            for start in range(0, len(vectors), block_size)
+        ]
+        or [np.empty(0, dtype=np.int64)]
+    )
+
+
+def kmeans(
+    vectors: np.ndarray,
+    lists: int,
+    iterations: int = 10,
+    seed: int = 0,
+    spherical: bool = True,
+):
+    """Centroids of `lists` clusters of the vectors.
+
+    Spherical k-means, of unit-length centroids, by default, for unit
+    vectors compared by cosine similarity.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)]
+    for _ in range(iterations):
+        labels = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=lists)
+        # Clusters that lost all their vectors restart from a random one
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty))]
+        counts[empty] = 1
+        centroids = normalize(sums) if spherical else sums / counts[:, None]
+    return centroids
+
+
+def save_array(path: str, array: np.ndarray):
+    """Write an .npy file atomically, so readers never see half of one."""
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".npy", delete=False) as file:
+        np.save(file, array)
+    os.replace(file.name, path)
+
+
+class ScalarQuantizer:
+    """int8 codes of vectors, each dimension scaled by the largest value it takes."""
+
+    name = "int8"
+    FILE = "scale"
+
+    def __init__(self, scale: np.ndarray):
+        self.scale = scale
+
+    @classmethod
+    def train(cls, vectors: np.ndarray) -> "ScalarQuantizer":
+        scale = np.abs(vectors).max(axis=0) / 127
+        return cls(np.where(scale > 0, scale, 1).astype(np.float32))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def scorer(self, query: np.ndarray):
+        """Function of codes to the dot product of the query with their vectors."""
+        scaled = query * self.scale
+        return lambda codes: codes @ scaled
+
+
+class ProductQuantizer:
+    """Codes of vectors cut into subvectors, each the nearest of 256 centroids.
+
+    `codebooks` is a (subvectors, 256, dimensions / subvectors) array, and
+    the code of a vector holds one byte per subvector.
+    """
+
+    name = "pq"
+    FILE = "codebooks"
+
+    def __init__(self, codebooks: np.ndarray):
+        self.codebooks = codebooks
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        subvectors: int = 64,
+        sample_size: int = 16384,
+        iterations: int = 10,
+    ) -> "ProductQuantizer":
+        if vectors.shape[1] % subvectors:
+            raise ValueError(
+                f"{vectors.shape[1]} dimensions can't be cut into {subvectors} subvectors"
+            )
+        rng = np.random.default_rng(0)
+        sample = vectors[
+            np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), False))
+        ]
+        centroids = min(256, len(sample))
+        return cls(
+            np.stack(
+                [
+                    kmeans(part, centroids, iterations, spherical=False)
+                    for part in np.split(sample, subvectors, axis=1)
+                ]
+            )
+        )
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = np.split(vectors, len(self.codebooks), axis=1)
+        return np.stack(
+            [
+                assign(part, codebook).astype(np.uint8)
+                for part, codebook in zip(parts, self.codebooks)
+            ],
+            axis=1,
+        )
+
+    def scorer(self, query: np.ndarray):
+        """Function of codes to the dot product of the query with their vectors."""
+        # Dot product of every subvector of the query with every centroid
+        tables = np.einsum(
+            "skd,sd->sk", self.codebooks, query.reshape(len(self.codebooks), -1)
+        )
+        # Position in the flat tables of the first centroid of each subvector
+        starts = np.arange(0, tables.size, tables.shape[1], dtype=np.int32)
+        tables = tables.ravel()
+        return lambda codes: np.take(tables, codes + starts).sum(axis=1)
+
+
+QUANTIZERS = {
+    quantizer.name: quantizer for quantizer in [ScalarQuantizer, ProductQuantizer]
+}
+
+
+class IVFIndex:
+    """Inverted file index of unit vectors and the song ID of each.
+
+    `vectors` and `ids` are sorted by cluster, and the vectors of cluster i
+    are rows offsets[i] to offsets[i + 1]. `pending_vectors` and
+    `pending_ids` are the vectors inserted since the index was built.
+    Compressed indexes have a `quantizer`, and the `codes` of the residual
+    of each vector from its centroid, in the same order as `vectors`.
+    """
+
+    FILES = ["centroids", "offsets", "vectors", "ids", "pending_vectors", "pending_ids"]
+    PENDING = "pending_vectors.npy"
+
+    def __init__(
+        self,
+        centroids,
+        offsets,
+        vectors,
+        ids,
+        pending_vectors=None,
+        pending_ids=None,
+        quantizer=None,
+        codes=None,
+        path: str | None = None,
+    ):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+        self.quantizer = quantizer
+        self.codes = codes
+        dimensions = centroids.shape[1]
+        self.pending_vectors = (
+            np.empty((0, dimensions), dtype=np.float32)
+            if pending_vectors is None
+            else pending_vectors
+        )
+        self.pending_ids = (
+            np.empty(0, dtype=ids.dtype) if pending_ids is None else pending_ids
+        )
+        # Where the index was loaded from, which inserts are saved to
+        self.path = path
+        self._pending_mtime = self.pending_mtime()
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        lists: int | None = None,
+        sample_size: int = 256,
+        iterations: int = 10,
+        compression: str | None = None,
+        subvectors: int = 64,
+    ) -> "IVFIndex":
+        """Cluster the vectors, training k-means on `sample_size` vectors per list.
+
+        By default there are as many lists as the square root of the number
+        of vectors, the advice pgvector gives for its own IVFFlat index.
+        `compression` is None, "int8" or "pq", the latter with `subvectors`
+        bytes per vector.
+        """
+        if len(vectors) == 0:
+            raise ValueError("An index needs at least one vector")
+        if compression is not None and compression not in QUANTIZERS:
+            raise ValueError(f"Unknown compression {compression!r}")
+        vectors, ids = normalize(vectors), np.asarray(ids)
+        lists = min(lists or max(int(np.sqrt(len(vectors))), 1), len(vectors))
+        rng = np.random.default_rng(0)
+        sample = vectors[
+            np.sort(
+                rng.choice(len(vectors), min(lists * sample_size, len(vectors)), False)
+            )
+        ]
+        centroids = kmeans(sample, lists, iterations)
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=lists))])
+        index = cls(centroids, offsets, vectors[order], ids[order])
+        if compression is not None:
+            residuals = index.vectors - centroids[labels[order]]
+            if compression == "pq":
+                quantizer = ProductQuantizer.train(
+                    residuals, subvectors, iterations=iterations
+                )
+            else:
+                quantizer = ScalarQuantizer.train(residuals)
+            index.quantizer, index.codes = quantizer, quantizer.encode(residuals)
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        arrays = {}
+        for name in cls.FILES:
+            file_path = os.path.join(path, f"{name}.npy")
+            if os.path.exists(file_path):
+                arrays[name] = np.load(file_path, mmap_mode="r")
+        for quantizer in QUANTIZERS.values():
+            file_path = os.path.join(path, f"{quantizer.FILE}.npy")
+            if os.path.exists(file_path):
+                arrays["quantizer"] = quantizer(np.load(file_path))
+                arrays["codes"] = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        if "centroids" not in arrays:
+            raise FileNotFoundError(f"No index has been built at {path}")
+        return cls(**arrays, path=path)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        arrays = {name: getattr(self, name) for name in self.FILES}
+        if self.quantizer is not None:
+            arrays["codes"] = self.codes
+            arrays[self.quantizer.FILE] = getattr(self.quantizer, self.quantizer.FILE)
+        for name, array in arrays.items():
+            save_array(os.path.join(path, f"{name}.npy"), np.asarray(array))
+        # Compressed files of a previous build in the same directory
+        for name in ["codes"] + [quantizer.FILE for quantizer in QUANTIZERS.values()]:
+            if name not in arrays and os.path.exists(os.path.join(path, f"{name}.npy")):
+                os.remove(os.path.join(path, f"{name}.npy"))
+        self.path = path
+        self._pending_mtime = self.pending_mtime()
+
+    def __len__(self) -> int:
+        return len(self.vectors) + len(self.pending_vectors)
+
+    @property
+    def compression(self) -> str | None:
+        return None if self.quantizer is None else self.quantizer.name
+
+    def scanned_bytes(self) -> int:
+        """Size of the arrays that searches scan, which should stay in memory.
+
+        Searches of a compressed index only read the few vectors they rank
+        exactly, so the full vectors can stay on disk.
+        """
+        scanned = self.vectors if self.quantizer is None else self.codes
+        return self.centroids.nbytes + scanned.nbytes + self.pending_vectors.nbytes
+
+    def pending_mtime(self) -> int | None:
+        if self.path is None:
+            return None
+        try:
+            return os.stat(os.path.join(self.path, self.PENDING)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Pick up the vectors another process inserted since this one loaded."""
+        mtime = self.pending_mtime()
+        if mtime is None or mtime == self._pending_mtime:
+            return
+        vectors, ids = (
+            np.load(os.path.join(self.path, f"{name}.npy"))
+            for name in ["pending_vectors", "pending_ids"]
+        )
+        # Caught between the two files of an insert: take it up next time
+        if len(vectors) == len(ids):
+            self.pending_vectors, self.pending_ids = vectors, ids
+            self._pending_mtime = mtime
+
+    def insert(self, vectors: np.ndarray, ids):
+        """Add vectors, saving them with the index if it was loaded from disk.
+
+        Only one process should insert into an index at a time.
+        """
+        self.pending_vectors = np.vstack([self.pending_vectors, normalize(vectors)])
+        self.pending_ids = np.concatenate([self.pending_ids, np.asarray(ids)])
+        if self.path is not None:
+            # IDs first, since readers reload when pending_vectors.npy changes
+            save_array(os.path.join(self.path, "pending_ids.npy"), self.pending_ids)
+            save_array(os.path.join(self.path, self.PENDING), self.pending_vectors)
+            self._pending_mtime = self.pending_mtime()
+
+    def rebuild(self, **build_options) -> "IVFIndex":
+        """A new index of all the vectors, inserted ones included."""
+        build_options.setdefault("compression", self.compression)
+        return IVFIndex.build(
+            np.vstack([self.vectors, self.pending_vectors]),
+            np.concatenate([self.ids, self.pending_ids]),
+            **build_options,
+        )
+
+    def candidates(self, query: np.ndarray, probes: int, rerank: int) -> list:
+        """Rows of the vectors to score exactly for the query.
+
+        Those are the rows of the `probes` clusters whose centroids are
+        nearest the query or, if the index is compressed, the `rerank` of
+        them whose codes score best.
+        """
+        centroid_scores = self.centroids @ query
+        probes = min(probes, len(self.centroids))
+        nearest = np.argpartition(centroid_scores, -probes)[-probes:]
+        rows = [slice(self.offsets[list_], self.offsets[list_ + 1]) for list_ in nearest]
+        if self.quantizer is None:
+            return rows
+        score = self.quantizer.scorer(query)
+        # The codes are of residuals: add back the score of their centroid
+        approximate = np.concatenate(
+            [
+                centroid_scores[list_] + score(self.codes[row])
+                for list_, row in zip(nearest, rows)
+            ]
+        )
+        if len(approximate) <= rerank:
+            return rows
+        rows = np.concatenate([np.arange(row.start, row.stop) for row in rows])
+        # Sorted, so the full vectors are read from disk in order
+        return [np.sort(rows[np.argpartition(approximate, -rerank)[-rerank:]])]
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        probes: int | None = None,
+        rerank: int | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """(song ID, similarity) of the `k` nearest vectors to each query, best first.
+
+        Compressed indexes rank exactly the best `rerank` vectors by their codes.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        probes = probes or settings.SEARCH_INDEX_PROBES
+        rerank = max(rerank or settings.SEARCH_INDEX_RERANK, k)
+        results = []
+        for query in queries:
+            rows = self.candidates(query, probes, rerank)
+            scores = np.concatenate(
+                [self.vectors[row] @ query for row in rows]
+                + [self.pending_vectors @ query]
+            )
+            ids = np.concatenate([self.ids[row] for row in rows] + [self.pending_ids])
+            best = (
+                np.argpartition(scores, -k)[-k:]
+                if len(scores) > k
+                else np.arange(len(scores))
+            )
+            best = best[np.argsort(-scores[best])]
+            results.append([(str(ids[row]), float(scores[row])) for row in best])
+        return results
+
+
+_index = None
+
+
+def song_index() -> IVFIndex:
+    """The index at SEARCH_INDEX_PATH, loaded once per process and kept current.
+
+    Raises FileNotFoundError until `python -m app.search.build_index` has run.
+    """
+    global _index
+    if _index is None:
+        _index = IVFIndex.load(settings.SEARCH_INDEX_PATH)
+    _index.refresh()
+    return _index
@@ -0,0 +1,49 @@
+"""Build the clip catalog that similar songs are searched in.
+
+    python -m app.search.build /backend/search songs/*.mp3
+
+Songs are identified by the video ID of files named like the downloads,
+`index^videoID^title.mp3`, and by the file name otherwise.
+"""
+
+import argparse
+import logging
+import os
+
+from app.analysis.audio import decode_audio
+from app.inference.models import registry
+from app.search.clips import ClipCatalog
+
+logger = logging.getLogger(__name__)
+
+
+def song_id(path: str) -> str:
+    name = os.path.basename(path)
+    parts = name.split("^")
+    return parts[1] if len(parts) == 3 else os.path.splitext(name)[0]
+
+
+def build_catalog(paths: list[str]) -> ClipCatalog:
+    vggish = registry.get("vggish")
+    frames = {}
+    for path in paths:
+        try:
+            frames[song_id(path)] = vggish(decode_audio(path).audio16k)
+        except Exception as e:
+            logger.error(f"Error embedding {path}: {e}")
+    return ClipCatalog.from_songs(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="Directory to write the catalog to")
+    parser.add_argument("paths", nargs="+", help="Audio files of the songs")
+    arguments = parser.parse_args()
+
+    catalog = build_catalog(arguments.paths)
+    catalog.save(arguments.output)
+    print(f"{len(catalog)} clips of {len(catalog.songs)} songs")
+
+
+if __name__ == "__main__":
+    main()
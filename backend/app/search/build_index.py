@@ -0,0 +1,87 @@
+"""Build the in-process index of song embeddings, or add songs to it.
+
+    python -m app.search.build_index /backend/search/songs --from-db
+    python -m app.search.build_index /backend/search/songs --from-file songs.npz
+    python -m app.search.build_index /backend/search/songs --insert new.npz
+    python -m app.search.build_index /backend/search/songs --from-db --compression pq
+
+Files are .npz archives of `ids` and `embeddings` arrays. --from-db reads
+the CLAP embeddings that scripts/extract_embeddings.py stores in
+audio_embeddings, keyed by video ID. --compression also stores int8 or
+product quantization codes, which searches scan in place of the vectors.
+"""
+
+import argparse
+import asyncio
+import json
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.search.ann import QUANTIZERS, IVFIndex
+
+
+async def read_embeddings(batch_size: int = 10_000) -> tuple[np.ndarray, np.ndarray]:
+    """Video IDs and embeddings of every row of audio_embeddings."""
+    engine = create_async_engine(settings.DATABASE_URL)
+    ids, embeddings = [], []
+    async with engine.connect() as connection:
+        rows = await connection.stream(
+            text("SELECT video_id, embedding::text FROM audio_embeddings ORDER BY id")
+        )
+        async for batch in rows.partitions(batch_size):
+            for video_id, embedding in batch:
+                ids.append(video_id)
+                embeddings.append(json.loads(embedding))
+    await engine.dispose()
+    return np.array(ids, dtype=str), np.array(embeddings, dtype=np.float32)
+
+
+def read_file(path: str) -> tuple[np.ndarray, np.ndarray]:
+    with np.load(path) as archive:
+        return archive["ids"].astype(str), archive["embeddings"].astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="Directory of the index")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-db", action="store_true", help="Build from Postgres")
+    source.add_argument("--from-file", help="Build from an .npz file")
+    source.add_argument("--insert", help="Add the songs of an .npz file to the index")
+    parser.add_argument("--lists", type=int, help="Clusters, sqrt(songs) by default")
+    parser.add_argument("--compression", choices=sorted(QUANTIZERS))
+    parser.add_argument(
+        "--subvectors", type=int, default=64, help="Bytes per song of pq codes"
+    )
+    arguments = parser.parse_args()
+
+    if arguments.insert:
+        index = IVFIndex.load(arguments.path)
+        ids, embeddings = read_file(arguments.insert)
+        index.insert(embeddings, ids)
+    else:
+        if arguments.from_db:
+            ids, embeddings = asyncio.run(read_embeddings())
+        else:
+            ids, embeddings = read_file(arguments.from_file)
+        index = IVFIndex.build(
+            embeddings,
+            ids,
+            lists=arguments.lists,
+            compression=arguments.compression,
+            subvectors=arguments.subvectors,
+        )
+        index.save(arguments.path)
+    print(
+        f"{len(index)} songs in {len(index.centroids)} lists, "
+        f"{len(index.pending_ids)} inserted since the build; searches scan "
+        f"{index.scanned_bytes() / 2**20:.1f} MiB of "
+        f"{index.compression or 'uncompressed'} vectors"
+    )
+
+
+if __name__ == "__main__":
+    main()
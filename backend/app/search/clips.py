@@ -0,0 +1,175 @@
+"""Song similarity by votes of clip embeddings.
+
+Songs are cut into clips of about 3 seconds, each the mean of a few VGGish
+frames. The clips of a query are scored against every clip of the catalog
+in one matrix product per block of catalog rows, and each query clip keeps
+its `k` most similar catalog clips. Every kept clip is a vote for its song,
+and the songs with the most votes are the most similar.
+"""
+
+import os
+
+import numpy as np
+
+from app.config import settings
+
+# VGGish frames are 0.96 s long, so 3 of them make a clip of about 3 s
+CLIP_FRAMES = 3
+# Catalog rows scored at a time, which bounds memory at queries x rows floats
+BLOCK_SIZE = 65536
+
+
+def clip_embeddings(frames: np.ndarray, clip_frames: int = CLIP_FRAMES) -> np.ndarray:
+    """Unit-length means of consecutive runs of `clip_frames` frame embeddings.
+
+    The frames left over at the end make a clip of their own only if there
+    are no full clips.
+    """
+    if len(frames) == 0:
+        return np.empty((0, frames.shape[1]), dtype=np.float32)
+    count = max(len(frames) // clip_frames, 1)
+    used = min(count * clip_frames, len(frames))
+    clips = frames[:used].reshape(count, -1, frames.shape[1]).mean(axis=1)
+    return normalize(clips)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length float32 rows; zero rows stay zero."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the `k` highest scores of every row, in no order."""
+    if scores.shape[1] <= k:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    return np.argpartition(scores, -k, axis=1)[:, -k:]
+
+
+def above(scores: np.ndarray, thresholds: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Scores above the threshold of their row, and their columns.
+
+    Rows are padded to the same length with -inf scores.
+    """
+    rows, columns = np.nonzero(scores > thresholds[:, None])
+    counts = np.bincount(rows, minlength=len(scores))
+    # Position of every selected score within its row
+    positions = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    selected = np.full((len(scores), counts.max(initial=0)), -np.inf, dtype=scores.dtype)
+    indices = np.zeros(selected.shape, dtype=np.int64)
+    selected[rows, positions] = scores[rows, columns]
+    indices[rows, positions] = columns
+    return selected, indices
+
+
+class ClipCatalog:
+    """Unit-length clip embeddings, with the song that each clip comes from.
+
+    `songs` holds the identifier of every song, and `song_ids` the index in
+    `songs` of every clip. Saved catalogs are loaded memory-mapped, so every
+    process that loads one shares the same pages.
+    """
+
+    FILES = ["embeddings", "song_ids", "songs"]
+
+    def __init__(self, embeddings: np.ndarray, song_ids: np.ndarray, songs: np.ndarray):
+        self.embeddings = embeddings
+        self.song_ids = song_ids
+        self.songs = songs
+
+    @classmethod
+    def from_songs(cls, frames: dict[str, np.ndarray]) -> "ClipCatalog":
+        """Catalog of songs, given the VGGish frame embeddings of each."""
+        clips = [clip_embeddings(song_frames) for song_frames in frames.values()]
+        return cls(
+            np.vstack(clips) if clips else np.empty((0, 128), dtype=np.float32),
+            np.repeat(
+                np.arange(len(clips), dtype=np.int32),
+                [len(song_clips) for song_clips in clips],
+            ),
+            np.array(list(frames), dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ClipCatalog":
+        return cls(
+            *(
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in cls.FILES
+            )
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in self.FILES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    def top_clips(
+        self, queries: np.ndarray, k: int, block_size: int = BLOCK_SIZE
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Scores and catalog rows of the `k` clips most similar to each query.
+
+        Both are (queries, k) arrays, in no particular order within a row.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        rows = np.arange(len(queries))[:, None]
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_indices = np.empty((len(queries), 0), dtype=np.int64)
+        # Score each query needs to enter its top k, once it has k clips
+        thresholds = np.full(len(queries), -np.inf, dtype=np.float32)
+        for start in range(0, len(self), block_size):
+            scores = queries @ self.embeddings[start : start + block_size].T
+            if best_scores.shape[1] < k:
+                kept = top_k(scores, k)
+                block_scores, block_indices = scores[rows, kept], kept + start
+            else:
+                # Only the few clips above the thresholds can make it, so
+                # select those rather than partitioning the whole block
+                block_scores, block_indices = above(scores, thresholds)
+                block_indices += start
+            best_scores = np.hstack([best_scores, block_scores])
+            best_indices = np.hstack([best_indices, block_indices])
+            kept = top_k(best_scores, k)
+            best_scores, best_indices = best_scores[rows, kept], best_indices[rows, kept]
+            if best_scores.shape[1] >= k:
+                thresholds = best_scores.min(axis=1)
+        return best_scores, best_indices
+
+    def similar_songs(
+        self, queries: np.ndarray, count: int = 10, k: int = 10_000
+    ) -> list[dict]:
+        """The `count` songs with most clips among the top `k` of each query clip.
+
+        Ties are broken by the total similarity of the voting clips.
+        """
+        scores, indices = self.top_clips(queries, k)
+        voters = self.song_ids[indices.ravel()]
+        votes = np.bincount(voters, minlength=len(self.songs))
+        similarity = np.bincount(
+            voters, weights=scores.ravel(), minlength=len(self.songs)
+        )
+        candidates = np.flatnonzero(votes)
+        ranked = candidates[np.lexsort((-similarity[candidates], -votes[candidates]))]
+        return [
+            {
+                "song": str(self.songs[song]),
+                "votes": int(votes[song]),
+                "similarity": float(similarity[song]),
+            }
+            for song in ranked[:count]
+        ]
+
+
+_catalog = None
+
+
+def clip_catalog() -> ClipCatalog:
+    """The catalog at SEARCH_CATALOG_PATH, loaded once per process."""
+    global _catalog
+    if _catalog is None:
+        _catalog = ClipCatalog.load(settings.SEARCH_CATALOG_PATH)
+    return _catalog
@@ -0,0 +1,61 @@
+"""Songs nearest to a CLAP embedding, from the pgvector index of audio_embeddings.
+
+The query vector is a parameter and results are ordered by the distance
+operator itself, which is what lets Postgres answer from the HNSW or
+IVFFlat index rather than scan every row.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import settings
+
+NEAREST_SONGS = text(
+    """
+    SELECT video_id, filename,
+        1 - (embedding <=> CAST(:embedding AS vector)) AS similarity
+    FROM audio_embeddings
+    ORDER BY embedding <=> CAST(:embedding AS vector)
+    LIMIT :count
+    """
+)
+SET_LOCAL = text("SELECT set_config(:parameter, :value, true)")
+
+
+def vector_literal(embedding) -> str:
+    """An embedding in the text format of pgvector, which needs no adapter."""
+    return "[" + ",".join(str(float(value)) for value in embedding) + "]"
+
+
+async def set_search_parameters(
+    db: AsyncSession | AsyncConnection,
+    ef_search: int | None = None,
+    probes: int | None = None,
+):
+    """Trade speed for recall until the end of the current transaction.
+
+    ef_search is the candidate list length of HNSW scans and probes the
+    number of lists IVFFlat scans visit; only the one of the index applies.
+    """
+    for parameter, value in [
+        ("hnsw.ef_search", ef_search or settings.VECTOR_EF_SEARCH),
+        ("ivfflat.probes", probes or settings.VECTOR_PROBES),
+    ]:
+        await db.execute(SET_LOCAL, {"parameter": parameter, "value": str(value)})
+
+
+async def nearest_songs(
+    db: AsyncSession | AsyncConnection,
+    embedding,
+    count: int = 10,
+    ef_search: int | None = None,
+    probes: int | None = None,
+) -> list[dict]:
+    """The `count` songs of audio_embeddings nearest to `embedding` by cosine."""
+    # An HNSW scan returns at most ef_search rows
+    ef_search = max(ef_search or settings.VECTOR_EF_SEARCH, count)
+    await set_search_parameters(db, ef_search, probes)
+    rows = await db.execute(
+        NEAREST_SONGS, {"embedding": vector_literal(embedding), "count": count}
+    )
+    return [dict(row._mapping) for row in rows]
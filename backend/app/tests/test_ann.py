@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from app.search.ann import IVFIndex
+from app.search.clips import normalize
+
+
+def clustered_vectors(count=2000, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, 64))
+    vectors = centres[rng.integers(clusters, size=count)] + rng.standard_normal(
+        (count, 64)
+    )
+    return normalize(vectors), np.array([f"song{index}" for index in range(count)])
+
+
+def exact_neighbours(vectors, ids, query, k=10):
+    return list(ids[np.argsort(-(vectors @ query))[:k]])
+
+
+def test_search_probing_every_list_is_exact():
+    """Test that probing all clusters finds the exact nearest neighbours."""
+    vectors, ids = clustered_vectors()
+    index = IVFIndex.build(vectors, ids, lists=16)
+    query = normalize(np.random.default_rng(1).standard_normal(64))
+
+    found = [song for song, _ in index.search(query, k=10, probes=16)[0]]
+
+    assert found == exact_neighbours(vectors, ids, query)
+
+
+def test_search_recall_with_few_probes():
+    """Test that a few probes already find most of the nearest neighbours."""
+    vectors, ids = clustered_vectors()
+    index = IVFIndex.build(vectors, ids, lists=40)
+    queries = vectors[:50] + 0.1 * np.random.default_rng(2).standard_normal((50, 64))
+
+    results = index.search(queries, k=10, probes=4)
+
+    recall = np.mean(
+        [
+            len({song for song, _ in found} & set(exact_neighbours(vectors, ids, query)))
+            / 10
+            for found, query in zip(results, normalize(queries))
+        ]
+    )
+    assert recall > 0.9
+
+
+@pytest.mark.parametrize("compression", ["int8", "pq"])
+def test_compressed_search_reranks_exactly(tmp_path, compression):
+    """Test that compressed indexes find the neighbours, with exact scores."""
+    vectors, ids = clustered_vectors()
+    IVFIndex.build(vectors, ids, lists=16, compression=compression, subvectors=16).save(
+        str(tmp_path)
+    )
+    index = IVFIndex.load(str(tmp_path))
+    query = normalize(np.random.default_rng(1).standard_normal(64))
+
+    found = index.search(query, k=10, probes=16, rerank=50)[0]
+
+    assert index.compression == compression
+    assert index.scanned_bytes() < vectors.nbytes / 3
+    assert (
+        len({song for song, _ in found} & set(exact_neighbours(vectors, ids, query))) >= 9
+    )
+    for song, score in found:
+        assert score == pytest.approx(float(vectors[int(song[4:])] @ query), abs=1e-5)
+
+
+def test_inserts_reach_other_processes(tmp_path):
+    """Test that inserted vectors are saved and picked up by loaded copies."""
+    vectors, ids = clustered_vectors()
+    IVFIndex.build(vectors, ids, lists=16).save(str(tmp_path))
+    writer, reader = IVFIndex.load(str(tmp_path)), IVFIndex.load(str(tmp_path))
+    new = normalize(np.random.default_rng(3).standard_normal((1, 64)))
+
+    writer.insert(new, ["new"])
+    reader.refresh()
+
+    assert len(reader) == len(vectors) + 1
+    assert reader.search(new[0], k=1, probes=1)[0][0][0] == "new"
+    assert isinstance(reader.vectors, np.memmap)
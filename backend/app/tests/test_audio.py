@@ -0,0 +1,31 @@
+import io
+
+import numpy as np
+import soundfile
+
+from app.analysis import audio
+
+
+def test_tracks_are_decoded_once_and_resampled_once_per_rate(monkeypatch):
+    """Test that each rate is resampled on first use only, to contiguous float32."""
+    wav = io.BytesIO()
+    signal = np.random.default_rng(0).uniform(-0.5, 0.5, 22050 * 2)
+    soundfile.write(wav, signal.astype(np.float32), 22050, format="WAV")
+    wav.seek(0)
+    rates = []
+    resample = audio.resample
+
+    def counting_resample(samples, sample_rate, target_rate):
+        rates.append(target_rate)
+        return resample(samples, sample_rate, target_rate)
+
+    monkeypatch.setattr(audio, "resample", counting_resample)
+    buffers = audio.decode_audio(wav)
+
+    assert buffers.sample_rate == 22050 and buffers.duration == 2
+    for _ in range(2):
+        assert len(buffers.audio44k) == 44100 * 2
+        assert len(buffers.audio16k) == audio.MODELS_SAMPLE_RATE * 2
+    assert rates == [audio.ALGORITHMS_SAMPLE_RATE, audio.MODELS_SAMPLE_RATE]
+    for samples in (buffers.audio44k, buffers.audio16k):
+        assert samples.dtype == np.float32 and samples.flags["C_CONTIGUOUS"]
@@ -0,0 +1,47 @@
+import os
+
+from app.analysis.cache import ResultCache
+
+
+def make_cache(path, **kwargs):
+    options = {"version": "1", "max_entries": 2, "max_bytes": 10**6, "max_age": 0}
+    return ResultCache(str(path), **{**options, **kwargs})
+
+
+def test_cache_hits_memory_then_disk(tmp_path):
+    """Test that results are served from memory and, in a new process, from disk."""
+    cache = make_cache(tmp_path)
+    key = cache.key(b"audio")
+    assert cache.get(key) is None
+
+    cache.put(key, {"BPM": 120.0})
+    assert cache.get(key) == {"BPM": 120.0}
+
+    other_worker = make_cache(tmp_path)
+    assert other_worker.get(key) == {"BPM": 120.0}
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert other_worker.stats()["disk_hits"] == 1
+
+
+def test_cache_key_depends_on_version(tmp_path):
+    """Test that a new extractor version never sees old results."""
+    assert make_cache(tmp_path).key(b"audio") != make_cache(tmp_path, version="2").key(
+        b"audio"
+    )
+
+
+def test_cache_evicts_by_size_and_age(tmp_path):
+    """Test that the disk tier drops the oldest entries and expired ones."""
+    cache = make_cache(tmp_path, max_entries=0, max_bytes=300)
+    keys = [cache.key(bytes([index])) for index in range(3)]
+    for index, key in enumerate(keys):
+        cache.put(key, {"Embeddings": [0.0] * 20})
+        filename = os.path.join(tmp_path, key[:2], key)
+        os.utime(filename, (index, index))
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
+
+    expiring = make_cache(tmp_path, max_entries=0, max_age=60)
+    assert expiring.get(keys[2]) is None
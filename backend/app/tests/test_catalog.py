@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from app.catalog.matrix import FeatureMatrix
+from app.catalog.percentiles import CatalogPercentiles
+from app.catalog.stats import COLUMNS, FEATURES, FeatureStats, feature_vector
+
+
+def catalog(count=500, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(5, 2, (count, len(FEATURES)))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    return np.array([f"song{index}" for index in range(count)]), values
+
+
+def test_incremental_updates_match_one_pass(tmp_path):
+    """Test that statistics merged batch by batch equal those of one pass."""
+    video_ids, values = catalog()
+    stats = FeatureStats.empty()
+    for start in range(0, len(video_ids), 150):
+        stats.update(video_ids[start : start + 150], values[start : start + 150])
+        stats.save(str(tmp_path / "stats.npz"))
+        stats = FeatureStats.load(str(tmp_path / "stats.npz"))
+    # Songs already counted are ignored
+    stats.update(video_ids[:10], values[:10] + 100)
+
+    assert len(stats) == len(video_ids)
+    assert np.allclose(stats.minimum, np.nanmin(values, axis=0))
+    assert np.allclose(stats.maximum, np.nanmax(values, axis=0))
+    assert np.allclose(stats.mean, np.nanmean(values, axis=0))
+    assert np.allclose(stats.std, np.nanstd(values, axis=0))
+    assert np.allclose(stats.quantiles((0.5,))[0], np.nanmedian(values, axis=0))
+
+
+def test_normalize_scales_like_the_catalog_columns():
+    """Test that features are min-max scaled, except bpm and onset rate."""
+    video_ids, values = catalog()
+    values[0] = np.linspace(4, 6, len(FEATURES))
+    stats = FeatureStats.from_songs(video_ids, values)
+    features = dict(zip(FEATURES, values[0]))
+    features["danceability"] = None
+
+    normalized = dict(zip(FEATURES, stats.normalize(feature_vector(features))))
+
+    loudness = FEATURES.index("loudness")
+    assert normalized["loudness"] == pytest.approx(
+        (values[0, loudness] - np.nanmin(values[:, loudness]))
+        / (np.nanmax(values[:, loudness]) - np.nanmin(values[:, loudness]))
+    )
+    assert normalized["bpm"] == features["bpm"]
+    assert np.isnan(normalized["danceability"])
+
+
+def test_matrix_compares_an_upload_with_songs():
+    """Test deltas, z-scores and rankings against songs, with unknown ones."""
+    video_ids, values = catalog()
+    matrix = FeatureMatrix.empty()
+    matrix.update(video_ids, values)
+    upload = np.linspace(3, 7, len(COLUMNS))
+
+    comparison = matrix.compare(upload, ["song3", "unknown", "song7"])
+
+    deltas = upload - values[[3, 7]]
+    assert np.allclose(comparison["deltas"][[0, 2]], deltas, equal_nan=True)
+    assert np.isnan(comparison["deltas"][1]).all()
+    z_scores = deltas / np.nanstd(values, axis=0)
+    assert np.allclose(comparison["z_scores"][[0, 2]], z_scores, equal_nan=True)
+    furthest = np.nanargmax(np.abs(z_scores[0]))
+    assert comparison["ranked"][0][0] == furthest
+
+
+def test_matrix_updates_reach_loaded_copies(tmp_path):
+    """Test that songs added by one process are found by another."""
+    video_ids, values = catalog()
+    matrix = FeatureMatrix.empty()
+    matrix.update(video_ids[:400], values[:400])
+    matrix.save(str(tmp_path))
+    writer, reader = FeatureMatrix.load(str(tmp_path)), FeatureMatrix.load(str(tmp_path))
+
+    writer.update(video_ids, values)
+    reader.refresh()
+
+    assert len(reader) == len(video_ids)
+    assert list(reader.rows(["song450", "song0", "missing"])) == [450, 0, -1]
+    assert isinstance(reader.values, np.memmap)
+
+
+def test_percentiles_of_an_analysis(tmp_path):
+    """Test that merged columns stay sorted and rank an analysis's features."""
+    _, values = catalog()
+    percentiles = CatalogPercentiles.empty()
+    percentiles.update(values[:300])
+    percentiles.save(str(tmp_path))
+    percentiles = CatalogPercentiles.load(str(tmp_path))
+    percentiles.update(values[300:])
+    reader = CatalogPercentiles.load(str(tmp_path))
+
+    bpm = FEATURES.index("bpm")
+    column = np.sort(values[:, bpm][~np.isnan(values[:, bpm])])
+    assert np.array_equal(reader.column(bpm), column)
+    result = {"BPM": float(column[len(column) // 4]), "Happy": None, "Key": "C"}
+    assert reader.of_analysis(result) == {"BPM": pytest.approx(25, abs=0.5)}
@@ -0,0 +1,39 @@
+import numpy as np
+import soundfile
+
+from app.analysis.excerpts import select_excerpts
+from app.analysis.pipeline import run_analysis
+from app.config import settings
+
+
+def test_excerpts_pick_the_loudest_stretch_of_each_section():
+    """Test that every section contributes the excerpt where the music is."""
+    audio = 0.01 * np.random.default_rng(0).standard_normal(16000 * 120)
+    audio[16000 * 10 : 16000 * 20] *= 50
+    audio[16000 * 70 : 16000 * 80] *= 50
+
+    excerpts = select_excerpts(audio.astype(np.float32), count=2, length=10)
+
+    assert [round(start) for start, _ in excerpts] == [10, 70]
+    assert all(round(end - start) == 10 for start, end in excerpts)
+
+
+def test_fast_analysis_of_long_tracks_reads_excerpts(tmp_path, monkeypatch):
+    """Test that fast applies to tracks long enough for the windowed analysis."""
+    monkeypatch.setattr(settings, "ANALYSIS_WINDOWED_AFTER", 30)
+    monkeypatch.setattr(settings, "ANALYSIS_WINDOW_SEGMENT", 20)
+    monkeypatch.setattr(settings, "ANALYSIS_EXCERPTS", 2)
+    monkeypatch.setattr(settings, "ANALYSIS_EXCERPT_SECONDS", 5)
+    audio = 0.01 * np.random.default_rng(0).standard_normal(44100 * 60)
+    audio[44100 * 40 : 44100 * 45] *= 50
+    path = str(tmp_path / "track.wav")
+    soundfile.write(path, audio.astype(np.float32), 44100)
+
+    result = run_analysis(path, lambda stage, features: None, ["Energy"], fast=True)
+
+    # Sections are read from 5 to 25 s and 35 to 55 s, the second holding the
+    # loud stretch
+    (first, _), (second, _) = result["Excerpts"]
+    assert 5 <= first <= 20
+    assert round(second) == 40
+    assert result["Energy"] > 0
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.analysis import features
+from app.analysis.audio import AudioBuffers
+
+
+def make_buffers():
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, 44100 * 5)
+    return AudioBuffers(audio.astype(np.float32), 44100)
+
+
+def test_selected_descriptors_run_only_their_nodes():
+    """Test that asking for BPM and Key runs only the nodes they need."""
+    buffers = make_buffers()
+    timings = {}
+    result = features.run_essentia_algorithms(
+        buffers.audio44k, buffers.audio16k, timings, features=["BPM", "Key"]
+    )
+    assert set(result) == {"BPM", "Key"}
+    assert set(timings) == {"rhythm", "key"}
+
+
+def test_model_features_skip_descriptors(monkeypatch):
+    """Test that asking only for a mood head skips the DSP and its resampling."""
+    monkeypatch.setattr(
+        features, "run_models", lambda audio, sample_rate, selected: {"Happy": 0.5}
+    )
+    buffers = make_buffers()
+    assert features.extract_audio_features(buffers, features=["Happy"]) == {"Happy": 0.5}
+    assert "audio44k" not in vars(buffers)
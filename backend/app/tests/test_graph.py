@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from app.analysis.graph import FeatureGraph, FeatureNode, create_executor
+
+
+def total(audio):
+    return float(np.sum(audio))
+
+
+def scale(total, factor):
+    return total * factor
+
+
+GRAPH = FeatureGraph(
+    [
+        FeatureNode("scaled", scale, ["total", "factor"]),
+        FeatureNode("total", total, ["audio"]),
+    ]
+)
+
+
+def test_graph_runs_nodes_after_their_inputs():
+    """Test that nodes get their inputs' values, inline and on a process pool."""
+    sources = {"audio": np.ones(1000, dtype=np.float32), "factor": 2}
+    values, timings = GRAPH.run(sources)
+    assert values["scaled"] == 2000.0
+    assert set(timings) == {"total", "scaled"}
+
+    executor = create_executor(2)
+    try:
+        values, _ = GRAPH.run(sources, executor)
+    finally:
+        executor.shutdown()
+    assert values["scaled"] == 2000.0
+
+    path, path_time = GRAPH.critical_path({"total": 1.0, "scaled": 0.5})
+    assert path == ["total", "scaled"] and path_time == 1.5
+
+
+def test_subgraph_keeps_only_dependencies():
+    """Test that a subgraph holds the targets and the nodes they need."""
+    graph = FeatureGraph([*GRAPH.nodes.values(), FeatureNode("unused", total, ["audio"])])
+    assert set(graph.subgraph(["scaled"]).nodes) == {"total", "scaled"}
+
+
+def test_graph_rejects_cycles():
+    """Test that a graph whose nodes can never become ready is refused."""
+    graph = FeatureGraph([FeatureNode("a", abs, ["b"]), FeatureNode("b", abs, ["a"])])
+    with pytest.raises(ValueError):
+        graph.run({})
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+
+from app.inference.heads import FusedHeads, median_predictions
+from app.inference.models import MODEL_SPECS
+
+MODELS_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "scripts", "models"
+)
+
+
+def test_fused_heads_match_individual_heads(tmp_path):
+    """Test that the merged graph predicts exactly what each head predicts alone."""
+    embeddings = np.random.default_rng(0).random((50, 128), dtype=np.float32)
+    specs = [spec for spec in MODEL_SPECS if spec.embedding == "vggish"]
+    fused = FusedHeads(specs, MODELS_PATH, str(tmp_path))
+
+    predictions = fused(embeddings)
+
+    assert list(predictions) == [spec.name for spec in specs]
+    for spec in specs:
+        expected = spec.build(MODELS_PATH)(embeddings)
+        np.testing.assert_allclose(predictions[spec.name], expected)
+
+
+def test_median_predictions_reduces_each_head():
+    """Test that the stacked median matches a per-head median."""
+    rng = np.random.default_rng(0)
+    predictions = {
+        "a": rng.random((9, 1)),
+        "b": rng.random((9, 56)),
+        "c": rng.random((9, 2)),
+    }
+
+    medians = median_predictions(predictions)
+
+    for head, head_predictions in predictions.items():
+        np.testing.assert_array_equal(medians[head], np.median(head_predictions, axis=0))
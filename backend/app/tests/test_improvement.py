@@ -0,0 +1,155 @@
+import asyncio
+import io
+import os
+import time
+
+import numpy as np
+import pytest
+import soundfile
+from fastapi.testclient import TestClient
+
+from app.analysis.pool import AnalysisPool
+from app.catalog.matrix import FeatureMatrix
+from app.catalog.percentiles import CatalogPercentiles
+from app.catalog.stats import FEATURES, FeatureStats
+from app.improvement import service
+from app.main import app
+from app.search import ann
+
+STAGE_SECONDS = 1.0
+
+
+def ready():
+    # Imports this module in a worker, as its first task would
+    return True
+
+
+def slow_embedding(path):
+    time.sleep(STAGE_SECONDS)
+    return np.ones(512, dtype=np.float32)
+
+
+def slow_analysis(path, on_stage, features, fast):
+    time.sleep(STAGE_SECONDS)
+    return {"BPM": 120.0, "Happy": 0.5, "Danceability": None}
+
+
+async def fake_nearest_songs(db, embedding, count):
+    return [
+        {"video_id": f"song{index}", "filename": f"song{index}.mp3", "similarity": 0.9}
+        for index in range(count)
+    ]
+
+
+async def fake_song_rows(db, video_ids):
+    return {video_id: {"video_id": video_id} for video_id in video_ids}
+
+
+def test_improvement_runs_stages_concurrently(tmp_path, monkeypatch):
+    """Test that the embedding and the analysis overlap, and songs are compared."""
+    video_ids = np.array([f"song{index}" for index in range(10)])
+    values = np.random.default_rng(0).random((10, len(FEATURES))) * 200
+    matrix = FeatureMatrix.empty()
+    matrix.update(video_ids, values)
+    percentiles = CatalogPercentiles.empty()
+    percentiles.update(values)
+    pools = [AnalysisPool(workers=1, max_queue=1, warmup=False) for _ in range(2)]
+    monkeypatch.setattr(service, "analysis_pool", pools[0])
+    monkeypatch.setattr(service, "embedding_pool", pools[1])
+    monkeypatch.setattr(service, "analyze_audio", slow_analysis)
+    monkeypatch.setattr(service, "clap_embedding", slow_embedding)
+    monkeypatch.setattr(service, "nearest_songs", fake_nearest_songs)
+    monkeypatch.setattr(service, "song_rows", fake_song_rows)
+    monkeypatch.setattr(
+        service, "feature_stats", lambda: FeatureStats.from_songs(video_ids, values)
+    )
+    monkeypatch.setattr(service, "feature_matrix", lambda: matrix)
+    monkeypatch.setattr(service, "catalog_percentiles", lambda: percentiles)
+    monkeypatch.setattr(service.settings, "ANALYSIS_UPLOADS_PATH", str(tmp_path))
+
+    wav = io.BytesIO()
+    soundfile.write(wav, np.zeros(8000, dtype=np.float32), 8000, format="WAV")
+    files = {"file": ("song.wav", wav.getvalue(), "audio/wav")}
+    client = TestClient(app)
+    try:
+        for pool in pools:
+            pool.start()
+            pool._executor.submit(ready).result()
+        started = time.perf_counter()
+        response = client.post("/improvement/?count=2", files=files)
+        elapsed = time.perf_counter() - started
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+    assert response.status_code == 200
+    assert elapsed < 1.8 * STAGE_SECONDS
+    improvement = response.json()
+    assert set(improvement["percentiles"]) == {"BPM", "Happy"}
+    songs = improvement["similar_songs"]
+    assert [song["video_id"] for song in songs] == ["song0", "song1"]
+    assert songs[0]["song"] == {"video_id": "song0"}
+    assert set(songs[0]["ranked"]) == {"bpm", "happy_normalized"}
+    assert songs[0]["deltas"]["bpm"] == np.float32(120 - values[0, FEATURES.index("bpm")])
+
+
+def test_nearest_songs_come_from_the_index_once_built(tmp_path, monkeypatch):
+    """Test that the song index answers when built, and pgvector until then."""
+    vectors = np.random.default_rng(0).standard_normal((200, 16)).astype(np.float32)
+    video_ids = np.array([f"song{index}" for index in range(200)])
+    monkeypatch.setattr(service, "nearest_songs", fake_nearest_songs)
+    monkeypatch.setattr(ann, "_index", None)
+    monkeypatch.setattr(ann.settings, "SEARCH_INDEX_PATH", str(tmp_path / "songs"))
+
+    songs = asyncio.run(service.nearest(None, vectors[7], 2))
+    assert [song["video_id"] for song in songs] == ["song0", "song1"]
+
+    ann.IVFIndex.build(vectors, video_ids, lists=4).save(str(tmp_path / "songs"))
+    songs = asyncio.run(service.nearest(None, vectors[7], 2))
+    assert songs[0]["video_id"] == "song7"
+    assert songs[0]["similarity"] == pytest.approx(1.0)
+    assert len(songs) == 2
+
+
+def failing_embedding(path):
+    # Once the analysis is under way in the other pool
+    time.sleep(STAGE_SECONDS / 4)
+    raise RuntimeError("No CLAP model")
+
+
+def marked_analysis(path, on_stage, features, fast):
+    # Records whether the upload was still there once the analysis was done
+    time.sleep(STAGE_SECONDS)
+    with open(path + ".analyzed", "w") as marker:
+        marker.write(str(os.path.exists(path)))
+    return {"BPM": 120.0}
+
+
+def test_failed_improvement_waits_for_the_other_stage(tmp_path, monkeypatch):
+    """Test that the upload outlives the analysis when the embedding fails."""
+    pools = [AnalysisPool(workers=1, max_queue=1, warmup=False) for _ in range(2)]
+    monkeypatch.setattr(service, "analysis_pool", pools[0])
+    monkeypatch.setattr(service, "embedding_pool", pools[1])
+    monkeypatch.setattr(service, "analyze_audio", marked_analysis)
+    monkeypatch.setattr(service, "clap_embedding", failing_embedding)
+    for catalog in ["feature_stats", "feature_matrix", "catalog_percentiles"]:
+        monkeypatch.setattr(service, catalog, lambda: None)
+    monkeypatch.setattr(service.settings, "ANALYSIS_UPLOADS_PATH", str(tmp_path))
+
+    wav = io.BytesIO()
+    soundfile.write(wav, np.zeros(8000, dtype=np.float32), 8000, format="WAV")
+    files = {"file": ("song.wav", wav.getvalue(), "audio/wav")}
+    client = TestClient(app)
+    try:
+        for pool in pools:
+            pool.start()
+            pool._executor.submit(ready).result()
+        response = client.post("/improvement/", files=files)
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+    assert response.status_code == 500
+    markers = list(tmp_path.glob("*.analyzed"))
+    assert [marker.read_text() for marker in markers] == ["True"]
+    assert all(pool.pending == 0 for pool in pools)
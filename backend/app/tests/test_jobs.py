@@ -0,0 +1,155 @@
+import asyncio
+import io
+import os
+
+import numpy as np
+import soundfile
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+from app.analysis import jobs, routes, worker
+from app.analysis.cache import ResultCache
+from app.db import get_db
+from app.main import app
+from app.models.analysis_job import AnalysisJob, utcnow
+
+
+class FakeResult:
+    def __init__(self, job):
+        self.job = job
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.job
+
+
+class FakeSession:
+    """Just enough of an AsyncSession for the jobs, which it keeps in a dict.
+
+    Claims get the `claimable` jobs in order, as Postgres would give the
+    oldest queued or stale job that no other worker has locked.
+    """
+
+    def __init__(self, claimable=()):
+        self.jobs = {}
+        self.claimable = list(claimable)
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def add(self, job):
+        # The column defaults, which the database would apply on insert
+        job.created_at = job.created_at or utcnow()
+        job.attempts = job.attempts or 0
+        self.jobs[job.id] = job
+
+    async def get(self, model, job_id):
+        return self.jobs.get(job_id)
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return FakeResult(self.claimable.pop(0) if self.claimable else None)
+
+    async def commit(self):
+        pass
+
+
+def queued_job(tmp_path, job_id: str, attempts: int = 0) -> AnalysisJob:
+    upload_path = tmp_path / job_id
+    upload_path.write_bytes(b"audio")
+    return AnalysisJob(
+        id=job_id,
+        status="queued",
+        upload_path=str(upload_path),
+        progress={},
+        attempts=attempts,
+        created_at=utcnow(),
+    )
+
+
+def test_jobs_are_queued_and_read_back(tmp_path, monkeypatch):
+    """Test that an upload is moved into the jobs directory and its job polled."""
+    session = FakeSession()
+    app.dependency_overrides[get_db] = lambda: session
+    monkeypatch.setattr(routes.settings, "ANALYSIS_JOBS_PATH", str(tmp_path))
+    monkeypatch.setattr(
+        routes, "result_cache", ResultCache(str(tmp_path / "cache"), "1", 2, 10**6, 0)
+    )
+    wav = io.BytesIO()
+    soundfile.write(wav, np.zeros(8000, dtype=np.float32), 8000, format="WAV")
+    client = TestClient(app)
+    try:
+        response = client.post(
+            "/analysis/jobs", files={"file": ("song.wav", wav.getvalue(), "audio/wav")}
+        )
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued"
+        assert set(job["progress"].values()) == {"pending"}
+        assert os.path.exists(tmp_path / job["id"])
+
+        response = client.get(f"/analysis/jobs/{job['id']}")
+        assert response.json()["id"] == job["id"]
+        assert client.get("/analysis/jobs/unknown").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_claim_locks_a_job_and_fails_those_out_of_attempts(tmp_path, monkeypatch):
+    """Test that claims skip locked rows and give up on jobs that keep dying."""
+    monkeypatch.setattr(jobs.settings, "ANALYSIS_JOB_MAX_ATTEMPTS", 2)
+    stale, queued = queued_job(tmp_path, "stale", attempts=2), queued_job(tmp_path, "new")
+    session = FakeSession([stale, queued])
+
+    claimed = asyncio.run(jobs.claim_job(session))
+
+    query = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in query
+    assert "heartbeat_at <" in query
+    assert stale.status == "failed" and stale.finished_at is not None
+    assert claimed is queued
+    assert claimed.status == "running" and claimed.attempts == 1
+    assert claimed.started_at == claimed.heartbeat_at
+
+    asyncio.run(jobs.heartbeat(session, "new"))
+    query = str(session.statements[-1].compile(dialect=postgresql.dialect()))
+    assert query.startswith("UPDATE analysis_jobs SET heartbeat_at=")
+
+
+def test_worker_writes_the_result_or_error_of_a_claimed_job(tmp_path, monkeypatch):
+    """Test that the worker runs a claimed job and records how it went."""
+    session = FakeSession([queued_job(tmp_path, "good"), queued_job(tmp_path, "bad")])
+    monkeypatch.setattr(worker, "AsyncSessionLocal", lambda: session)
+    monkeypatch.setattr(
+        worker, "result_cache", ResultCache(str(tmp_path / "cache"), "1", 2, 10**6, 0)
+    )
+
+    def analyze_audio(path, on_stage):
+        if path.endswith("bad"):
+            raise RuntimeError("Unreadable audio")
+        for stage in jobs.STAGES:
+            on_stage(stage, {})
+        return {"BPM": np.float32(120.0)}
+
+    monkeypatch.setattr(worker, "analyze_audio", analyze_audio)
+
+    async def run_claimed():
+        for _ in range(2):
+            job = await jobs.claim_job(session)
+            session.jobs[job.id] = job
+            await worker.process_job(job)
+
+    asyncio.run(run_claimed())
+
+    good, bad = session.jobs["good"], session.jobs["bad"]
+    assert good.status == "done" and good.result == {"BPM": 120.0}
+    assert set(good.progress.values()) == {"done"}
+    assert bad.status == "failed" and bad.error == "Unreadable audio"
+    assert not os.path.exists(good.upload_path)
+    assert not os.path.exists(bad.upload_path)
@@ -1,3 +1,6 @@
+import subprocess
+import sys
+
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -10,3 +13,14 @@ def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "Hello, World!"}
+
+
+def test_api_does_not_import_the_analysis():
+    """Test that the API starts without loading the analysis or numpy."""
+    # In a fresh interpreter, since other tests import the analysis here
+    script = "import sys, app.main; print(*sorted(sys.modules))"
+    modules = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout.split()
+    heavy = {"essentia", "librosa", "tensorflow", "numpy", "scipy", "jose", "passlib"}
+    assert not heavy & set(modules)
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import timed
+
+client = TestClient(app)
+
+
+def test_metrics_endpoint():
+    """Timed stages show up on /metrics in the Prometheus text format."""
+    with timed("stage", "test"):
+        pass
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'analysis_wall_seconds_count{kind="stage",name="test"}' in response.text
+
+
+def test_samples_recorded_after_clearing_show_up(tmp_path):
+    """Test that clearing before the service starts only drops the last run."""
+    environment = os.environ | {"PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+
+    def run(code: str) -> str:
+        return subprocess.run(
+            [sys.executable, "-c", code],
+            env=environment,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    record = "from app.metrics import timed\nwith timed('stage', {!r}):\n    pass\n"
+    run(record.format("previous run"))
+    run("from app.metrics_reset import clear_metrics\nclear_metrics()")
+    text = run(
+        record.format("this run")
+        + "from fastapi.testclient import TestClient\n"
+        + "from app.main import app\n"
+        + "print(TestClient(app).get('/metrics').text)"
+    )
+
+    assert 'name="this run"' in text
+    assert "previous run" not in text
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+
+from app.inference import models, runtime
+from app.inference.models import FUSED_SPECS, MODEL_SPECS, ModelRegistry
+
+SCRIPTS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts")
+
+
+def make_registry(memory_budget=0):
+    loads = []
+
+    def loader(spec):
+        loads.append(spec.name)
+        return lambda embeddings: spec.name
+
+    registry = ModelRegistry(
+        MODEL_SPECS,
+        models_path=os.path.join(SCRIPTS_PATH, "models"),
+        data_path=os.path.join(SCRIPTS_PATH, "data"),
+        memory_budget=memory_budget,
+        loader=loader,
+    )
+    return registry, loads
+
+
+def test_models_load_on_first_use():
+    """Test that models are only built when first requested."""
+    registry, loads = make_registry()
+    assert loads == []
+
+    assert registry.get("happy")(None) == "happy"
+    registry.get("happy")
+    assert loads == ["happy"]
+    assert registry.stats()["models"]["happy"]["uses"] == 2
+    assert not registry.stats()["models"]["sad"]["loaded"]
+
+
+def test_warmup_loads_every_model():
+    """Test that warmup builds all 18 graphs and reports their load stats."""
+    registry, loads = make_registry()
+    stats = registry.warmup()
+
+    assert len(loads) == len(MODEL_SPECS) == 18
+    for model_stats in stats["models"].values():
+        assert model_stats["loaded"]
+        assert model_stats["load_seconds"] >= 0
+
+
+def test_memory_budget_evicts_least_recently_used_heads(monkeypatch):
+    """Test that heads are evicted LRU first while embedding models stay pinned."""
+    # Without an RSS delta each model is accounted for by its graph file size,
+    # and each mood head graph is ~53 kB
+    monkeypatch.setattr(models, "current_rss", lambda: 0)
+    registry, loads = make_registry(memory_budget=60_000)
+    for name in ["discogs", "vggish", "happy", "sad"]:
+        registry.get(name)
+
+    stats = registry.stats()
+    assert stats["models"]["discogs"]["loaded"]
+    assert stats["models"]["vggish"]["loaded"]
+    assert not stats["models"]["happy"]["loaded"]
+    assert stats["models"]["sad"]["loaded"]
+    assert stats["evictions"] == 1
+
+    registry.get("happy")
+    assert loads.count("happy") == 2
+
+
+def test_head_classes_are_read_from_metadata():
+    """Test that class labels come from the head's Essentia metadata file."""
+    registry, _ = make_registry()
+    classes = registry.classes("jamendo_instrument")
+
+    assert "piano" in classes
+    assert registry.classes("jamendo_instrument") is classes
+
+
+def test_batch_runs_heads_once_at_the_pinned_rate(monkeypatch):
+    """Test that a batch matches song-by-song runs with one fused call per embedding."""
+    inputs, calls = [], []
+
+    def embedding(audio):
+        # One frame per 1000 samples, valued by position in the song
+        inputs.append(len(audio))
+        return np.arange(len(audio) // 1000, dtype=np.float32)[:, None] + len(audio)
+
+    def loader(spec):
+        if spec.name in runtime.EMBEDDINGS:
+            return embedding
+
+        def heads(frames):
+            calls.append(spec.name)
+            return {
+                head.name: frames[:, :1] * (index + 1)
+                for index, head in enumerate(spec.heads)
+            }
+
+        return heads
+
+    registry = ModelRegistry(MODEL_SPECS + FUSED_SPECS, "", "", loader=loader)
+    monkeypatch.setattr(runtime, "registry", registry)
+    rng = np.random.default_rng(0)
+    songs = [(rng.random(48000 * seconds, dtype=np.float32), 48000) for seconds in [1, 2]]
+    outputs = {"happy", "approachability", "vggish"}
+
+    batch = runtime.batch_predictions(songs, outputs)
+    assert sorted(calls) == ["discogs_heads", "vggish_heads"]
+    assert set(inputs) == {16000, 32000}
+    for (groups, vggish), song in zip(batch, songs):
+        single_groups, single_vggish = runtime.model_predictions(*song, outputs)
+        np.testing.assert_array_equal(vggish, single_vggish)
+        for name, group in single_groups.items():
+            for head, predictions in group.items():
+                np.testing.assert_array_equal(groups[name][head], predictions)
@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+import pytest
+
+from app.analysis.pool import AnalysisPool, AnalysisSaturated
+
+
+def test_pool_rejects_work_beyond_queue_limit():
+    """Test that the pool refuses new work once workers and queue are full."""
+    pool = AnalysisPool(workers=1, max_queue=1, warmup=False)
+
+    async def submit():
+        running = asyncio.gather(pool.run(time.sleep, 0.5), pool.run(time.sleep, 0.5))
+        await asyncio.sleep(0)
+        with pytest.raises(AnalysisSaturated):
+            await pool.run(time.sleep, 0)
+        await running
+        return await pool.run(abs, -1)
+
+    try:
+        assert asyncio.run(submit()) == 1
+    finally:
+        pool.shutdown()
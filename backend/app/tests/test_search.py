@@ -0,0 +1,106 @@
+import asyncio
+import io
+
+import numpy as np
+import soundfile
+from fastapi.testclient import TestClient
+
+from app.analysis import routes
+from app.analysis.pool import AnalysisPool
+from app.main import app
+from app.search import vectors
+from app.search.clips import ClipCatalog, clip_embeddings, normalize
+
+
+def random_catalog(songs=50, frames=30, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"song{index}": rng.normal(size=(frames, 128)) for index in range(songs)}
+
+
+def test_top_clips_match_brute_force():
+    """Test that the blocked top-k finds the same clips as a full sort."""
+    catalog = ClipCatalog.from_songs(random_catalog())
+    queries = normalize(np.random.default_rng(1).normal(size=(7, 128)))
+
+    scores, indices = catalog.top_clips(queries, k=20, block_size=64)
+
+    expected = np.argsort(-(queries @ catalog.embeddings.T), axis=1)[:, :20]
+    np.testing.assert_array_equal(np.sort(indices, axis=1), np.sort(expected, axis=1))
+    np.testing.assert_allclose(
+        scores,
+        np.take_along_axis(queries @ catalog.embeddings.T, indices, axis=1),
+        rtol=1e-5,
+    )
+
+
+def test_similar_songs_vote_for_the_query_song(tmp_path):
+    """Test that a noisy copy of a song gets most votes for that song."""
+    songs = random_catalog()
+    ClipCatalog.from_songs(songs).save(str(tmp_path))
+    catalog = ClipCatalog.load(str(tmp_path))
+    noisy = songs["song7"] + np.random.default_rng(2).normal(0, 0.3, size=(30, 128))
+
+    similar = catalog.similar_songs(clip_embeddings(noisy), count=3, k=5)
+
+    assert similar[0]["song"] == "song7"
+    assert similar[0]["votes"] > similar[1]["votes"]
+    assert len(similar) == 3
+
+
+class RecordingConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    async def execute(self, statement, parameters):
+        self.executed.append((statement, parameters))
+        return self.rows if statement is vectors.NEAREST_SONGS else []
+
+
+class Row:
+    def __init__(self, **mapping):
+        self._mapping = mapping
+
+
+def test_nearest_songs_tune_the_scan_for_the_transaction():
+    """Test that the scan parameters are set locally before the ordered query."""
+    db = RecordingConnection([Row(video_id="a", filename="a.mp3", similarity=0.9)])
+
+    songs = asyncio.run(vectors.nearest_songs(db, [0.5, 1], count=100, probes=8))
+
+    assert songs == [{"video_id": "a", "filename": "a.mp3", "similarity": 0.9}]
+    assert db.executed == [
+        (vectors.SET_LOCAL, {"parameter": "hnsw.ef_search", "value": "100"}),
+        (vectors.SET_LOCAL, {"parameter": "ivfflat.probes", "value": "8"}),
+        (vectors.NEAREST_SONGS, {"embedding": "[0.5,1.0]", "count": 100}),
+    ]
+    assert "set_config(:parameter, :value, true)" in str(vectors.SET_LOCAL)
+
+
+def voted_songs(path, count):
+    return [{"song": "song7", "votes": 3, "similarity": 2.5}][:count]
+
+
+def unbuilt_catalog(path, count):
+    raise FileNotFoundError("search/songs.npy")
+
+
+def test_similar_songs_of_an_upload(tmp_path, monkeypatch):
+    """Test that uploads are searched in the pool, and missing catalogs are a 503."""
+    pool = AnalysisPool(workers=1, max_queue=1, warmup=False)
+    monkeypatch.setattr(routes, "analysis_pool", pool)
+    monkeypatch.setattr(routes.settings, "ANALYSIS_UPLOADS_PATH", str(tmp_path))
+    wav = io.BytesIO()
+    soundfile.write(wav, np.zeros(8000, dtype=np.float32), 8000, format="WAV")
+    files = {"file": ("song.wav", wav.getvalue(), "audio/wav")}
+    client = TestClient(app)
+    try:
+        monkeypatch.setattr(routes, "get_similar_songs", voted_songs)
+        response = client.post("/analysis/similar?count=1", files=files)
+        assert response.json() == [{"song": "song7", "votes": 3, "similarity": 2.5}]
+
+        monkeypatch.setattr(routes, "get_similar_songs", unbuilt_catalog)
+        assert client.post("/analysis/similar", files=files).status_code == 503
+        assert list(tmp_path.iterdir()) == []
+    finally:
+        pool.shutdown()
@@ -0,0 +1,52 @@
+import numpy as np
+from essentia.standard import FrameGenerator, MelBands, Spectrum, Windowing
+
+from app.analysis import features
+from app.analysis.spectral import SpectralFrontEnd
+
+
+def essentia_mel_bands(audio):
+    spectrum, window, mel_bands = (
+        Spectrum(),
+        Windowing(type="hann"),
+        MelBands(numberBands=40),
+    )
+    return np.array(
+        [
+            mel_bands(spectrum(window(frame)))
+            for frame in FrameGenerator(audio, frameSize=2048, hopSize=1024)
+        ]
+    )
+
+
+def test_front_end_matches_essentia_frame_loop():
+    """Test that the vectorized front end reproduces Essentia's per-frame loop."""
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, 44100 * 3 + 777)
+    audio = audio.astype(np.float32)
+    front_end = SpectralFrontEnd(audio)
+
+    expected = essentia_mel_bands(audio)
+
+    assert front_end.magnitudes.shape == (len(expected), 1025)
+    np.testing.assert_allclose(front_end.mel_bands, expected, rtol=1e-3, atol=1e-7)
+
+
+def test_graph_builds_one_front_end_per_run(monkeypatch):
+    """Test that the mel bands node reads the spectra of the shared front end."""
+    front_ends = []
+
+    class CountedFrontEnd(SpectralFrontEnd):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            front_ends.append(self)
+
+    monkeypatch.setattr(features, "SpectralFrontEnd", CountedFrontEnd)
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, 44100 * 3).astype(np.float32)
+    graph = features.ALGORITHMS_GRAPH.subgraph({"novelty", "inharmonicity"})
+
+    values, _ = graph.run({"audio44k": audio, "audio16k": audio[::3]})
+
+    assert len(front_ends) == 1
+    np.testing.assert_allclose(
+        values["mel_bands"], essentia_mel_bands(audio), rtol=1e-3, atol=1e-7
+    )
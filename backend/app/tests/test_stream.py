@@ -0,0 +1,50 @@
+import io
+
+import numpy as np
+import soundfile
+from fastapi.testclient import TestClient
+
+from app.analysis import routes
+from app.analysis.cache import ResultCache
+from app.analysis.pool import AnalysisPool
+from app.main import app
+
+
+def staged_analysis(path, on_stage, features, fast):
+    on_stage("algorithms", {"BPM": np.float32(120.0)})
+    on_stage("models", {"Happy": 0.5})
+    return {"BPM": 120.0, "Happy": 0.5}
+
+
+def events(response):
+    return [
+        event.split("\n")[0].removeprefix("event: ")
+        for event in response.text.strip().split("\n\n")
+    ]
+
+
+def test_stream_sends_stages_then_summary(tmp_path, monkeypatch):
+    """Test that each stage is sent as it completes and the result is cached."""
+    pool = AnalysisPool(workers=1, max_queue=1, warmup=False)
+    cache = ResultCache(str(tmp_path / "cache"), "1", 2, 10**6, 0)
+    monkeypatch.setattr(routes, "analysis_pool", pool)
+    monkeypatch.setattr(routes, "result_cache", cache)
+    monkeypatch.setattr(routes, "analyze_audio", staged_analysis)
+    monkeypatch.setattr(routes.settings, "ANALYSIS_UPLOADS_PATH", str(tmp_path))
+
+    wav = io.BytesIO()
+    soundfile.write(wav, np.zeros(8000, dtype=np.float32), 8000, format="WAV")
+    files = {"file": ("song.wav", wav.getvalue(), "audio/wav")}
+    client = TestClient(app)
+    try:
+        response = client.post("/analysis/stream", files=files)
+        assert events(response) == ["algorithms", "models", "summary"]
+        assert 'data: {"BPM": 120.0}' in response.text
+
+        response = client.post("/analysis/stream", files=files)
+        assert events(response) == ["result", "summary"]
+
+        response = client.post("/analysis/stream?features=Tempo", files=files)
+        assert response.status_code == 422
+    finally:
+        pool.shutdown()
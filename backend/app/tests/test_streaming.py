@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.analysis.streaming import StreamingQuantile, StreamingSubsample
+
+
+def test_streaming_median_is_close_to_exact_median():
+    """Test that the P² estimate tracks np.median of every column."""
+    rows = np.random.default_rng(0).beta(2, 5, (2000, 20))
+    median = StreamingQuantile()
+    for chunk in np.array_split(rows, 7):
+        median.update(chunk)
+
+    assert median.count == len(rows)
+    np.testing.assert_allclose(median.value(), np.median(rows, axis=0), atol=0.01)
+
+
+def test_streaming_median_is_exact_for_few_observations():
+    """Test that fewer than five observations give their exact median."""
+    median = StreamingQuantile()
+    median.update(np.array([3.0, 1.0, 2.0]))
+    assert median.value() == [2.0]
+
+
+def test_streaming_subsample_keeps_evenly_spaced_rows():
+    """Test that a long stream is thinned to every few rows, short ones kept."""
+    rows = np.arange(1000)[:, None]
+    subsample = StreamingSubsample(capacity=100)
+    for chunk in np.array_split(rows, 13):
+        subsample.update(chunk)
+
+    assert subsample.stride == 16
+    np.testing.assert_array_equal(subsample.value(), rows[::16])
+
+    short = StreamingSubsample(capacity=100)
+    short.update(rows[:60])
+    short.update(rows[60:100])
+    np.testing.assert_array_equal(short.value(), rows[:100])
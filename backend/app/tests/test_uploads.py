@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import numpy as np
+import pytest
+import soundfile
+from fastapi import HTTPException, Request
+
+from app.analysis.uploads import receive_upload
+
+BOUNDARY = "popcast"
+
+
+def wav_bytes(seconds):
+    wav = io.BytesIO()
+    soundfile.write(wav, np.zeros(8000 * seconds, dtype=np.float32), 8000, format="WAV")
+    return wav.getvalue()
+
+
+def multipart_request(content: bytes, content_type: str = "audio/wav", received=None):
+    """A request of a multipart body holding `content`, sent in small chunks.
+
+    `received`, if given, collects the chunks the server has read.
+    """
+    body = (
+        (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="song.wav"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        + content
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+    chunks = [body[start : start + 1000] for start in range(0, len(body), 1000)]
+
+    async def receive():
+        chunk = chunks.pop(0)
+        if received is not None:
+            received.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    content_type_header = f"multipart/form-data; boundary={BOUNDARY}".encode()
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [(b"content-type", content_type_header)],
+    }
+    return Request(scope, receive)
+
+
+def receive(tmp_path, request, **limits):
+    limits = {"max_bytes": 10**6, "max_duration": 60, **limits}
+    return asyncio.run(receive_upload(request, str(tmp_path), **limits))
+
+
+def test_received_upload_is_hashed_on_disk(tmp_path):
+    """Test that the file of a multipart body lands on disk with its digest."""
+    content = wav_bytes(2)
+    upload = receive(tmp_path, multipart_request(content))
+    with open(upload.path, "rb") as upload_file:
+        assert upload_file.read() == content
+    assert upload.digest == hashlib.sha256(content).hexdigest()
+    assert upload.size == len(content)
+    assert (upload.filename, upload.content_type) == ("song.wav", "audio/wav")
+    assert os.listdir(tmp_path) == [os.path.basename(upload.path)]
+
+
+@pytest.mark.parametrize("limits", [{"max_bytes": 1000}, {"max_duration": 1}])
+def test_oversized_upload_is_refused(tmp_path, limits):
+    """Test that uploads over the size or duration limit get a 413 and no file."""
+    with pytest.raises(HTTPException) as error:
+        receive(tmp_path, multipart_request(wav_bytes(2)), **limits)
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_oversized_upload_is_cut_off_as_it_arrives(tmp_path):
+    """Test that the rest of the body isn't read once over the size limit."""
+    received = []
+    with pytest.raises(HTTPException):
+        receive(
+            tmp_path, multipart_request(wav_bytes(2), received=received), max_bytes=5000
+        )
+    assert len(received) == 6
+
+
+def test_upload_of_another_type_is_refused(tmp_path):
+    """Test that a file of the wrong type gets a 400 before it is read."""
+    received = []
+    request = multipart_request(wav_bytes(2), "text/plain", received)
+    with pytest.raises(HTTPException) as error:
+        receive(tmp_path, request, content_types=["audio/wav"])
+    assert error.value.status_code == 400
+    assert len(received) == 1
+    assert os.listdir(tmp_path) == []
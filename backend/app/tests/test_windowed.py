@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import soundfile
+
+from app.analysis.service import analyze_audio
+from app.analysis.windowed import analyze_windowed, read_windows
+from app.config import settings
+
+SAMPLE_RATE = 44100
+
+
+def write_track(path, seconds: float) -> str:
+    """Bursts of a 440 Hz tone, twice a second."""
+    time = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = 0.3 * np.sin(2 * np.pi * 440 * time) * (np.sin(2 * np.pi * 2 * time) > 0)
+    soundfile.write(path, audio.astype(np.float32), SAMPLE_RATE)
+    return str(path)
+
+
+def write_song(path, seconds: float) -> str:
+    """An A minor triad over clicks at 120 BPM, every fourth one accented."""
+    time = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    chord = sum(
+        np.sin(2 * np.pi * frequency * time) for frequency in [220, 261.63, 329.63]
+    )
+    clicks = np.exp(-40 * (time % 0.5)) * np.sin(2 * np.pi * 80 * time)
+    accents = np.where(time % 2 < 0.5, 1.0, 0.5)
+    audio = 0.1 * chord + 0.6 * clicks * accents
+    soundfile.write(path, audio.astype(np.float32), SAMPLE_RATE)
+    return str(path)
+
+
+def test_short_last_segment_joins_the_one_before(tmp_path):
+    """Test that a track ending just past a segment boundary is still analysed."""
+    path = write_track(tmp_path / "track.wav", 30.5)
+    segments = [
+        (end - start) / sample_rate
+        for _, sample_rate, start, end in read_windows(path, 10, 1)
+    ]
+    assert segments == [10, 10, 10.5]
+
+    result = analyze_windowed(
+        path, 30.5, 10, 1, lambda stage, features: None, ["Time Signature"]
+    )
+    assert result["Time Signature"] is not None
+
+
+def test_windowed_analysis_matches_the_whole_track(tmp_path, monkeypatch):
+    """Test that windows give the features of the whole track, within tolerance.
+
+    Loudness comes from the total energy, so only the resampling at the
+    window edges may move it, by well under 1%. BPM may differ by 0.1 BPM;
+    key, scale and time signature must be the same.
+    """
+    path = write_song(tmp_path / "song.wav", 60)
+    features = ["Loudness", "BPM", "Key", "Key Scale", "Time Signature"]
+    whole = analyze_audio(path, features=features)
+
+    monkeypatch.setattr(settings, "ANALYSIS_WINDOWED_AFTER", 20)
+    monkeypatch.setattr(settings, "ANALYSIS_WINDOW_SEGMENT", 15)
+    monkeypatch.setattr(settings, "ANALYSIS_WINDOW_CONTEXT", 2)
+    windowed = analyze_audio(path, features=features)
+
+    assert windowed["Loudness"] == pytest.approx(whole["Loudness"], rel=0.01)
+    assert windowed["BPM"] == pytest.approx(whole["BPM"], abs=0.1)
+    for feature in ["Key", "Key Scale", "Time Signature"]:
+        assert windowed[feature] == whole[feature]
@@ -0,0 +1,103 @@
+"""Microbenchmarks of each part of the analysis, on synthetic audio.
+
+Run from the backend directory, without coverage, which distorts timings:
+
+    python -m pytest benchmarks --no-cov --benchmark-save=<name>
+
+and compare against a stored baseline with --benchmark-compare=<id>, or
+--benchmark-compare-fail=median:10% to fail on regressions. Baselines are
+JSON files under benchmarks/baselines, and only comparable on the same machine.
+"""
+
+from functools import cache
+
+import pytest
+
+from app.analysis.audio import (
+    ALGORITHMS_SAMPLE_RATE,
+    MODELS_SAMPLE_RATE,
+    AudioBuffers,
+    decode_audio,
+)
+from app.analysis.features import ALGORITHMS_GRAPH, get_mel_bands
+from app.analysis.service import analyze_audio
+from app.inference.heads import median_predictions
+from app.inference.runtime import model_features, model_predictions
+from benchmarks.signals import SIGNALS
+
+KINDS = list(SIGNALS)
+LENGTHS = [10, 60, 180]  # Seconds
+DESCRIPTOR_LENGTH = 30
+BPM = 120
+
+
+@cache
+def buffers(kind: str, seconds: float) -> AudioBuffers:
+    return AudioBuffers(SIGNALS[kind](seconds), ALGORITHMS_SAMPLE_RATE)
+
+
+@cache
+def node_values(kind: str) -> dict:
+    """Every node's value for a signal, to feed the nodes downstream of it."""
+    audio = buffers(kind, DESCRIPTOR_LENGTH)
+    values, _ = ALGORITHMS_GRAPH.run(
+        {"audio44k": audio.audio44k, "audio16k": audio.audio16k}
+    )
+    return values
+
+
+@pytest.mark.parametrize("seconds", LENGTHS)
+def test_decode(benchmark, signal_file, seconds):
+    benchmark(decode_audio, signal_file("song", seconds))
+
+
+@pytest.mark.parametrize("seconds", LENGTHS)
+def test_resample(benchmark, seconds):
+    audio = buffers("song", seconds).audio
+
+    def resample():
+        resampled = AudioBuffers(audio, ALGORITHMS_SAMPLE_RATE)
+        return resampled.audio44k, resampled.audio16k
+
+    benchmark(resample)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+@pytest.mark.parametrize("node", list(ALGORITHMS_GRAPH.nodes))
+def test_descriptor(benchmark, node, kind):
+    values = node_values(kind)
+    node = ALGORITHMS_GRAPH.nodes[node]
+    benchmark(node.function, *[values[node_input] for node_input in node.inputs])
+
+
+@pytest.mark.parametrize("seconds", LENGTHS)
+def test_get_mel_bands(benchmark, seconds):
+    benchmark(get_mel_bands, buffers("song", seconds).audio44k)
+
+
+@pytest.mark.parametrize("seconds", LENGTHS)
+def test_head_postprocessing(benchmark, seconds):
+    groups, embeddings = model_predictions(
+        buffers("song", seconds).audio16k, MODELS_SAMPLE_RATE
+    )
+
+    def postprocess():
+        predictions = {}
+        for group in groups.values():
+            predictions |= median_predictions(group)
+        return model_features(predictions, embeddings)
+
+    benchmark(postprocess)
+
+
+@pytest.mark.parametrize(
+    "kind, seconds, fast",
+    [(kind, 30, False) for kind in KINDS] + [("song", 180, False), ("song", 180, True)],
+)
+def test_analyze_audio(benchmark, signal_file, kind, seconds, fast):
+    path = signal_file(kind, seconds)
+    result = benchmark.pedantic(analyze_audio, (path,), {"fast": fast}, rounds=3)
+
+    if kind in ["click", "song"]:
+        # The signals are what they claim to be
+        assert result["BPM"] == pytest.approx(BPM, abs=1)
@@ -0,0 +1,87 @@
+"""Latency and recall@10 of the in-process song index, against exact search.
+
+Compressed indexes are listed by the memory their searches scan too.
+"""
+
+from functools import cache
+
+import numpy as np
+import pytest
+
+from app.search.ann import IVFIndex
+from benchmarks.vector_recall import random_embeddings
+
+SONGS = 100_000
+QUERIES = 100
+K = 10
+
+
+@cache
+def songs() -> tuple[np.ndarray, np.ndarray]:
+    return random_embeddings(SONGS).astype(np.float32), np.arange(SONGS).astype(str)
+
+
+@cache
+def queries() -> np.ndarray:
+    # Songs moved by about half their length, like a new song in the same style
+    vectors, _ = songs()
+    rng = np.random.default_rng(1)
+    picked = vectors[rng.choice(SONGS, QUERIES, replace=False)]
+    return picked + 0.02 * rng.standard_normal(picked.shape).astype(np.float32)
+
+
+@cache
+def exact() -> list[set[str]]:
+    vectors, ids = songs()
+    scores = queries() @ vectors.T
+    return [set(ids[row]) for row in np.argsort(-scores, axis=1)[:, :K]]
+
+
+@pytest.fixture(scope="module", params=[None, "int8", "pq"])
+def index(request, tmp_path_factory):
+    """The index as the API workers see it: loaded memory-mapped."""
+    path = str(tmp_path_factory.mktemp("index"))
+    IVFIndex.build(*songs(), compression=request.param).save(path)
+    return IVFIndex.load(path)
+
+
+def recall(results) -> float:
+    return float(
+        np.mean(
+            [
+                len({song for song, _ in found} & truth) / K
+                for found, truth in zip(results, exact())
+            ]
+        )
+    )
+
+
+def test_exact_search(benchmark):
+    vectors, _ = songs()
+    query = queries()[0]
+    benchmark(lambda: np.argpartition(vectors @ query, -K)[-K:])
+
+
+@pytest.mark.parametrize("probes", [1, 4, 8, 16, 32])
+def test_index_search(benchmark, index, recall_report, memory_report, probes):
+    query = queries()[:1]
+    benchmark(index.search, query, K, probes)
+
+    name = f"test_index_search[{index.compression}-{probes}]"
+    recall_report[name] = recall(index.search(queries(), K, probes))
+    memory_report[str(index.compression)] = index.scanned_bytes() / 2**20
+    benchmark.extra_info["recall"] = recall_report[name]
+    benchmark.extra_info["scanned_bytes"] = index.scanned_bytes()
+
+
+@pytest.mark.parametrize("rerank", [10, 30, 100, 300])
+def test_rerank(benchmark, index, recall_report, rerank):
+    """Recall of compressed indexes as they rank more candidates exactly."""
+    if index.compression is None:
+        pytest.skip("Uncompressed indexes rank every candidate exactly")
+    query = queries()[:1]
+    benchmark(index.search, query, K, 8, rerank)
+
+    name = f"test_rerank[{index.compression}-{rerank}]"
+    recall_report[name] = recall(index.search(queries(), K, 8, rerank))
+    benchmark.extra_info["recall"] = recall_report[name]
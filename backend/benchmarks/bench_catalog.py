@@ -0,0 +1,29 @@
+"""Comparison of an upload with catalog songs, by the in-memory feature matrix."""
+
+from functools import cache
+
+import numpy as np
+import pytest
+
+from app.catalog.matrix import FeatureMatrix
+from app.catalog.stats import COLUMNS
+
+SONGS = 100_000
+
+
+@cache
+def matrix() -> FeatureMatrix:
+    rng = np.random.default_rng(0)
+    matrix = FeatureMatrix.empty()
+    matrix.update(
+        np.arange(SONGS).astype(str), rng.random((SONGS, len(COLUMNS)), dtype=np.float32)
+    )
+    matrix.spread  # Computed once per process, not per comparison
+    return matrix
+
+
+@pytest.mark.parametrize("songs", [10, 100, 1000])
+def test_compare(benchmark, songs):
+    video_ids = np.random.default_rng(1).choice(SONGS, songs).astype(str)
+    upload = np.full(len(COLUMNS), 0.5)
+    benchmark(matrix().compare, upload, video_ids)
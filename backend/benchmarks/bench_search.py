@@ -0,0 +1,30 @@
+"""Latency of the similar songs search over random clip catalogs."""
+
+from functools import cache
+
+import numpy as np
+import pytest
+
+from app.search.clips import ClipCatalog, normalize
+
+CLIPS_PER_SONG = 40
+QUERY_CLIPS = 60  # A 3 minute song
+TOP_CLIPS = 10_000
+
+
+@cache
+def random_catalog(songs: int) -> ClipCatalog:
+    rng = np.random.default_rng(0)
+    embeddings = normalize(rng.standard_normal((songs * CLIPS_PER_SONG, 128), np.float32))
+    song_ids = np.repeat(np.arange(songs, dtype=np.int32), CLIPS_PER_SONG)
+    return ClipCatalog(embeddings, song_ids, np.arange(songs).astype(str))
+
+
+@pytest.mark.parametrize("songs", [1000, 10_000, 50_000])
+def test_similar_songs(benchmark, songs):
+    catalog = random_catalog(songs)
+    queries = normalize(np.random.default_rng(1).standard_normal((QUERY_CLIPS, 128)))
+    similar = benchmark.pedantic(
+        catalog.similar_songs, (queries, 10, TOP_CLIPS), rounds=3, warmup_rounds=1
+    )
+    assert len(similar) == 10
@@ -0,0 +1,52 @@
+"""Cold start of the API: a fresh interpreter up to its first response.
+
+The import time of app.main is broken down per module, like python -X
+importtime, and the modules that take longest are listed after the results.
+"""
+
+import subprocess
+import sys
+
+# The test client's own imports are counted too, so this is an upper bound
+COLD_START = """
+from fastapi.testclient import TestClient
+from app.main import app
+assert TestClient(app).get("/").status_code == 200
+"""
+
+# Modules the API only imports once a request needs them
+HEAVY_MODULES = ["essentia", "librosa", "tensorflow", "numpy", "scipy", "jose", "passlib"]
+
+
+def import_times(module: str) -> list[tuple[str, int, int]]:
+    """(name, self, cumulative) import time in microseconds of every module."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            self_time, cumulative, name = line.removeprefix("import time:").split("|")
+            if self_time.strip().isdigit():
+                times.append((name.rstrip(), int(self_time), int(cumulative)))
+    return times
+
+
+def test_cold_start(benchmark):
+    benchmark.pedantic(
+        subprocess.run,
+        ([sys.executable, "-c", COLD_START],),
+        {"check": True, "capture_output": True},
+        rounds=5,
+    )
+
+
+def test_import_app_main(benchmark, import_report):
+    times = benchmark.pedantic(import_times, ("app.main",), rounds=3)
+    import_report["app.main"] = times
+
+    imported = {name.strip().split(".")[0] for name, _, _ in times}
+    assert not imported & set(HEAVY_MODULES)
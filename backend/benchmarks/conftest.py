@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from app.config import settings
+from app.inference import runtime
+from benchmarks.signals import write_signal
+from benchmarks.stub_models import stub_registry
+
+SCRIPTS_DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "data")
+IMPORT_REPORT_LENGTH = 25
+
+# Module -> (name, self, cumulative) import times, reported after the run
+import_reports = {}
+# Benchmark -> recall of its search, reported after the run
+recall_reports = {}
+# Compression -> memory that searches of the index scan, in MiB
+memory_reports = {}
+
+
+@pytest.fixture(autouse=True)
+def stub_models(monkeypatch):
+    """Run every benchmark against stub models rather than the real graphs."""
+    data_path = settings.DATA_PATH
+    if not os.path.isdir(data_path):
+        data_path = SCRIPTS_DATA_PATH
+    registry = stub_registry(data_path)
+    monkeypatch.setattr(runtime, "registry", registry)
+    return registry
+
+
+@pytest.fixture(scope="session")
+def signal_file(tmp_path_factory):
+    """Path of a WAV file of the given synthetic signal, written once per run."""
+    paths = {}
+
+    def signal_file(kind: str, seconds: float) -> str:
+        if (kind, seconds) not in paths:
+            path = tmp_path_factory.mktemp("signals") / f"{kind}-{seconds}.wav"
+            paths[kind, seconds] = write_signal(str(path), kind, seconds)
+        return paths[kind, seconds]
+
+    return signal_file
+
+
+@pytest.fixture
+def import_report():
+    """Where benchmarks put import times to list after the results."""
+    return import_reports
+
+
+@pytest.fixture
+def recall_report():
+    """Where search benchmarks put their recall to list after the results."""
+    return recall_reports
+
+
+@pytest.fixture
+def memory_report():
+    """Where search benchmarks put the memory they scan to list after the results."""
+    return memory_reports
+
+
+def pytest_terminal_summary(terminalreporter):
+    if recall_reports:
+        terminalreporter.section("recall")
+        for name, recall in recall_reports.items():
+            terminalreporter.line(f"{recall:>8.3f}  {name}")
+    if memory_reports:
+        terminalreporter.section("memory scanned by searches (MiB)")
+        for compression, mebibytes in memory_reports.items():
+            terminalreporter.line(f"{mebibytes:>8.1f}  {compression}")
+    for module, times in import_reports.items():
+        terminalreporter.section(f"import time of {module} (us)")
+        terminalreporter.line(f"{'self':>10}{'cumulative':>12}  module")
+        slowest = sorted(times, key=lambda time: time[2], reverse=True)
+        for name, self_time, cumulative in slowest[:IMPORT_REPORT_LENGTH]:
+            terminalreporter.line(f"{self_time:>10}{cumulative:>12}  {name}")
@@ -0,0 +1,100 @@
+"""Error of the fast, excerpt-based analysis against full-track results.
+
+Run from the backend directory on a few representative tracks:
+
+    python -m benchmarks.excerpt_error song.mp3 other.wav [--features BPM Key]
+
+For every feature it prints the mean absolute and relative error over the
+tracks (or, for Key and Key Scale, how often the two agree), and the speed-up.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.analysis.service import analyze_audio
+
+
+def feature_error(full, fast) -> dict:
+    """Error of one feature; its shape depends on the kind of value."""
+    if isinstance(full, str):
+        return {"agreement": float(full == fast)}
+    if isinstance(full, dict):
+        # Labels and chord counts: compare them as distributions
+        labels = sorted(set(full) | set(fast))
+        full, fast = (
+            np.array([values.get(label, 0.0) for label in labels], dtype=float)
+            for values in (full, fast)
+        )
+        if full.sum() > 1 and fast.sum() > 1:
+            full, fast = full / full.sum(), fast / fast.sum()
+        return {"absolute": float(np.abs(full - fast).mean())}
+    full, fast = np.asarray(full, dtype=float), np.asarray(fast, dtype=float)
+    if full.ndim == 2:
+        # Frame embeddings: cosine distance between the track means
+        full, fast = full.mean(axis=0), fast.mean(axis=0)
+        cosine = full @ fast / (np.linalg.norm(full) * np.linalg.norm(fast))
+        return {"absolute": float(1 - cosine)}
+    absolute = float(np.abs(full - fast))
+    return {"absolute": absolute, "relative": absolute / (abs(float(full)) or 1.0)}
+
+
+def benchmark(paths: list[str], features: list[str] | None) -> dict:
+    errors, seconds = {}, {"full": 0.0, "fast": 0.0}
+    for path in paths:
+        results = {}
+        for mode, fast in [("full", False), ("fast", True)]:
+            started = time.perf_counter()
+            results[mode] = analyze_audio(path, features=features, fast=fast)
+            seconds[mode] += time.perf_counter() - started
+        for feature, full in results["full"].items():
+            if full is None or results["fast"].get(feature) is None:
+                continue
+            error = feature_error(full, results["fast"][feature])
+            for measure, value in error.items():
+                errors.setdefault(feature, {}).setdefault(measure, []).append(value)
+        print(f"{path}: excerpts {results['fast'].get('Excerpts')}")
+
+    return {
+        "tracks": len(paths),
+        "seconds": seconds,
+        "speedup": seconds["full"] / seconds["fast"] if seconds["fast"] else None,
+        "errors": {
+            feature: {
+                measure: float(np.mean(values)) for measure, values in measures.items()
+            }
+            for feature, measures in errors.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Audio files to analyze")
+    parser.add_argument("--features", nargs="+", help="Only compare these features")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    arguments = parser.parse_args()
+
+    report = benchmark(arguments.paths, arguments.features)
+    print(f"\n{'Feature':<22}{'Absolute':>12}{'Relative':>12}{'Agreement':>12}")
+    for feature, measures in report["errors"].items():
+        columns = [measures.get(name) for name in ["absolute", "relative", "agreement"]]
+        print(
+            f"{feature:<22}"
+            + "".join(
+                f"{'' if value is None else f'{value:.4f}':>12}" for value in columns
+            )
+        )
+    print(
+        f"\nFull {report['seconds']['full']:.1f}s, fast {report['seconds']['fast']:.1f}s"
+        f" over {report['tracks']} tracks ({report['speedup']:.1f}x)"
+    )
+    if arguments.output:
+        with open(arguments.output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Deterministic synthetic audio for the benchmarks.
+
+Every signal is a function of its length and parameters alone, so runs on
+different commits analyze exactly the same samples.
+"""
+
+import numpy as np
+import soundfile
+
+SAMPLE_RATE = 44100
+
+# Triads as semitones above A4, four beats each: C, G, A minor, F
+PROGRESSION = [[3, 7, 10], [-2, 2, 5], [0, 3, 7], [-4, 0, 3]]
+
+
+def click_track(seconds: float, bpm: float = 120, sample_rate: int = SAMPLE_RATE):
+    """Short decaying 1 kHz clicks on every beat, accented on the first of four."""
+    audio = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+    click_length = int(0.03 * sample_rate)
+    time = np.arange(click_length) / sample_rate
+    click = np.sin(2 * np.pi * 1000 * time) * np.exp(-time * 150)
+    for beat, start in enumerate(np.arange(0, len(audio), 60 / bpm * sample_rate)):
+        start = int(start)
+        end = min(start + click_length, len(audio))
+        audio[start:end] += (1.0 if beat % 4 == 0 else 0.6) * click[: end - start]
+    return audio
+
+
+def chords(seconds: float, bpm: float = 120, sample_rate: int = SAMPLE_RATE):
+    """The PROGRESSION as sustained triads with a few harmonics, a bar each."""
+    time = np.arange(int(seconds * sample_rate)) / sample_rate
+    bar = int(4 * 60 / bpm * sample_rate)
+    audio = np.zeros(len(time))
+    for index, start in enumerate(range(0, len(time), bar)):
+        segment = time[start : start + bar] - time[start]
+        envelope = np.minimum(segment / 0.02, 1) * np.exp(-segment * 0.8)
+        for semitones in PROGRESSION[index % len(PROGRESSION)]:
+            frequency = 440 * 2 ** (semitones / 12)
+            for harmonic in range(1, 4):
+                audio[start : start + bar] += (
+                    envelope
+                    * np.sin(2 * np.pi * frequency * harmonic * segment)
+                    / (harmonic * 6)
+                )
+    return audio.astype(np.float32)
+
+
+def noise(seconds: float, sample_rate: int = SAMPLE_RATE, seed: int = 0):
+    return (
+        np.random.default_rng(seed).normal(0, 0.1, int(seconds * sample_rate))
+    ).astype(np.float32)
+
+
+def song(seconds: float, bpm: float = 120, sample_rate: int = SAMPLE_RATE):
+    """Clicks over chords over a little noise: the closest to music we have."""
+    return (
+        0.5 * click_track(seconds, bpm, sample_rate)
+        + chords(seconds, bpm, sample_rate)
+        + 0.1 * noise(seconds, sample_rate)
+    )
+
+
+SIGNALS = {"click": click_track, "chords": chords, "noise": noise, "song": song}
+
+
+def write_signal(path: str, kind: str, seconds: float) -> str:
+    soundfile.write(path, SIGNALS[kind](seconds), SAMPLE_RATE, subtype="PCM_16")
+    return path
@@ -0,0 +1,75 @@
+"""Stand-ins for the TensorFlow models, so benchmarks run without the .pb files.
+
+Embedding models return one deterministic frame per hop of the real model,
+of the real width, and heads return frames of the width of the real head,
+so everything downstream of the models sees the shapes it would in
+production. Their own cost is negligible and not what is measured.
+"""
+
+import numpy as np
+
+from app.analysis.audio import MODELS_SAMPLE_RATE
+from app.inference.models import (
+    FUSED_SPECS,
+    MODEL_SPECS,
+    FusedHeadsSpec,
+    ModelRegistry,
+    ModelSpec,
+)
+
+# Seconds of audio per frame, and values per frame, of each embedding model
+EMBEDDINGS = {"discogs": (62 * 256 / MODELS_SAMPLE_RATE, 1280), "vggish": (0.96, 128)}
+
+
+def frames(seed: int, count: int, width: int) -> np.ndarray:
+    return np.random.default_rng(seed).random((count, width), dtype=np.float32)
+
+
+class StubEmbeddings:
+    def __init__(self, name: str):
+        self.hop, self.width = EMBEDDINGS[name]
+
+    def __call__(self, audio16k: np.ndarray) -> np.ndarray:
+        count = max(int(len(audio16k) / MODELS_SAMPLE_RATE / self.hop), 1)
+        return frames(len(audio16k), count, self.width)
+
+
+class StubHeads:
+    """Predictions of several heads for the same embeddings, like FusedHeads."""
+
+    def __init__(self, widths: dict[str, int]):
+        self.widths = widths
+
+    def __call__(self, embeddings: np.ndarray) -> dict[str, np.ndarray]:
+        return {
+            head: frames(index, len(embeddings), width)
+            for index, (head, width) in enumerate(self.widths.items())
+        }
+
+
+def head_width(spec: ModelSpec, registry: ModelRegistry) -> int:
+    if spec.metadata:
+        return len(registry.classes(spec.name))
+    return 1 if "regression" in spec.graph else 2
+
+
+def stub_registry(data_path: str) -> ModelRegistry:
+    """A registry like the analysis one whose models are all stubs.
+
+    data_path holds the metadata of the real heads, which gives their widths.
+    """
+
+    def loader(spec: ModelSpec):
+        if spec.name in EMBEDDINGS:
+            return StubEmbeddings(spec.name)
+        if isinstance(spec, FusedHeadsSpec):
+            return StubHeads(
+                {head.name: head_width(head, registry) for head in spec.heads}
+            )
+        head = StubHeads({spec.name: head_width(spec, registry)})
+        return lambda embeddings: head(embeddings)[spec.name]
+
+    registry = ModelRegistry(
+        MODEL_SPECS + FUSED_SPECS, models_path="", data_path=data_path, loader=loader
+    )
+    return registry
@@ -0,0 +1,162 @@
+"""Recall and latency of the pgvector index against exact search.
+
+Run from the backend directory against a local Postgres with pgvector, once
+the migrations have created the index:
+
+    docker run -d -p 5432:5432 -e POSTGRES_USER=user -e POSTGRES_PASSWORD=password \
+        -e POSTGRES_DB=database pgvector/pgvector:pg15
+    alembic upgrade head
+    python -m benchmarks.vector_recall --populate 100000
+
+--populate first fills audio_embeddings with clustered random vectors, when
+there are no real ones. For every ef_search (HNSW) or probes (IVFFlat) value
+it prints the median and 95th percentile latency and the recall@k against
+a sequential scan.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.search.vectors import nearest_songs, vector_literal
+
+DIMENSIONS = 512
+INSERT = text(
+    "INSERT INTO audio_embeddings (video_id, filename, embedding) "
+    "VALUES (:video_id, :filename, CAST(:embedding AS vector))"
+)
+
+
+def random_embeddings(count: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors around a few hundred centres, more like songs than noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(count // 500, 1), DIMENSIONS))
+    vectors = centres[rng.integers(len(centres), size=count)]
+    vectors += 0.5 * rng.standard_normal((count, DIMENSIONS))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def populate(engine, count: int, batch_size: int = 1000):
+    async with engine.begin() as connection:
+        offset = (
+            await connection.execute(text("SELECT count(*) FROM audio_embeddings"))
+        ).scalar()
+    embeddings = random_embeddings(count)
+    for start in range(0, count, batch_size):
+        rows = [
+            {
+                "video_id": f"random{offset + index}",
+                "filename": f"random{offset + index}.mp3",
+                "embedding": vector_literal(embedding),
+            }
+            for index, embedding in enumerate(
+                embeddings[start : start + batch_size], start
+            )
+        ]
+        async with engine.begin() as connection:
+            await connection.execute(INSERT, rows)
+    async with engine.begin() as connection:
+        await connection.execute(text("ANALYZE audio_embeddings"))
+
+
+async def query_embeddings(engine, count: int) -> list[np.ndarray]:
+    """Embeddings of random songs, slightly moved so they aren't exact hits."""
+    async with engine.begin() as connection:
+        rows = await connection.execute(
+            text(
+                "SELECT embedding::text FROM audio_embeddings ORDER BY random() LIMIT :n"
+            ),
+            {"n": count},
+        )
+        stored = [np.array(json.loads(row[0])) for row in rows]
+    rng = np.random.default_rng(1)
+    return [vector + 0.05 * rng.standard_normal(DIMENSIONS) for vector in stored]
+
+
+async def search(engine, queries, k: int, exact: bool = False, **parameters):
+    """Video IDs of the `k` nearest songs to each query, and each query's latency."""
+    results, latencies = [], []
+    for query in queries:
+        async with engine.connect() as connection:
+            async with connection.begin():
+                if exact:
+                    await connection.execute(text("SET LOCAL enable_indexscan = off"))
+                started = time.perf_counter()
+                songs = await nearest_songs(connection, query, k, **parameters)
+                latencies.append(time.perf_counter() - started)
+        results.append({song["video_id"] for song in songs})
+    return results, np.array(latencies)
+
+
+async def benchmark(arguments) -> dict:
+    engine = create_async_engine(settings.DATABASE_URL)
+    if arguments.populate:
+        await populate(engine, arguments.populate)
+    queries = await query_embeddings(engine, arguments.queries)
+
+    exact, exact_latencies = await search(engine, queries, arguments.k, exact=True)
+    report = {
+        "index": settings.VECTOR_INDEX,
+        "k": arguments.k,
+        "exact": {
+            "median_ms": float(np.median(exact_latencies) * 1000),
+            "p95_ms": float(np.percentile(exact_latencies, 95) * 1000),
+        },
+        "runs": [],
+    }
+    knob = "ef_search" if settings.VECTOR_INDEX == "hnsw" else "probes"
+    for value in arguments.ef_search if knob == "ef_search" else arguments.probes:
+        found, latencies = await search(engine, queries, arguments.k, **{knob: value})
+        recall = np.mean(
+            [len(got & truth) / len(truth) for got, truth in zip(found, exact) if truth]
+        )
+        report["runs"].append(
+            {
+                knob: value,
+                "recall": float(recall),
+                "median_ms": float(np.median(latencies) * 1000),
+                "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            }
+        )
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--populate", type=int, default=0, help="Random rows to add")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument(
+        "--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160, 320]
+    )
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 5, 10, 20, 50])
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    arguments = parser.parse_args()
+
+    report = asyncio.run(benchmark(arguments))
+    exact = report["exact"]
+    print(
+        f"Exact search: {exact['median_ms']:.1f} ms median, {exact['p95_ms']:.1f} ms p95"
+    )
+    knob = "ef_search" if report["index"] == "hnsw" else "probes"
+    recall = f"Recall@{report['k']}"
+    print(f"\n{knob:>10}{recall:>12}{'Median ms':>12}{'P95 ms':>12}")
+    for run in report["runs"]:
+        print(
+            f"{run[knob]:>10}{run['recall']:>12.3f}"
+            f"{run['median_ms']:>12.1f}{run['p95_ms']:>12.1f}"
+        )
+    if arguments.output:
+        with open(arguments.output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+#!/bin/sh
+# Empty the metrics of the previous run before any process imports
+# prometheus_client, then run the command of the container
+set -e
+python -m app.metrics_reset
+exec "$@"
@@ -1,225 +1,35 @@
-import json
 import os
+import sys
 
 import h5py
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from essentia.standard import (
-    MonoLoader,
-    TensorflowPredict2D,
-    TensorflowPredictEffnetDiscogs,
-    TensorflowPredictVGGish,
-)
+from essentia.standard import MonoLoader
 from tqdm import tqdm
 
+# The backend's app package, for the models, which it loads from next to the
+# scripts unless told otherwise
+SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPTS_PATH, "..", "backend"))
+os.environ.setdefault("MODELS_PATH", os.path.join(SCRIPTS_PATH, "models"))
+os.environ.setdefault("DATA_PATH", os.path.join(SCRIPTS_PATH, "data"))
+from app.analysis.audio import MODELS_SAMPLE_RATE
+from app.inference.runtime import run_models
+
 load_dotenv()
 DOWNLOAD_FOLDER = os.getenv("DOWNLOAD_FOLDER")
 CPU_THREADS = int(os.getenv("CPU_THREADS"))
-MODELS_PATH = "./models"
-
-with open("data/mtg_jamendo_moodtheme-discogs-effnet-1.json", "r") as jamendo_file:
-    jamendo_metadata = json.load(jamendo_file)
-jamendo_classes = jamendo_metadata["classes"]
-
-with open("data/mtg_jamendo_instrument-discogs-effnet-1.json", "r") as jamendo_file:
-    jamendo_instrument_metadata = json.load(jamendo_file)
-jamendo_instrument_classes = jamendo_instrument_metadata["classes"]
 
 songs_data = pd.read_csv("data/songs_data.csv", index_col=0)
 
 
-def run_essentia_models(audio16k, audio44k):
-    features = {}
-
-    # Get embeddings
-    discogs_embeddings = TensorflowPredictEffnetDiscogs(
-        graphFilename=MODELS_PATH + "/discogs-effnet-bs64-1.pb",
-        output="PartitionedCall:1",
-    )(audio16k)
-    vggish_embeddings = TensorflowPredictVGGish(
-        graphFilename=MODELS_PATH + "/audioset-vggish-3.pb",
-        output="model/vggish/embeddings",
-    )(audio16k)
-
-    # Approachability
-    approachability_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/approachability_regression-discogs-effnet-1.pb",
-        output="model/Identity",
-    )(discogs_embeddings)
-    approachability = np.median(np.squeeze(approachability_predictions))
-
-    # Engagement
-    engagement_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/engagement_regression-discogs-effnet-1.pb",
-        output="model/Identity",
-    )(discogs_embeddings)
-    engagement = np.median(np.squeeze(engagement_predictions))
-
-    # Arousal/Valence
-    arousal_valence_predictions = np.median(
-        TensorflowPredict2D(
-            graphFilename=MODELS_PATH + "/deam-audioset-vggish-2.pb",
-            output="model/Identity",
-        )(vggish_embeddings),
-        axis=0,
-    )
-    valence = arousal_valence_predictions[0]
-    arousal = arousal_valence_predictions[1]
-
-    # Aggressive
-    aggressive_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mood_aggressive-audioset-vggish-1.pb",
-        output="model/Softmax",
-    )(vggish_embeddings)
-    aggressive = np.median(aggressive_predictions, axis=0)[0]
-
-    # Happy
-    happy_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mood_happy-audioset-vggish-1.pb",
-        output="model/Softmax",
-    )(vggish_embeddings)
-    happy = np.median(happy_predictions, axis=0)[0]
-
-    # Party
-    party_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mood_party-audioset-vggish-1.pb",
-        output="model/Softmax",
-    )(vggish_embeddings)
-    party = np.median(party_predictions, axis=0)[0]
-
-    # Relaxed
-    relaxed_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mood_relaxed-audioset-vggish-1.pb",
-        output="model/Softmax",
-    )(vggish_embeddings)
-    relaxed = np.median(relaxed_predictions, axis=0)[0]
-
-    # Sad
-    sad_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mood_sad-audioset-vggish-1.pb",
-        output="model/Softmax",
-    )(vggish_embeddings)
-    sad = np.median(sad_predictions, axis=0)[0]
-
-    # Jamendo labels
-    jamendo_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mtg_jamendo_moodtheme-discogs-effnet-1.pb"
-    )(discogs_embeddings)
-    jamendo_values = np.median(jamendo_predictions, axis=0)
-    jamendo_dict = {
-        jamendo_class: jamendo_value
-        for (jamendo_class, jamendo_value) in zip(jamendo_classes, jamendo_values)
-    }
-
-    # Jamendo instrument labels
-    jamendo_instrument_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mtg_jamendo_instrument-discogs-effnet-1.pb"
-    )(discogs_embeddings)
-    jamendo_instrument_values = np.median(jamendo_instrument_predictions, axis=0)
-    jamendo_instrument_dict = {
-        jamendo_class: jamendo_value
-        for (jamendo_class, jamendo_value) in zip(
-            jamendo_instrument_classes, jamendo_instrument_values
-        )
-    }
-
-    # Acoustic
-    acoustic_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mood_acoustic-audioset-vggish-1.pb",
-        output="model/Softmax",
-    )(vggish_embeddings)
-    acoustic = np.median(acoustic_predictions, axis=0)[0]
-
-    # Electronic
-    electronic_predictions = TensorflowPredict2D(
-        graphFilename=MODELS_PATH + "/mood_electronic-audioset-vggish-1.pb",
-        output="model/Softmax",
-    )(vggish_embeddings)
-    electronic = np.median(electronic_predictions, axis=0)[0]
-
-    # Voice/Instrumental
-    voice_instrumental_predictions = np.median(
-        TensorflowPredict2D(
-            graphFilename=MODELS_PATH + "/voice_instrumental-audioset-vggish-1.pb",
-            output="model/Softmax",
-        )(vggish_embeddings),
-        axis=0,
-    )
-    voice = voice_instrumental_predictions[0]
-    instrumental = voice_instrumental_predictions[1]
-
-    # Gender (Male/Female)
-    gender_predictions = np.median(
-        TensorflowPredict2D(
-            graphFilename=MODELS_PATH + "/gender-audioset-vggish-1.pb",
-            output="model/Softmax",
-        )(vggish_embeddings),
-        axis=0,
-    )
-    female = gender_predictions[0]
-    male = gender_predictions[1]
-
-    # Timbre (Bright/Dark)
-    timbre_predictions = np.median(
-        TensorflowPredict2D(
-            graphFilename=MODELS_PATH + "/timbre-discogs-effnet-1.pb",
-            output="model/Softmax",
-        )(discogs_embeddings),
-        axis=0,
-    )
-    bright = timbre_predictions[0]
-    dark = timbre_predictions[1]
-
-    # Reverb (Dry/Wet)
-    reverb_predictions = np.median(
-        TensorflowPredict2D(
-            graphFilename=MODELS_PATH + "/nsynth_reverb-discogs-effnet-1.pb",
-            output="model/Softmax",
-        )(discogs_embeddings),
-        axis=0,
-    )
-    dry = reverb_predictions[0]
-    wet = reverb_predictions[1]
-
-    # Return model results
-    features = {
-        "Embeddings": vggish_embeddings,
-        "Approachability": approachability,
-        "Engagement": engagement,
-        "Valence": valence,
-        "Arousal": arousal,
-        "Aggressive": aggressive,
-        "Happy": happy,
-        "Party": party,
-        "Relaxed": relaxed,
-        "Sad": sad,
-        "Jamendo Labels": jamendo_dict,
-        "Jamendo Instruments": jamendo_instrument_dict,
-        "Acoustic": acoustic,
-        "Electronic": electronic,
-        "Voice": voice,
-        "Instrumental": instrumental,
-        "Male": male,
-        "Female": female,
-        "Bright": bright,
-        "Dark": dark,
-        "Dry": dry,
-        "Wet": wet,
-    }
-    return features
-
-
 def extract_audio_features(audio_file):
-    # Load the audio file
-    audio16k = MonoLoader(filename=audio_file, sampleRate=16000)()
-    audio44k = MonoLoader(filename=audio_file)()
-
-    # Run algorithms
-    algorithm_features = run_essentia_models(audio44k, audio16k)
+    # Load the audio file at the rate of the models
+    audio16k = MonoLoader(filename=audio_file, sampleRate=MODELS_SAMPLE_RATE)()
 
-    # Merge results
-    return algorithm_features
+    # Run models, which the backend builds once per process rather than per song
+    return run_models(audio16k, MODELS_SAMPLE_RATE)
 
 
 class SongPath:
@@ -1,6 +1,6 @@
-import json
 import multiprocessing as mp
 import os
+import sys
 
 import h5py
 import numpy as np
@@ -10,27 +10,21 @@ from tqdm import tqdm
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"  # Suppress TensorFlow logs
 import tensorflow as tf
-from essentia.standard import (
-    MonoLoader,
-    TensorflowPredict2D,
-    TensorflowPredictEffnetDiscogs,
-    TensorflowPredictVGGish,
-)
+from essentia.standard import MonoLoader
+
+# The backend's app package, for the models, which it loads from next to the
+# scripts unless told otherwise
+SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPTS_PATH, "..", "backend"))
+os.environ.setdefault("MODELS_PATH", os.path.join(SCRIPTS_PATH, "models"))
+os.environ.setdefault("DATA_PATH", os.path.join(SCRIPTS_PATH, "data"))
+from app.analysis.audio import MODELS_SAMPLE_RATE
+from app.inference.runtime import run_models_batch
 
 # Load environment variables
 load_dotenv()
 DOWNLOAD_FOLDER = os.getenv("DOWNLOAD_FOLDER")
 CPU_THREADS = int(os.getenv("CPU_THREADS"))
-MODELS_PATH = "./models"
-
-# Load Jamendo labels
-with open("data/mtg_jamendo_moodtheme-discogs-effnet-1.json", "r") as jamendo_file:
-    jamendo_metadata = json.load(jamendo_file)
-jamendo_classes = jamendo_metadata["classes"]
-
-with open("data/mtg_jamendo_instrument-discogs-effnet-1.json", "r") as jamendo_file:
-    jamendo_instrument_metadata = json.load(jamendo_file)
-jamendo_instrument_classes = jamendo_instrument_metadata["classes"]
 
 songs_data = pd.read_csv("data/songs_data.csv", index_col=0)
 
@@ -40,142 +34,6 @@ if gpus:
     for gpu in gpus:
         tf.config.experimental.set_memory_growth(gpu, True)
 
-# Load Essentia models
-discogs_model = TensorflowPredictEffnetDiscogs(
-    graphFilename=MODELS_PATH + "/discogs-effnet-bs64-1.pb", output="PartitionedCall:1"
-)
-vggish_model = TensorflowPredictVGGish(
-    graphFilename=MODELS_PATH + "/audioset-vggish-3.pb",
-    output="model/vggish/embeddings",
-)
-approachability_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/approachability_regression-discogs-effnet-1.pb",
-    output="model/Identity",
-)
-engagement_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/engagement_regression-discogs-effnet-1.pb",
-    output="model/Identity",
-)
-arousal_valence_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/deam-audioset-vggish-2.pb", output="model/Identity"
-)
-aggressive_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mood_aggressive-audioset-vggish-1.pb",
-    output="model/Softmax",
-)
-happy_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mood_happy-audioset-vggish-1.pb",
-    output="model/Softmax",
-)
-party_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mood_party-audioset-vggish-1.pb",
-    output="model/Softmax",
-)
-relaxed_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mood_relaxed-audioset-vggish-1.pb",
-    output="model/Softmax",
-)
-sad_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mood_sad-audioset-vggish-1.pb", output="model/Softmax"
-)
-jamendo_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mtg_jamendo_moodtheme-discogs-effnet-1.pb"
-)
-jamendo_instrument_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mtg_jamendo_instrument-discogs-effnet-1.pb"
-)
-acoustic_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mood_acoustic-audioset-vggish-1.pb",
-    output="model/Softmax",
-)
-electronic_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/mood_electronic-audioset-vggish-1.pb",
-    output="model/Softmax",
-)
-voice_instrumental_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/voice_instrumental-audioset-vggish-1.pb",
-    output="model/Softmax",
-)
-gender_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/gender-audioset-vggish-1.pb", output="model/Softmax"
-)
-timbre_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/timbre-discogs-effnet-1.pb", output="model/Softmax"
-)
-reverb_model = TensorflowPredict2D(
-    graphFilename=MODELS_PATH + "/nsynth_reverb-discogs-effnet-1.pb",
-    output="model/Softmax",
-)
-
-
-def run_essentia_models(audio16k, audio44k):
-    features = {}
-
-    # Run models sequentially
-    discogs_embeddings = discogs_model(audio16k)
-    vggish_embeddings = vggish_model(audio16k)
-
-    # Process features sequentially
-    approachability = approachability_model(discogs_embeddings)
-    engagement = engagement_model(discogs_embeddings)
-    arousal_valence = arousal_valence_model(vggish_embeddings)
-    aggressive = aggressive_model(vggish_embeddings)
-    happy = happy_model(vggish_embeddings)
-    party = party_model(vggish_embeddings)
-    relaxed = relaxed_model(vggish_embeddings)
-    sad = sad_model(vggish_embeddings)
-    jamendo_labels = jamendo_model(discogs_embeddings)
-    jamendo_instruments = jamendo_instrument_model(discogs_embeddings)
-    acoustic = acoustic_model(vggish_embeddings)
-    electronic = electronic_model(vggish_embeddings)
-    voice_instrumental = voice_instrumental_model(vggish_embeddings)
-    gender = gender_model(vggish_embeddings)
-    timbre = timbre_model(discogs_embeddings)
-    reverb = reverb_model(discogs_embeddings)
-
-    # Process results into the features dictionary
-    features["Approachability"] = np.median(np.squeeze(approachability))
-    features["Engagement"] = np.median(np.squeeze(engagement))
-    arousal_valence_predictions = np.median(arousal_valence, axis=0)
-    features["Valence"] = arousal_valence_predictions[0]
-    features["Arousal"] = arousal_valence_predictions[1]
-    features["Aggressive"] = np.median(aggressive, axis=0)[0]
-    features["Happy"] = np.median(happy, axis=0)[0]
-    features["Party"] = np.median(party, axis=0)[0]
-    features["Relaxed"] = np.median(relaxed, axis=0)[0]
-    features["Sad"] = np.median(sad, axis=0)[0]
-    jamendo_predictions = np.median(jamendo_labels, axis=0)
-    jamendo_dict = {
-        jamendo_class: jamendo_value
-        for jamendo_class, jamendo_value in zip(jamendo_classes, jamendo_predictions)
-    }
-    features["Jamendo Labels"] = jamendo_dict
-    jamendo_instrument_predictions = np.median(jamendo_instruments, axis=0)
-    jamendo_instrument_dict = {
-        jamendo_class: jamendo_value
-        for jamendo_class, jamendo_value in zip(
-            jamendo_instrument_classes, jamendo_instrument_predictions
-        )
-    }
-    features["Jamendo Instruments"] = jamendo_instrument_dict
-    features["Acoustic"] = np.median(acoustic, axis=0)[0]
-    features["Electronic"] = np.median(electronic, axis=0)[0]
-    voice_instrumental_predictions = np.median(voice_instrumental, axis=0)
-    features["Voice"] = voice_instrumental_predictions[0]
-    features["Instrumental"] = voice_instrumental_predictions[1]
-    gender_predictions = np.median(gender, axis=0)
-    features["Female"] = gender_predictions[0]
-    features["Male"] = gender_predictions[1]
-    timbre_predictions = np.median(timbre, axis=0)
-    features["Bright"] = timbre_predictions[0]
-    features["Dark"] = timbre_predictions[1]
-    reverb_predictions = np.median(reverb, axis=0)
-    features["Dry"] = reverb_predictions[0]
-    features["Wet"] = reverb_predictions[1]
-    features["Embeddings"] = vggish_embeddings
-
-    return features
-
 
 def load_audio_files(song_paths):
     with mp.Pool(processes=CPU_THREADS) as pool:
@@ -184,7 +42,7 @@ def load_audio_files(song_paths):
 
 
 def load_audio(song_path):
-    audio16k = MonoLoader(filename=song_path, sampleRate=16000)()
+    audio16k = MonoLoader(filename=song_path, sampleRate=MODELS_SAMPLE_RATE)()
     # audio44k = MonoLoader(filename=song_path, sampleRate=44100)()
     return audio16k
 
@@ -212,10 +70,15 @@ class SongPath:
         return f"Idx: {self.index},  videoID: {self.video_id}, title: {self.title_with_extension}"
 
 
-def process_song(song_path, audio):
-    song = SongPath(song_path)
-    song_features = run_essentia_models(audio, audio)
-    return song.index, song_features
+def process_songs(song_paths, audio_data):
+    # The models run over the whole batch, each head once for all its songs
+    songs_features = run_models_batch(
+        [(audio, MODELS_SAMPLE_RATE) for audio in audio_data]
+    )
+    return [
+        (SongPath(song_path).index, song_features)
+        for song_path, song_features in zip(song_paths, songs_features)
+    ]
 
 
 def aggregate_results(results, embeddings_file):
@@ -255,10 +118,8 @@ def process_songs_in_batches(
             # Load audio for batch
             audio_data = load_audio_files(batch_paths)
 
-            # Process each song in the batch
-            for song_path, audio in zip(batch_paths, audio_data):
-                result = process_song(song_path, audio)
-                aggregate_results([result], embeddings_file)
+            # Process the batch
+            aggregate_results(process_songs(batch_paths, audio_data), embeddings_file)
     return songs_data
 
 